@@ -1,53 +1,348 @@
 const API = "http://localhost:8000/analyze";
-const TTL_MS = 10 * 60 * 1000;
+const FILTER_API = "http://localhost:8000/blocklist/filter";
+const PREFETCH_API = "http://localhost:8000/prefetch";
+const ANALYZE_DEADLINE_MS = 500;      // 툴팁이 의미 있는 시간 안에 규칙 판정이라도 받기
+const DEFAULT_TTL_SEC = 10 * 60;       // 서버가 cache_ttl_sec를 안 줄 때
+const CACHE_MAX = 500;                 // 판정 캐시 최대 항목 수(LRU)
+const CACHE_SAVE_DELAY_MS = 1000;
+const HISTORY_MAX = 50;
+const HISTORY_FLUSH_MS = 2000;
+const FILTER_REFRESH_MS = 30 * 60 * 1000;
 
-const cache = new Map(); // url -> {ts, data}
+// ----------------------------
+// KISA Bloom filter (서버 /blocklist/filter 와 같은 해시: FNV-1a 32bit double hashing)
+// ----------------------------
+const FNV_PRIME = 0x01000193;
+const SEED1 = 0x811C9DC5;
+const SEED2 = 0x050C5D1F;
+const KR_THIRD_LEVEL = new Set(["co.kr", "or.kr", "go.kr", "ac.kr", "ne.kr", "re.kr", "pe.kr"]);
+const encoder = new TextEncoder();
 
-async function pushHistory(item) {
-  const key = "history";
-  const res = await chrome.storage.local.get([key]);
-  const arr = Array.isArray(res[key]) ? res[key] : [];
-  arr.unshift(item);
-  const trimmed = arr.slice(0, 50);
-  await chrome.storage.local.set({ [key]: trimmed });
+let filters = null; // {version(내용 해시), url: {m, k, bits: Uint8Array}, domain: {...}}
+
+function fnv1a32(bytes, seed) {
+  let h = seed;
+  for (const b of bytes) {
+    h ^= b;
+    h = Math.imul(h, FNV_PRIME) >>> 0;
+  }
+  return h >>> 0;
 }
 
-chrome.runtime.onMessage.addListener((msg, sender, sendResponse) => {
-  if (msg.type !== "ANALYZE_URL") return;
+function bloomHas(f, item) {
+  if (!f) return false;
+  const data = encoder.encode(item);
+  const h1 = fnv1a32(data, SEED1);
+  const h2 = (fnv1a32(data, SEED2) | 1) >>> 0;
+  for (let i = 0; i < f.k; i++) {
+    const idx = (h1 + i * h2) % f.m;
+    if (!(f.bits[idx >> 3] & (1 << (idx & 7)))) return false;
+  }
+  return true;
+}
 
-  const url = msg.url;
-  const now = Date.now();
+function b64ToBytes(s) {
+  const bin = atob(s);
+  const out = new Uint8Array(bin.length);
+  for (let i = 0; i < bin.length; i++) out[i] = bin.charCodeAt(i);
+  return out;
+}
+
+function bytesToB64(bytes) {
+  let bin = "";
+  for (let i = 0; i < bytes.length; i += 0x8000) {
+    bin += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+  }
+  return btoa(bin);
+}
+
+// server/blocklist_filter.url_key 와 같은 필터 키(normalize_url + 브라우저 URL 표기):
+// 호스트 punycode(URL이 변환), 기본 포트 생략, fragment 제거, 빈 path는 /, 퍼센트 인코딩 %xx는 대문자
+function filterUrlKey(raw) {
+  try {
+    const u = new URL(raw);
+    const userinfo = u.username ? (u.password ? `${u.username}:${u.password}@` : `${u.username}@`) : "";
+    const port = u.port ? `:${u.port}` : "";
+    const upper = s => s.replace(/%[0-9a-f]{2}/gi, m => m.toUpperCase());
+    return `${u.protocol}//${userinfo}${u.hostname.toLowerCase()}${port}${upper(u.pathname || "/")}${upper(u.search)}`;
+  } catch {
+    return "";
+  }
+}
+
+// server/url_utils.extract_registered_domain 과 같은 단순 규칙(호스트는 punycode = blocklist_filter.domain_key)
+function registeredDomain(raw) {
+  let host = "";
+  try { host = new URL(raw).hostname.toLowerCase(); } catch { return ""; }
+  if (!host || /^\d{1,3}(\.\d{1,3}){3}$/.test(host) || host.includes(":")) return "";
+  const parts = host.split(".");
+  if (parts.length < 2) return host;
+  const tail2 = parts.slice(-2).join(".");
+  if (KR_THIRD_LEVEL.has(tail2) && parts.length >= 3) return parts.slice(-3).join(".");
+  return tail2;
+}
+
+function applyFilterPayload(payload) {
+  const next = { version: payload.version };
+  for (const [name, f] of Object.entries(payload.filters || {})) {
+    let bits;
+    if (f.delta) {
+      const prev = filters && filters[name];
+      if (!prev || prev.m !== f.m) return false; // 델타를 적용할 기준이 없음 → 전체 다시 받기
+      bits = new Uint8Array(prev.bits);
+      for (const [off, val] of f.delta) bits[off] = val;
+    } else {
+      bits = b64ToBytes(f.bits);
+    }
+    next[name] = { m: f.m, k: f.k, bits };
+  }
+  filters = next;
+  return true;
+}
 
+async function saveFilters() {
+  if (!filters) return;
+  const stored = { version: filters.version };
+  for (const name of ["url", "domain"]) {
+    const f = filters[name];
+    if (f) stored[name] = { m: f.m, k: f.k, bits: bytesToB64(f.bits) };
+  }
+  await chrome.storage.local.set({ kisa_filter: stored });
+}
+
+async function loadFilters() {
+  const { kisa_filter } = await chrome.storage.local.get(["kisa_filter"]);
+  if (kisa_filter && kisa_filter.version) {
+    applyFilterPayload({ version: kisa_filter.version, filters: { url: kisa_filter.url, domain: kisa_filter.domain } });
+  }
+}
+
+async function refreshFilters() {
+  try {
+    // 버전은 서버가 필터 내용으로 만든 해시 → 재시작/다른 워커여도 내용이 같으면 같은 값
+    const since = filters ? `?since=${encodeURIComponent(filters.version)}` : "";
+    let payload = await (await fetch(FILTER_API + since)).json();
+    if (!payload.version) return;
+    if (filters && payload.version === filters.version) return;
+    if (!applyFilterPayload(payload)) {
+      payload = await (await fetch(FILTER_API)).json();
+      applyFilterPayload(payload);
+    }
+    await saveFilters();
+  } catch (err) {
+    console.warn("[filter] refresh failed", err);
+  }
+}
+
+// 저장된 필터만 기다리고(빠름), 서버 갱신은 뒤에서
+const filtersReady = loadFilters().catch(() => {});
+filtersReady.then(refreshFilters);
+setInterval(refreshFilters, FILTER_REFRESH_MS);
+
+// ----------------------------
+// 판정 캐시: 크기 제한 LRU + chrome.storage.local 영속(서비스 워커가 내려가도 유지)
+// Map 삽입 순서 = 사용 순서(가장 오래된 것이 앞)
+// ----------------------------
+const cache = new Map(); // url -> {exp, data}
+let cacheSaveTimer = null;
+
+function cacheGet(url) {
   const hit = cache.get(url);
-  if (hit && (now - hit.ts) < TTL_MS) {
-    sendResponse({ ok: true, data: hit.data, cached: true });
-    return true;
-  }
-
-  fetch(API, {
-    method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ url, mode: "fast" })
-  })
-    .then(r => r.json())
-    .then(async (data) => {
-      cache.set(url, { ts: now, data });
-
-      await pushHistory({
-        ts: now,
-        input_url: data.input_url,
-        final_url: data.final_url,
-        risk_score: data.risk_score,
-        verdict: data.verdict,
-        reasons: data.reasons,
-        redirect_hops: data.redirect_hops
-      });
-
-      sendResponse({ ok: true, data, cached: false });
-    })
-    .catch(err => {
-      sendResponse({ ok: false, error: String(err) });
+  if (!hit) return null;
+  if (hit.exp <= Date.now()) {
+    cache.delete(url);
+    scheduleCacheSave();
+    return null;
+  }
+  cache.delete(url);
+  cache.set(url, hit);
+  return hit.data;
+}
+
+function cacheSet(url, data, ttlSec) {
+  if (!(ttlSec > 0)) return;
+  cache.delete(url);
+  cache.set(url, { exp: Date.now() + ttlSec * 1000, data });
+  while (cache.size > CACHE_MAX) cache.delete(cache.keys().next().value);
+  scheduleCacheSave();
+}
+
+function scheduleCacheSave() {
+  if (cacheSaveTimer) return;
+  cacheSaveTimer = setTimeout(() => {
+    cacheSaveTimer = null;
+    chrome.storage.local.set({ verdict_cache: Array.from(cache.entries()) });
+  }, CACHE_SAVE_DELAY_MS);
+}
+
+async function loadCache() {
+  const { verdict_cache } = await chrome.storage.local.get(["verdict_cache"]);
+  const now = Date.now();
+  for (const [url, v] of Array.isArray(verdict_cache) ? verdict_cache : []) {
+    if (v && v.exp > now) cache.set(url, v);
+  }
+}
+
+const cacheReady = loadCache().catch(() => {});
+
+// 서버 응답 중 툴팁/팝업에 쓰는 필드만 저장(저장 공간 절약)
+function slim(data) {
+  return {
+    input_url: data.input_url ?? data.original_url,
+    final_url: data.final_url,
+    risk_score: data.risk_score,
+    verdict: data.verdict,
+    reasons: data.reasons,
+    redirect_hops: data.redirect_hops,
+    source: data.source
+  };
+}
+
+// 우선순위: 본문 cache_ttl_sec → Cache-Control max-age → 기본값
+function ttlFrom(data, headers) {
+  if (Number.isFinite(data.cache_ttl_sec)) return data.cache_ttl_sec;
+  const m = /max-age=(\d+)/.exec((headers && headers.get("Cache-Control")) || "");
+  return m ? Number(m[1]) : DEFAULT_TTL_SEC;
+}
+
+// Bloom filter는 오탐이 있으므로 "KISA 목록 후보" 표시만 하고 확정은 서버(/analyze) 판정으로
+function localHint(url) {
+  if (!filters) return null;
+  const nurl = filterUrlKey(url);
+  const dom = registeredDomain(url);
+  let reason = null;
+  if (nurl && bloomHas(filters.url, nurl)) reason = "KISA 피싱 URL 목록 후보(로컬 필터)";
+  else if (dom && bloomHas(filters.domain, dom)) reason = "KISA 피싱 도메인 목록 후보(로컬 필터)";
+  if (!reason) return null;
+  return {
+    input_url: url,
+    final_url: url,
+    risk_score: 70,
+    verdict: "SUSPICIOUS",
+    reasons: [reason, "서버 확인 전 잠정 표시(로컬 필터는 오탐 가능)"],
+    redirect_hops: 0,
+    source: "local_filter"
+  };
+}
+
+// ----------------------------
+// 기록: 메모리에 모았다가 한 번에 저장(미스마다 read-modify-write 하지 않음)
+// ----------------------------
+let historyBuffer = [];
+let historyTimer = null;
+
+function pushHistory(item) {
+  historyBuffer.push(item);
+  if (historyBuffer.length >= HISTORY_MAX) flushHistory();
+  else if (!historyTimer) historyTimer = setTimeout(flushHistory, HISTORY_FLUSH_MS);
+}
+
+async function flushHistory() {
+  clearTimeout(historyTimer);
+  historyTimer = null;
+  if (!historyBuffer.length) return;
+  const items = historyBuffer.reverse();
+  historyBuffer = [];
+  const { history } = await chrome.storage.local.get(["history"]);
+  const arr = Array.isArray(history) ? history : [];
+  await chrome.storage.local.set({ history: items.concat(arr).slice(0, HISTORY_MAX) });
+}
+
+// 서버 프리페치 쿼터를 브라우저 단위로 나누기 위한 익명 ID
+let clientIdPromise = null;
+function getClientId() {
+  if (!clientIdPromise) {
+    clientIdPromise = chrome.storage.local.get(["client_id"]).then(async ({ client_id }) => {
+      if (client_id) return client_id;
+      const id = crypto.randomUUID();
+      await chrome.storage.local.set({ client_id: id });
+      return id;
+    });
+  }
+  return clientIdPromise;
+}
+
+async function prefetchLinks(links) {
+  await Promise.all([filtersReady, cacheReady]);
+  // 이미 캐시에 있는 링크는 서버에 보내지 않음(로컬 필터 후보도 서버 확인이 필요하므로 보냄)
+  const todo = links.filter(l => !cacheGet(l.url));
+  if (!todo.length) return;
+  try {
+    await fetch(PREFETCH_API, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ client_id: await getClientId(), links: todo })
     });
+  } catch (err) {
+    console.warn("[prefetch] failed", err);
+  }
+}
+
+// 호버 즉시 보여 줄 로컬 필터 후보(캐시 히트면 서버 응답이 곧 오므로 없음)
+async function quickHint(url) {
+  await Promise.all([filtersReady, cacheReady]);
+  if (cacheGet(url)) return null;
+  return localHint(url);
+}
+
+async function analyzeUrl(url) {
+  await Promise.all([filtersReady, cacheReady]);
+
+  const hit = cacheGet(url);
+  if (hit) return { data: hit, cached: true };
+
+  // 로컬 필터 후보는 content.js가 먼저 표시(LOCAL_HINT), 확정은 서버(KISA DB 정확 일치)
+  const hint = localHint(url);
+  let r;
+  try {
+    r = await fetch(API, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ url, mode: "fast", deadline_ms: ANALYZE_DEADLINE_MS })
+    });
+  } catch (err) {
+    // 서버 확인 실패: 후보 표시만(캐시하지 않음)
+    if (hint) return { data: hint, cached: false };
+    throw err;
+  }
+  if (r.status === 503) {
+    if (hint) return { data: hint, cached: false };
+    // 서버 과부하: 캐시하지 않고 Retry-After 안내만
+    throw new Error(`서버 혼잡 · ${r.headers.get("Retry-After") || "잠시"}초 후 다시 시도`);
+  }
+  const body = await r.json();
+  const data = slim(body);
+  const ttl = ttlFrom(body, r.headers);
+  cacheSet(url, data, ttl);
+
+  pushHistory({
+    ts: Date.now(),
+    input_url: data.input_url,
+    final_url: data.final_url,
+    risk_score: data.risk_score,
+    verdict: data.verdict,
+    reasons: data.reasons,
+    redirect_hops: data.redirect_hops
+  });
+  return { data, cached: false };
+}
+
+chrome.runtime.onMessage.addListener((msg, sender, sendResponse) => {
+  if (msg.type === "PREFETCH_LINKS") {
+    prefetchLinks(Array.isArray(msg.links) ? msg.links : []);
+    return;
+  }
+  if (msg.type === "LOCAL_HINT") {
+    quickHint(msg.url)
+      .then(data => sendResponse({ ok: true, data }))
+      .catch(() => sendResponse({ ok: false }));
+    return true; // async
+  }
+  if (msg.type !== "ANALYZE_URL") return;
+
+  analyzeUrl(msg.url)
+    .then(({ data, cached }) => sendResponse({ ok: true, data, cached }))
+    .catch(err => sendResponse({ ok: false, error: String(err) }));
 
   return true; // async
 });
@@ -1,5 +1,11 @@
 let tip = null;
 let hoverTimer = null;
+let hoverSeq = 0;     // 호버마다 증가 → 늦게 온 이전 링크의 응답은 무시
+let lastMouse = { x: -1, y: -1 };
+
+const PREFETCH_NEAR_PX = 200;     // 커서에서 이 거리 안의 링크는 우선 분석
+const PREFETCH_DEBOUNCE_MS = 400;
+const PREFETCH_MAX_LINKS = 200;
 
 function ensureTip() {
   if (tip) return tip;
@@ -80,9 +86,19 @@ document.addEventListener("mouseover", (e) => {
 
   // 디바운스: 스치듯 지나가는 링크는 호출하지 않기
   hoverTimer = setTimeout(() => {
+    const seq = ++hoverSeq;
+    let settled = false;
     showTipNear(a, `<div>분석 중…</div>`);
 
+    // 로컬 필터 후보는 서버 왕복 없이 바로 표시(서버 판정이 오면 교체)
+    chrome.runtime.sendMessage({ type: "LOCAL_HINT", url }, (res) => {
+      if (seq !== hoverSeq || settled || !res?.data) return;
+      showTipNear(a, formatResult(res.data));
+    });
+
     chrome.runtime.sendMessage({ type: "ANALYZE_URL", url }, (res) => {
+      if (seq !== hoverSeq) return; // 이미 다른 링크로 이동
+      settled = true;
       if (!res || !res.ok) {
         showTipNear(a, `<div style="font-weight:700;">분석 실패</div><div style="margin-top:6px;">${escapeHtml(res?.error || "")}</div>`);
         return;
@@ -94,7 +110,72 @@ document.addEventListener("mouseover", (e) => {
 
 document.addEventListener("mouseout", () => {
   clearTimeout(hoverTimer);
+  hoverSeq++;
   hideTip();
 }, true);
 
 document.addEventListener("scroll", () => hideTip(), true);
+
+// ----------------------------
+// 화면에 보이는 링크 프리페치(서버가 저우선순위로 미리 분석 → 첫 호버도 캐시 히트)
+// ----------------------------
+const visibleLinks = new Set();
+const sentLinks = new Set();
+const observed = new WeakSet();
+let prefetchTimer = null;
+
+function isNearCursor(a) {
+  if (lastMouse.x < 0) return false;
+  const r = a.getBoundingClientRect();
+  const dx = Math.max(r.left - lastMouse.x, 0, lastMouse.x - r.right);
+  const dy = Math.max(r.top - lastMouse.y, 0, lastMouse.y - r.bottom);
+  return Math.hypot(dx, dy) <= PREFETCH_NEAR_PX;
+}
+
+function flushPrefetch() {
+  const links = [];
+  for (const a of visibleLinks) {
+    const url = a.href;
+    if (!/^https?:/i.test(url) || sentLinks.has(url)) continue;
+    links.push({ url, near: isNearCursor(a) });
+  }
+  if (!links.length) return;
+  links.sort((x, y) => Number(y.near) - Number(x.near));
+  const batch = links.slice(0, PREFETCH_MAX_LINKS);
+  for (const l of batch) sentLinks.add(l.url);
+  chrome.runtime.sendMessage({ type: "PREFETCH_LINKS", links: batch }, () => void chrome.runtime.lastError);
+}
+
+function schedulePrefetch() {
+  clearTimeout(prefetchTimer);
+  prefetchTimer = setTimeout(flushPrefetch, PREFETCH_DEBOUNCE_MS);
+}
+
+const linkObserver = new IntersectionObserver((entries) => {
+  for (const e of entries) {
+    if (e.isIntersecting) visibleLinks.add(e.target);
+    else visibleLinks.delete(e.target);
+  }
+  schedulePrefetch();
+});
+
+function observeLinks() {
+  for (const a of document.querySelectorAll("a[href]")) {
+    if (observed.has(a)) continue;
+    observed.add(a);
+    linkObserver.observe(a);
+  }
+}
+
+document.addEventListener("mousemove", (e) => {
+  lastMouse = { x: e.clientX, y: e.clientY };
+}, { capture: true, passive: true });
+
+// 무한 스크롤 등으로 새로 생긴 링크도 관찰 대상에 추가
+let rescanTimer = null;
+document.addEventListener("scroll", () => {
+  clearTimeout(rescanTimer);
+  rescanTimer = setTimeout(observeLinks, PREFETCH_DEBOUNCE_MS);
+}, { capture: true, passive: true });
+
+observeLinks();
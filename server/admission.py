@@ -0,0 +1,84 @@
+# server/admission.py
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+import metrics
+
+
+class Overloaded(RuntimeError):
+    """전역 동시 요청 한도 초과 → 503 + Retry-After 로 조기 거절."""
+
+    def __init__(self, retry_after_sec: int):
+        super().__init__("server overloaded")
+        self.retry_after_sec = retry_after_sec
+
+
+class StageGate:
+    """
+    비싼 단계(리다이렉트 추적, KISA 온디맨드, LLM) 하나의 입장 제어.
+    - 동시 실행 max_concurrent, 대기 max_queue
+    - 대기열이 가득 찼거나 max_wait_sec 안에 자리가 안 나면 즉시 거절(shed)
+      → 호출 측은 기다리지 않고 그 단계를 생략(규칙 판정으로 degrade)
+    """
+
+    def __init__(self, name: str, *, max_concurrent: int, max_queue: int, max_wait_sec: float = 0.2):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.max_wait_sec = max(0.0, max_wait_sec)
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._inflight = 0
+
+    def try_enter(self, wait_sec: Optional[float] = None) -> bool:
+        wait = self.max_wait_sec if wait_sec is None else max(0.0, min(wait_sec, self.max_wait_sec))
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                if self._waiting >= self.max_queue:
+                    full = True
+                else:
+                    full = False
+                    self._waiting += 1
+            if full:
+                metrics.incr(f"admission.{self.name}.shed_queue_full")
+                return False
+            try:
+                ok = wait > 0 and self._slots.acquire(timeout=wait)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+            if not ok:
+                metrics.incr(f"admission.{self.name}.shed_wait_timeout")
+                return False
+        with self._lock:
+            self._inflight += 1
+        metrics.incr(f"admission.{self.name}.admitted")
+        return True
+
+    def leave(self) -> None:
+        with self._lock:
+            self._inflight -= 1
+        self._slots.release()
+
+    @contextmanager
+    def admit(self, wait_sec: Optional[float] = None) -> Iterator[bool]:
+        """with gate.admit(wait) as ok: ok가 False면 단계 생략."""
+        ok = self.try_enter(wait_sec)
+        try:
+            yield ok
+        finally:
+            if ok:
+                self.leave()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "inflight": self._inflight,
+                "queue_depth": self._waiting,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+            }
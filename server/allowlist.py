@@ -0,0 +1,94 @@
+# server/allowlist.py
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, FrozenSet, Tuple
+from urllib.parse import urlsplit
+
+from url_utils import extract_registered_domain, host_of
+
+
+@dataclass(frozen=True)
+class Allowlist:
+    version: str
+    domains: FrozenSet[str]
+    # host -> 열린 리다이렉트 경로 접두사들
+    open_redirects: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+    # host -> 사용자 콘텐츠 경로 접두사들(서브도메인 포함)
+    user_content: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+
+    def match(self, url: str) -> str:
+        """
+        hit           : allowlist 도메인 → 빠른 경로
+        user_content  : allowlist 도메인이지만 누구나 페이지를 올리는 호스트/경로 → 정상 분석
+        open_redirect : allowlist 도메인이지만 열린 리다이렉트 엔드포인트 → 정상 분석
+        miss          : allowlist 아님
+        """
+        domain = extract_registered_domain(url)
+        if not domain or domain not in self.domains:
+            return "miss"
+        host = host_of(url)
+        path = urlsplit(url).path or "/"
+        if self.user_content:
+            # 호스트 자신과 상위 호스트들(등록 도메인까지)을 차례로 확인
+            labels = host.split(".")
+            for i in range(len(labels) - domain.count(".")):
+                prefixes = self.user_content.get(".".join(labels[i:]))
+                if prefixes and any(path.startswith(p) for p in prefixes):
+                    return "user_content"
+        prefixes = self.open_redirects.get(host)
+        if prefixes and any(path.startswith(p) for p in prefixes):
+            return "open_redirect"
+        return "hit"
+
+    def __len__(self) -> int:
+        return len(self.domains)
+
+
+EMPTY = Allowlist(version="none", domains=frozenset())
+
+
+def load_allowlist(path: str) -> Allowlist:
+    """
+    allowlist 파일 로드. 파일이 없으면 빈 allowlist.
+    '# version: ...' 주석으로 버전 표기, '!host/path'는 열린 리다이렉트 예외,
+    '-host[/path]'는 사용자 콘텐츠 예외(서브도메인 포함).
+    """
+    p = Path(path)
+    if not p.exists():
+        print("[ALLOWLIST] not found:", path)
+        return EMPTY
+
+    version = "unversioned"
+    domains = set()
+    open_redirects: Dict[str, list] = {}
+    user_content: Dict[str, list] = {}
+
+    for line in p.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#"):
+            body = line[1:].strip()
+            if body.lower().startswith("version:"):
+                version = body.split(":", 1)[1].strip()
+            continue
+        if line.startswith("!"):
+            host, _, path_prefix = line[1:].partition("/")
+            open_redirects.setdefault(host.lower(), []).append("/" + path_prefix)
+            continue
+        if line.startswith("-"):
+            host, _, path_prefix = line[1:].partition("/")
+            user_content.setdefault(host.lower(), []).append("/" + path_prefix)
+            continue
+        domains.add(line.lower())
+
+    out = Allowlist(
+        version=version,
+        domains=frozenset(domains),
+        open_redirects={h: tuple(v) for h, v in open_redirects.items()},
+        user_content={h: tuple(v) for h, v in user_content.items()},
+    )
+    print("[ALLOWLIST] version=", out.version, "domains=", len(out))
+    return out
@@ -0,0 +1,840 @@
+# server/analyzer.py
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+import requests
+
+from db import connect, init_db, find_url, find_domain, upsert_url, upsert_domain, iter_urls, iter_domains
+from url_utils import (
+    normalize_url,
+    extract_registered_domain,
+    host_of,
+    looks_like_ip_host,
+    is_suspicious_punycode,
+    has_userinfo,
+    has_nonstandard_port,
+    is_https,
+    count_subdomains,
+    url_length,
+    percent_encoded_count,
+    count_query_params,
+    suspicious_keyword_hit,
+    is_known_shortener,
+    has_non_ascii,
+)
+from redirect_utils import trace_redirects
+from cache_utils import TTLCache
+from score_rules import score_url
+from llm_agent import (
+    plan_tools,
+    llm_gate,
+    llm_decide,
+    record_llm_outcome,
+    cache_namespace,
+    warmup,
+    DecisionBatcher,
+)
+from llm_cache import LLMDecisionCache
+from allowlist import EMPTY, load_allowlist
+from domain_age import DomainAgeCache
+from blocklist_filter import domain_key, publisher_from_env, url_key
+from prefetch import PrefetchScheduler, parse_links
+from deadline import Deadline
+from admission import Overloaded, StageGate
+from event_log import EventLog
+from domain_cache import DomainReputationCache
+from ip_ranges import is_private_host, load_range_files, special_label
+from dns_utils import DNS_TIMEOUT_SEC, dns_cache
+from settings import Settings
+import metrics
+
+
+class Analyzer:
+    """
+    앱 하나가 쓰는 리소스(DB, 캐시, 입장 게이트, 백그라운드 스레드, 이벤트 로그)와 분석 파이프라인.
+    - 생성만으로는 아무것도 열지 않음 → start()에서 서로 독립적인 준비 단계를 병렬로 실행
+    - close()는 백그라운드 루프/스레드 풀을 멈추고 이벤트 로그 버퍼를 비움(앱 lifespan 종료 시)
+    """
+
+    def __init__(self, settings: Settings):
+        self.cfg = cfg = settings
+        self.con = None
+        self.allowlist = EMPTY
+        self.domain_ages: Optional[DomainAgeCache] = None
+        self.blocklist = None
+        self.llm_cache: Optional[LLMDecisionCache] = None
+        self.llm_batcher: Optional[DecisionBatcher] = None
+        self.abuse_ranges = None
+        self.event_log: Optional[EventLog] = None
+        self.prefetcher: Optional[PrefetchScheduler] = None
+        self.startup_ms: Dict[str, int] = {}
+
+        self.analysis_cache: TTLCache[Tuple[Dict[str, Any], float]] = TTLCache(maxsize=cfg.analyze_cache_max)
+        self.domain_reputation = None
+        if cfg.domain_rep_enabled:
+            self.domain_reputation = DomainReputationCache(
+                maxsize=cfg.domain_rep_max,
+                ttl_sec=cfg.domain_rep_ttl_sec,
+                min_observed=cfg.domain_rep_min_observed,
+            )
+
+        admit_wait = cfg.admit_wait_ms / 1000.0
+        self.redirect_gate = StageGate("redirect", max_concurrent=cfg.admit_redirect_concurrency, max_queue=cfg.admit_redirect_queue, max_wait_sec=admit_wait)
+        self.kisa_gate = StageGate("kisa_lazy", max_concurrent=cfg.admit_kisa_concurrency, max_queue=cfg.admit_kisa_queue, max_wait_sec=admit_wait)
+        self.llm_stage_gate = StageGate("llm", max_concurrent=cfg.admit_llm_concurrency, max_queue=cfg.admit_llm_queue, max_wait_sec=admit_wait)
+        self.analyze_gate = StageGate("analyze", max_concurrent=cfg.analyze_max_inflight, max_queue=0, max_wait_sec=0)
+
+        # 스레드는 첫 submit 때 생김
+        self._background_pool = ThreadPoolExecutor(max_workers=max(1, cfg.analyze_background_workers), thread_name_prefix="analyze-bg")
+        self._background_keys: set = set()
+        self._background_max = max(1, cfg.analyze_background_workers) + max(0, cfg.analyze_background_queue)
+        self._background_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    # ----------------------------
+    # 기동 / 종료
+    # ----------------------------
+    def start(self) -> Dict[str, int]:
+        """
+        리소스 준비. DB를 쓰지 않는 단계(allowlist, IP 대역 파일, 이벤트 로그, Bloom filter)는
+        DB 열기와 동시에, DB가 필요한 단계(WHOIS/LLM 캐시)는 DB가 준비된 뒤 병렬로 → 단계별 소요(ms) 반환.
+        """
+        t0 = time.monotonic()
+        with ThreadPoolExecutor(max_workers=4, thread_name_prefix="startup") as pool:
+            db = pool.submit(self._timed, "db", self._open_db)
+            steps = [
+                pool.submit(self._timed, name, fn)
+                for name, fn in (
+                    ("allowlist", self._load_allowlist),
+                    ("ip_ranges", self._load_abuse_ranges),
+                    ("event_log", self._open_event_log),
+                    ("blocklist", self._open_blocklist),
+                )
+            ]
+            db.result()
+            steps += [
+                pool.submit(self._timed, name, fn)
+                for name, fn in (("whois", self._open_whois), ("llm", self._open_llm))
+            ]
+            for f in steps:
+                f.result()
+
+        cfg = self.cfg
+        if cfg.prefetch_enabled:
+            self.prefetcher = PrefetchScheduler(
+                self.prefetch_one,
+                workers=cfg.prefetch_workers,
+                client_quota=cfg.prefetch_client_quota,
+                per_domain=cfg.prefetch_per_domain,
+                recent_ttl_sec=min(cfg.cache_ttl_by_verdict.values()),
+            )
+        self._register_gauges()
+
+        # 빌드는 수백 ms 걸릴 수 있어 요청 경로가 아니라 별도 스레드/커넥션에서
+        threading.Thread(target=self._blocklist_loop, name="blocklist", daemon=True).start()
+        # 모델 로드는 수 초~수십 초 → 기동을 막지 않도록 백그라운드에서
+        if cfg.use_llm and cfg.llm_warmup:
+            threading.Thread(target=warmup, name="llm-warmup", daemon=True).start()
+
+        self.startup_ms["total"] = int((time.monotonic() - t0) * 1000)
+        return self.startup_ms
+
+    def close(self) -> None:
+        self._stop.set()
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+        self._background_pool.shutdown(wait=False, cancel_futures=True)
+        if self.domain_ages is not None:
+            self.domain_ages.close()
+        if self.llm_batcher is not None:
+            self.llm_batcher.close()
+        if self.llm_cache is not None:
+            self.llm_cache.close()
+        # 버퍼에 남은 이벤트까지 기록
+        if self.event_log is not None:
+            self.event_log.close()
+        # 아직 끝나지 않은 프리페치/백그라운드 분석은 DB 오류로 끝남(결과는 버려짐)
+        if self.con is not None:
+            self.con.close()
+
+    def _timed(self, name: str, fn: Callable[[], None]) -> None:
+        t0 = time.monotonic()
+        fn()
+        self.startup_ms[name] = int((time.monotonic() - t0) * 1000)
+
+    def _open_db(self) -> None:
+        self.con = connect(self.cfg.db_path)
+        init_db(self.con)
+
+    def _load_allowlist(self) -> None:
+        self.allowlist = load_allowlist(self.cfg.allowlist_path)
+
+    def _load_abuse_ranges(self) -> None:
+        if self.cfg.ip_abuse_range_files:
+            self.abuse_ranges = load_range_files(self.cfg.ip_abuse_range_files)
+
+    def _open_event_log(self) -> None:
+        cfg = self.cfg
+        if cfg.event_log_enabled:
+            self.event_log = EventLog(
+                cfg.event_log_dir,
+                buffer_max=cfg.event_log_buffer,
+                flush_sec=cfg.event_log_flush_sec,
+                batch_max=cfg.event_log_batch,
+                rotate_bytes=int(cfg.event_log_rotate_mb * 1024 * 1024),
+                keep_files=cfg.event_log_keep_files,
+            )
+
+    def _open_blocklist(self) -> None:
+        self.blocklist = publisher_from_env()
+
+    def _open_whois(self) -> None:
+        cfg = self.cfg
+        if cfg.whois_enabled:
+            self.domain_ages = DomainAgeCache(
+                cfg.db_path,
+                ttl_sec=cfg.whois_cache_ttl_sec,
+                negative_ttl_sec=cfg.whois_negative_ttl_sec,
+                workers=cfg.whois_workers,
+                rate_per_sec=cfg.whois_rate_per_sec,
+            )
+
+    def _open_llm(self) -> None:
+        cfg = self.cfg
+        if cfg.use_llm and cfg.llm_cache:
+            self.llm_cache = LLMDecisionCache(
+                cfg.db_path,
+                namespace=cache_namespace(),
+                ttl_sec=cfg.llm_cache_ttl_sec,
+                max_entries=cfg.llm_cache_max_entries,
+            )
+        if cfg.use_llm and cfg.llm_batch_window_ms > 0:
+            self.llm_batcher = DecisionBatcher(
+                window_ms=cfg.llm_batch_window_ms,
+                max_batch=cfg.llm_batch_max,
+                workers=cfg.ollama_num_parallel,
+            )
+
+    def _register_gauges(self) -> None:
+        # 게이지는 이름 기준 전역 → 한 프로세스에 앱이 여럿이면 마지막에 기동한 앱 값
+        metrics.register_gauge("llm.gate.avoided_ratio", _llm_avoided_ratio)
+        metrics.register_gauge("analyze.allowlist_fast_path_ratio", lambda: metrics.ratio("analyze.allowlist_fast_path", "analyze.requests"))
+        metrics.register_gauge("blocklist", lambda: self.blocklist.stats)
+        metrics.register_gauge("allowlist", lambda: {"version": self.allowlist.version, "domains": len(self.allowlist)})
+        metrics.register_gauge("analyze.result_cache", self.analysis_cache.stats)
+        metrics.register_gauge(
+            "admission",
+            lambda: {g.name: g.stats() for g in (self.analyze_gate, self.redirect_gate, self.kisa_gate, self.llm_stage_gate)},
+        )
+        metrics.register_gauge("llm.verdict_changed_ratio", lambda: metrics.ratio("llm.verdict_changed", "llm.gate.called"))
+        metrics.register_gauge("startup_ms", lambda: dict(self.startup_ms))
+        if self.domain_reputation is not None:
+            metrics.register_gauge("domain_rep", self.domain_reputation.stats)
+        if self.abuse_ranges is not None:
+            metrics.register_gauge("ip_abuse_ranges", self.abuse_ranges.stats)
+        if self.prefetcher is not None:
+            metrics.register_gauge("prefetch", self.prefetcher.stats)
+
+    def _blocklist_loop(self) -> None:
+        bcon = connect(self.cfg.db_path)
+        while not self._stop.is_set():
+            try:
+                # 확장프로그램이 브라우저 URL로 바로 조회할 수 있는 키로 넣음
+                changed = self.blocklist.rebuild({
+                    "url": (url_key(u) for u in iter_urls(bcon)),
+                    "domain": (domain_key(d) for d in iter_domains(bcon)),
+                })
+                # 다른 프로세스(kisa_sync 등)가 KISA 데이터를 바꿨으면 도메인 평판 전체 무효화
+                if changed and self.domain_reputation is not None:
+                    self.domain_reputation.clear()
+            except Exception as e:
+                print("[BLOCKLIST ERROR]", e)
+            self._stop.wait(self.cfg.blocklist_rebuild_sec)
+        bcon.close()
+
+    # ----------------------------
+    # KISA 온디맨드
+    # ----------------------------
+    def fetch_odcloud_page(self, page: int, per_page: int, timeout: Optional[float] = None) -> Dict[str, Any]:
+        cfg = self.cfg
+        if not cfg.odcloud_api or not cfg.odcloud_key:
+            raise RuntimeError("ODCLOUD_PHISH_API_BASE / ODCLOUD_SERVICE_KEY 설정이 필요합니다(.env).")
+
+        params = {
+            "page": page,
+            "perPage": per_page,
+            "returnType": "JSON",
+            "serviceKey": cfg.odcloud_key,
+        }
+        r = requests.get(
+            cfg.odcloud_api,
+            params=params,
+            timeout=cfg.kisa_ondemand_timeout if timeout is None else timeout,
+            headers={"User-Agent": "phish-hover-agent/1.0"},
+        )
+        r.raise_for_status()
+        return r.json()
+
+    def kisa_lazy_cache(self, final_url: str, final_domain: str, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """
+        DB 미스일 때만:
+        - OpenAPI 최근 N페이지를 스캔
+        - 페이지 내 데이터는 DB에 upsert(캐시)
+        - target URL/도메인 매칭되면 조기 종료
+        - deadline이 있으면 페이지당 타임아웃을 남은 시간으로 줄이고, 다 쓰면 중단(error="deadline")
+        """
+        cfg = self.cfg
+        con = self.con
+        out = {"ran": False, "matched": False, "pages_scanned": 0, "error": None}
+
+        if not cfg.kisa_ondemand:
+            return out
+        if is_private_host(host_of(final_url)):
+            return out
+        if not cfg.odcloud_api or not cfg.odcloud_key:
+            out["error"] = "odcloud_not_configured"
+            return out
+
+        target_url = normalize_url(final_url)
+        target_domain = final_domain or extract_registered_domain(target_url)
+
+        try:
+            out["ran"] = True
+
+            for page in range(1, cfg.kisa_ondemand_max_pages + 1):
+                timeout = deadline.share(1.0, cfg.kisa_ondemand_timeout) if deadline else cfg.kisa_ondemand_timeout
+                if timeout * 1000 < cfg.deadline_min_stage_ms:
+                    out["error"] = "deadline"
+                    break
+                out["pages_scanned"] = page
+                j = self.fetch_odcloud_page(page, cfg.kisa_ondemand_per_page, timeout)
+                rows = j.get("data", []) or []
+                if not rows:
+                    break
+
+                page_matched = False
+                touched = set()
+
+                for row in rows:
+                    # KISA OpenAPI는 한글 필드명 사용: "홈페이지주소", "날짜"
+                    raw_url = (row.get("홈페이지주소") or row.get("URL") or row.get("url") or "").strip()
+                    date = (row.get("날짜") or row.get("DATE") or row.get("date") or None)
+
+                    if not raw_url:
+                        continue
+
+                    nurl = normalize_url(raw_url)
+                    dom = extract_registered_domain(nurl)
+
+                    # 캐시 적재
+                    upsert_url(con, nurl, date)
+                    if dom:
+                        upsert_domain(con, dom, date)
+                        touched.add(dom)
+
+                    # 매칭 확인
+                    if nurl == target_url:
+                        page_matched = True
+                    if target_domain and dom and dom == target_domain:
+                        page_matched = True
+
+                con.commit()
+                # KISA에 (새로) 올라온 도메인은 평판 캐시에서 제거
+                if self.domain_reputation is not None:
+                    self.domain_reputation.invalidate(touched)
+
+                if page_matched:
+                    out["matched"] = True
+                    break
+
+                if len(rows) < cfg.kisa_ondemand_per_page:
+                    break
+
+        except requests.Timeout as e:
+            # 마감 때문에 줄인 타임아웃에 걸렸으면 장애가 아니라 예산 초과
+            out["error"] = "deadline" if deadline and timeout < cfg.kisa_ondemand_timeout else str(e)
+        except Exception as e:
+            out["error"] = str(e)
+
+        return out
+
+    # ----------------------------
+    # 결과 캐시 / 전경·프리페치·백그라운드 분석
+    # ----------------------------
+    def cache_ttl(self, result: Dict[str, Any]) -> int:
+        by_verdict = self.cfg.cache_ttl_by_verdict
+        ttl = by_verdict.get(result.get("verdict"), by_verdict["SUSPICIOUS"])
+        # 마감으로 단계를 생략한 결과는 판정과 무관하게 잠정(뒤에서 전체 분석이 곧 교체)
+        # 리다이렉트 추적이 오류로 끝난 결과(연결 실패, DNS 실패, 중간 차단 등)도 일시적일 수 있어 잠정
+        if result.get("partial") or (
+            result.get("verdict") != "DANGEROUS"
+            and (
+                result.get("redirect_truncated")
+                or result.get("redirect_error")
+                or result.get("whois_error") == "pending"
+            )
+        ):
+            ttl = min(ttl, self.cfg.cache_ttl_provisional_sec)
+        return max(0, ttl)
+
+    def store_result(self, key: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        ttl = self.cache_ttl(result)
+        result["cache_ttl_sec"] = ttl
+        self.analysis_cache.set(key, (result, time.time() + ttl), ttl=ttl)
+        return result
+
+    def cached_result(self, url: str) -> Optional[Dict[str, Any]]:
+        """결과 캐시 히트면 응답(메모리 조회만 → 이벤트 루프에서 바로 불러도 됨), 미스면 None."""
+        hit = self.analysis_cache.get(normalize_url(url))
+        if hit is None:
+            return None
+        metrics.incr("analyze.result_cache_hit")
+        result, expires_at = hit
+        # 클라이언트는 남은 수명만큼만 캐시
+        return {**result, "cached": True, "cache_ttl_sec": max(0, int(expires_at - time.time()))}
+
+    @contextmanager
+    def admitted(self) -> Iterator[None]:
+        """캐시 미스 분석의 전역 한도(자리가 없으면 기다리지 않고 Overloaded → 503)."""
+        if not self.analyze_gate.try_enter(0):
+            raise Overloaded(self.cfg.analyze_retry_after_sec)
+        try:
+            yield
+        finally:
+            self.analyze_gate.leave()
+
+    def analyze_foreground(self, url: str, deadline: Deadline) -> Dict[str, Any]:
+        """호버 요청의 캐시 미스 분석(호출 측이 admitted() 안에서 워커 스레드로 부름)."""
+        # 호버 요청이 처리되는 동안 프리페치 워커는 새 작업을 시작하지 않음
+        if self.prefetcher is None:
+            return self.analyze_miss(url, deadline)
+        with self.prefetcher.foreground():
+            return self.analyze_miss(url, deadline)
+
+    def analyze_cached(self, url: str, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        hit = self.cached_result(url)
+        if hit is not None:
+            return hit
+        # 캐시 미스만 전역 한도 적용(캐시 히트는 과부하에서도 그대로 응답)
+        with self.admitted():
+            return self.analyze_miss(url, deadline)
+
+    def analyze_miss(self, url: str, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        key = normalize_url(url)
+        # 입장을 기다리는 사이 같은 URL을 다른 요청이 이미 채웠으면 그대로
+        hit = self.cached_result(url)
+        if hit is not None:
+            return hit
+        result = self.store_result(key, self.analyze_url(url, deadline))
+        if result["partial"]:
+            metrics.incr("analyze.partial")
+            # 과부하로 생략(shed)된 단계만 있으면 뒤에서 다시 돌리지 않음(부하를 더 키우지 않도록)
+            if any(not s.endswith(":shed") for s in result["skipped_stages"]):
+                self.complete_in_background(key, url)
+        return result
+
+    def prefetch(self, client_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if self.prefetcher is None:
+            return {"ok": False, "error": "prefetch_disabled"}
+        links = [
+            (u, near)
+            for u, near in parse_links(payload, self.cfg.prefetch_max_links)
+            if self.analysis_cache.get(normalize_url(u)) is None
+        ]
+        # 분석 차례를 기다리는 동안 DNS는 한꺼번에 미리 해석(기다리지 않음)
+        if self.cfg.dns_stage_enabled:
+            dns_cache.warm(h for h in (host_of(normalize_url(u)) for u, _ in links) if not is_private_host(h))
+        return {"ok": True, **self.prefetcher.submit(client_id, links)}
+
+    def prefetch_one(self, url: str) -> None:
+        if self.analysis_cache.get(url) is None:
+            self.store_result(url, self.analyze_url(url, origin="prefetch"))
+
+    def complete_in_background(self, key: str, url: str) -> None:
+        """마감으로 생략된 단계까지 예산 없이 끝까지 분석 → 결과 캐시 교체(다음 호버부터 전체 판정)."""
+        with self._background_lock:
+            if key in self._background_keys or self._stop.is_set():
+                return
+            # 실행 중 + 대기 중이 한도를 넘으면 버림(결과는 잠정 TTL 뒤 다음 요청이 다시 분석)
+            if len(self._background_keys) >= self._background_max:
+                metrics.incr("analyze.background_dropped")
+                return
+            self._background_keys.add(key)
+
+        def run() -> None:
+            try:
+                self.store_result(key, self.analyze_url(url, origin="background"))
+                metrics.incr("analyze.background_completed")
+            except Exception as e:
+                print("[BACKGROUND ANALYZE ERROR]", url, e)
+            finally:
+                with self._background_lock:
+                    self._background_keys.discard(key)
+
+        self._background_pool.submit(run)
+
+    # ----------------------------
+    # 분석 파이프라인
+    # ----------------------------
+    def analyze_url(self, url: str, deadline: Optional[Deadline] = None, origin: str = "hover") -> Dict[str, Any]:
+        cfg = self.cfg
+        con = self.con
+        domain_reputation = self.domain_reputation
+        deadline = deadline or Deadline(None)
+        metrics.incr("analyze.requests")
+        original = normalize_url(url)
+        original_domain = extract_registered_domain(original)
+
+        # 1) 원본 기준: KISA 빠른 체크(DB)
+        kisa0_url_date = find_url(con, original)
+        kisa0_domain_date = find_domain(con, original_domain) if original_domain else None
+
+        quick_signals = {
+            "original_url": original,
+            "domain": original_domain,
+            "kisa_url_hit_original": kisa0_url_date is not None,
+            "kisa_domain_hit_original": kisa0_domain_date is not None,
+            "is_ip": looks_like_ip_host(original),
+            "is_punycode": is_suspicious_punycode(original),
+            "has_userinfo": has_userinfo(original),
+            "is_https": is_https(original),
+        }
+
+        # 1-1) 고평판 allowlist 빠른 경로: 리다이렉트/KISA 온디맨드/LLM 생략, 규칙 판정만
+        #      (KISA 히트가 있거나 열린 리다이렉트 엔드포인트/사용자 콘텐츠 호스트면 정상 분석)
+        allow = "miss"
+        if kisa0_url_date is None and kisa0_domain_date is None:
+            allow = self.allowlist.match(original)
+        fast_path = allow == "hit"
+        if fast_path:
+            metrics.incr("analyze.allowlist_fast_path")
+        elif allow in ("open_redirect", "user_content"):
+            metrics.incr(f"analyze.allowlist_{allow}")
+
+        # 1-2) 도메인 평판 캐시: 같은 호스트의 다른 경로에서 이미 확인한 사실 재사용
+        #      (리다이렉트 없는 안정적인 도메인이면 추적/KISA 온디맨드 생략, URL 특징만 새로 계산)
+        domain_facts = None
+        if domain_reputation is not None and allow == "miss":
+            domain_facts = domain_reputation.get(host_of(original))
+        domain_cached = domain_reputation is not None and domain_reputation.can_skip_redirect(domain_facts, original)
+        if domain_cached:
+            metrics.incr("analyze.domain_cache_path")
+
+        # 2) Planner(redirect 실행 여부) - 기본은 결정적 fast Planner, LLM_PLANNER=llm일 때만 LLM
+        if fast_path:
+            plan = {"run_redirect": False, "planner": "allowlist"}
+        elif domain_cached:
+            plan = {"run_redirect": False, "planner": "domain_cache"}
+        else:
+            # LLM Planner도 남은 시간의 일부만(모자라면 아예 fast Planner)
+            planner_budget = deadline.share(cfg.deadline_share_planner, cfg.llm_decide_timeout)
+            plan = plan_tools(
+                signals=quick_signals,
+                use_llm=cfg.use_llm and planner_budget * 1000 >= cfg.deadline_min_stage_ms,
+                timeout=planner_budget,
+            )
+
+        deadline.lap("quick")
+
+        # 3) Redirect 추적(남은 시간의 deadline_share_redirect 만큼)
+        rr = None
+        if plan.get("run_redirect", True):
+            budget = deadline.share(cfg.deadline_share_redirect, cfg.redirect_timeout_sec)
+            if budget * 1000 < cfg.deadline_min_stage_ms:
+                deadline.skip("redirect")
+            else:
+                with self.redirect_gate.admit(budget) as admitted:
+                    if admitted:
+                        rr = trace_redirects(
+                            original,
+                            max_hops=cfg.redirect_max_hops,
+                            timeout=deadline.share(cfg.deadline_share_redirect, cfg.redirect_timeout_sec),
+                        )
+                    else:
+                        deadline.skip("redirect:shed")
+                if rr is not None and rr.truncated and budget < cfg.redirect_timeout_sec:
+                    deadline.skip("redirect:partial")
+        final_url = normalize_url(rr.final_url) if rr else original
+        used_redirect = (rr.hops > 0) if rr else False
+        redirect_hops = rr.hops if rr else 0
+        redirect_chain = rr.chain if rr else [original]
+        redirect_cache_hits = rr.cache_hits if rr else 0
+        redirect_truncated = rr.truncated if rr else False
+        redirect_error = rr.error if rr else None
+        client_redirects = rr.client_redirects if rr else 0
+        redirect_blocked = rr.blocked if rr else None
+        deadline.lap("redirect")
+
+        # 3-1) DNS: 최종 호스트(공인 도메인 이름만)의 주소/TTL. 리다이렉트 추적이 이미 해석했으면 캐시 적중
+        final_host = host_of(final_url)
+        dns_answer = None
+        if cfg.dns_stage_enabled and not fast_path and not is_private_host(final_host) and not looks_like_ip_host(final_url):
+            dns_answer = dns_cache.peek(final_host)
+            if dns_answer is None:
+                dns_budget = deadline.share(cfg.deadline_share_dns, DNS_TIMEOUT_SEC)
+                if dns_budget * 1000 < cfg.deadline_min_stage_ms:
+                    deadline.skip("dns")
+                else:
+                    dns_answer = dns_cache.resolve(final_host, timeout=dns_budget)
+                    if dns_answer.error == "timeout":
+                        dns_answer = None
+                        deadline.skip("dns")
+        deadline.lap("dns")
+
+        # 4) final 기준: KISA 재검사(DB)
+        final_domain = extract_registered_domain(final_url)
+
+        kisa_url_date = find_url(con, final_url)
+        kisa_domain_date = find_domain(con, final_domain) if final_domain else None
+        kisa_url_hit = kisa_url_date is not None
+        kisa_domain_hit = kisa_domain_date is not None
+
+        # 4-1) 미스면 온디맨드 API 스캔 + 캐시 후 재검사
+        kisa_lazy = {"ran": False, "matched": False, "pages_scanned": 0, "error": None}
+        if (not kisa_url_hit) and (not kisa_domain_hit) and not fast_path and not domain_cached:
+            # 남은 시간의 deadline_share_kisa 만큼만 쓰는 하위 예산
+            kisa_budget = deadline.share(cfg.deadline_share_kisa)
+            kisa_wanted = cfg.kisa_ondemand and not is_private_host(final_host)
+            if kisa_budget * 1000 < cfg.deadline_min_stage_ms:
+                if kisa_wanted:
+                    deadline.skip("kisa_lazy")
+            elif kisa_wanted:
+                with self.kisa_gate.admit(kisa_budget) as admitted:
+                    if admitted:
+                        sub = None if deadline.unlimited else Deadline(deadline.share(cfg.deadline_share_kisa))
+                        kisa_lazy = self.kisa_lazy_cache(final_url, final_domain, sub)
+                    else:
+                        deadline.skip("kisa_lazy:shed")
+                if kisa_lazy["error"] == "deadline":
+                    deadline.skip("kisa_lazy")
+            kisa_url_date = find_url(con, final_url)
+            kisa_domain_date = find_domain(con, final_domain) if final_domain else None
+            kisa_url_hit = kisa_url_date is not None
+            kisa_domain_hit = kisa_domain_date is not None
+        deadline.lap("kisa")
+
+        # 5) WHOIS(도메인 나이): 캐시에 있을 때만 사용, 없으면 백그라운드 조회 예약(지연 0)
+        whois_days = None
+        whois_err = "disabled"
+        if domain_cached and domain_facts.whois_age_days is not None:
+            whois_days, whois_err = domain_facts.whois_age_days, None
+        elif self.domain_ages is not None and final_domain:
+            whois_days, whois_err = self.domain_ages.lookup(final_domain)
+        deadline.lap("whois")
+
+        # 6) URL 특징 신호(최종 URL 기준)
+        ip_host = looks_like_ip_host(final_url)
+        # IP 호스트면 대역 분류: 특수 목적(private 등) / 악성 호스팅 목록 라벨
+        ip_class = special_label(final_host) if ip_host else None
+        resolved = [final_host] if ip_host else list(dns_answer.addresses if dns_answer else ())
+        abuse_range = None
+        if self.abuse_ranges is not None:
+            abuse_range = next((label for label in map(self.abuse_ranges.lookup, resolved) if label), None)
+        resolves_private = dns_answer is not None and dns_answer.private
+        dns_short_ttl = dns_answer is not None and dns_answer.ttl is not None and dns_answer.ttl < cfg.dns_short_ttl_sec
+        puny = is_suspicious_punycode(final_url)
+        userinfo = has_userinfo(final_url)
+        nonstd_port = has_nonstandard_port(final_url)
+        https = is_https(final_url)
+        subdomains = count_subdomains(final_url)
+        ulen = url_length(final_url)
+        enc = percent_encoded_count(final_url)
+        qn = count_query_params(final_url)
+        kw = suspicious_keyword_hit(final_url)
+        shortener = is_known_shortener(final_url)
+        non_ascii = has_non_ascii(final_url)
+
+        # 7) 리다이렉트 체인 도메인 변경 여부
+        domain_switch_count = _chain_domain_count(redirect_chain[:30])
+        domain_switched = False
+        if used_redirect:
+            if original_domain and final_domain and original_domain != final_domain:
+                domain_switched = True
+            elif domain_switch_count >= 2:
+                domain_switched = True
+
+        # 8) 규칙 기반 점수(항상 baseline + fallback)
+        #    입력을 그대로 이벤트 로그에 남겨 오프라인 재생(replay)에 사용
+        rule_inputs = {
+            "kisa_url_hit": kisa_url_hit,
+            "kisa_domain_hit": (kisa_domain_hit and not kisa_url_hit),
+
+            "redirect_hops": redirect_hops,
+            "used_redirect": used_redirect,
+            "domain_switched": domain_switched,
+            "domain_switch_count": domain_switch_count,
+            "redirect_truncated": redirect_truncated,
+
+            "is_ip": ip_host,
+            "abusive_ip_range": abuse_range is not None,
+            "resolves_private": resolves_private,
+            "dns_short_ttl": dns_short_ttl,
+            "is_punycode": puny,
+            "has_userinfo": userinfo,
+            "nonstandard_port": nonstd_port,
+            "https": https,
+            "subdomains": subdomains,
+            "is_shortener": shortener,
+
+            "url_len": ulen,
+            "enc_count": enc,
+            "query_params": qn,
+            "keyword_hit": kw,
+            "has_non_ascii": non_ascii,
+
+            "whois_age_days": whois_days,
+            "whois_error": whois_err,
+        }
+        ruled = score_url(**rule_inputs)
+        deadline.lap("rules")
+
+        # 도메인 평판 갱신(오류 없이 끝까지 추적한 체인만 리다이렉트 관측으로 셈)
+        if domain_reputation is not None and not fast_path and original_domain:
+            same_site = final_domain == original_domain
+            domain_reputation.record(
+                host_of(original),
+                domain=original_domain,
+                kisa_domain_hit=kisa_domain_hit if same_site else kisa0_domain_date is not None,
+                is_shortener=is_known_shortener(original),
+                whois_age_days=whois_days if same_site else None,
+                traced=rr is not None and not rr.error and not redirect_truncated,
+                redirected=used_redirect or not same_site,
+            )
+
+        observations = {
+            "original_url": original,
+            "final_url": final_url,
+            "redirect_hops": redirect_hops,
+            "redirect_chain": redirect_chain,
+            "redirect_cache_hits": redirect_cache_hits,
+            "redirect_truncated": redirect_truncated,
+            "redirect_error": redirect_error,
+            "client_redirects": client_redirects,
+            "redirect_blocked": redirect_blocked,
+            "domain": final_domain,
+            "domain_switched": domain_switched,
+            "domain_switch_count": domain_switch_count,
+
+            "kisa_url_hit": kisa_url_hit,
+            "kisa_url_date": kisa_url_date,
+            "kisa_domain_hit": kisa_domain_hit,
+            "kisa_domain_date": kisa_domain_date,
+            "kisa_lazy": kisa_lazy,
+
+            "whois_age_days": whois_days,
+
+            "is_ip": ip_host,
+            "ip_class": ip_class,
+            "abuse_range": abuse_range,
+            "dns": dns_answer.to_dict() if dns_answer else None,
+            "is_punycode": puny,
+            "has_userinfo": userinfo,
+            "nonstandard_port": nonstd_port,
+            "https": https,
+            "subdomains": subdomains,
+            "url_len": ulen,
+            "enc_count": enc,
+            "query_params": qn,
+            "keyword_hit": kw,
+            "is_shortener": shortener,
+            "has_non_ascii": non_ascii,
+
+            "planner": plan,
+            "allowlist": allow,
+            "domain_cache": domain_cached,
+        }
+
+        rule_result = {"risk_score": ruled.score, "verdict": ruled.verdict, "reasons": ruled.reasons}
+
+        # 9) LLM Decider - 경계 근처(애매한) 규칙 결과일 때만 호출
+        llm_out = None
+        if cfg.use_llm and not fast_path:
+            call_llm, gate_reason = llm_gate(signals=observations, raw_score=ruled.debug["raw"])
+            observations["llm_gate"] = gate_reason
+            llm_budget = deadline.share(1.0, cfg.llm_decide_timeout)
+            if call_llm and llm_budget * 1000 < cfg.deadline_min_stage_ms:
+                deadline.skip("llm")
+            elif call_llm:
+                with self.llm_stage_gate.admit(llm_budget) as admitted:
+                    if admitted:
+                        llm_budget = deadline.share(1.0, cfg.llm_decide_timeout)
+                        llm_out = llm_decide(
+                            signals=observations,
+                            rule_result=rule_result,
+                            cache=self.llm_cache,
+                            batcher=self.llm_batcher,
+                            timeout=llm_budget,
+                        )
+                        if llm_out is None and llm_budget < cfg.llm_decide_timeout and deadline.remaining() <= 0:
+                            deadline.skip("llm:partial")
+                        else:
+                            record_llm_outcome(rule_result, llm_out)
+                    else:
+                        deadline.skip("llm:shed")
+        final = llm_out if llm_out else rule_result
+        source = "llm" if llm_out else "rules"
+        deadline.lap("llm")
+
+        result = {
+            **observations,
+            "risk_score": final["risk_score"],
+            "verdict": final["verdict"],
+            "reasons": final["reasons"],
+            "source": source,
+            "debug": ruled.debug,
+            "whois_error": whois_err,
+            "partial": bool(deadline.skipped),
+            "skipped_stages": list(deadline.skipped),
+            "elapsed_ms": deadline.elapsed_ms(),
+            "stage_ms": dict(deadline.stage_ms),
+        }
+
+        if self.event_log is not None:
+            # 버퍼에 넣기만 함(디스크 기록은 백그라운드 writer)
+            self.event_log.emit({
+                "ts": time.time(),
+                "origin": origin,
+                "input_url": url,
+                "final_url": final_url,
+                "domain": final_domain,
+                "verdict": final["verdict"],
+                "risk_score": final["risk_score"],
+                "source": source,
+                "rule_verdict": ruled.verdict,
+                "rule_score": ruled.score,
+                "rule_raw": ruled.debug.get("raw"),
+                "rule_inputs": rule_inputs,
+                "kisa_url_hit": kisa_url_hit,
+                "kisa_domain_hit": kisa_domain_hit,
+                "allowlist": allow,
+                "llm_gate": observations.get("llm_gate"),
+                "skipped_stages": result["skipped_stages"],
+                "stage_ms": result["stage_ms"],
+                "elapsed_ms": result["elapsed_ms"],
+            })
+        return result
+
+
+def _chain_domain_count(chain: Iterable[str]) -> int:
+    """체인에 나온 등록 도메인(없으면 호스트) 개수, 최소 1."""
+    rd_set = set()
+    for u in chain:
+        rd = extract_registered_domain(normalize_url(u))
+        if rd:
+            rd_set.add(rd)
+        else:
+            h = host_of(u)
+            if h:
+                rd_set.add(h)
+    return len(rd_set) if rd_set else 1
+
+
+def _llm_avoided_ratio() -> float:
+    skipped = metrics.get("llm.gate.skipped_kisa") + metrics.get("llm.gate.skipped_confident")
+    total = skipped + metrics.get("llm.gate.called")
+    return round(skipped / total, 4) if total else 0.0
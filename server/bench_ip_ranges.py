@@ -0,0 +1,104 @@
+# server/bench_ip_ranges.py
+"""
+ip_ranges.RangeIndex 벤치마크: 무작위 CIDR(중첩 포함) N개로 빌드 시간 / 조회 처리량 측정,
+일부 조회는 선형 스캔(최장 접두사 일치)과 결과를 대조.
+
+사용 예:
+  python bench_ip_ranges.py --ranges 200000 --lookups 500000
+"""
+from __future__ import annotations
+
+import argparse
+import ipaddress
+import random
+import sys
+import time
+from typing import List, Optional, Tuple
+
+from ip_ranges import RangeIndex
+
+
+def _random_ranges(n: int, rng: random.Random, v6_ratio: float) -> List[Tuple[str, str]]:
+    out: List[Tuple[str, str]] = []
+    for i in range(n):
+        label = f"list{i % 7}"
+        if rng.random() < v6_ratio:
+            prefix = rng.randint(32, 64)
+            addr = rng.getrandbits(128) & ~((1 << (128 - prefix)) - 1)
+            out.append((f"{ipaddress.IPv6Address(addr)}/{prefix}", label))
+        else:
+            # 짧은 접두사도 섞어서 중첩 대역이 생기게
+            prefix = rng.choice((8, 12, 16, 20, 22, 24, 24, 24, 28, 32))
+            addr = rng.getrandbits(32) & ~((1 << (32 - prefix)) - 1)
+            out.append((f"{ipaddress.IPv4Address(addr)}/{prefix}", label))
+    return out
+
+
+def _random_ips(n: int, rng: random.Random, v6_ratio: float) -> List[str]:
+    return [
+        str(ipaddress.IPv6Address(rng.getrandbits(128))) if rng.random() < v6_ratio
+        else str(ipaddress.IPv4Address(rng.getrandbits(32)))
+        for _ in range(n)
+    ]
+
+
+def _linear_lookup(nets: List[Tuple[ipaddress._BaseNetwork, str]], ip: str) -> Optional[str]:
+    """기준 구현: 가장 긴 접두사, 같으면 나중 항목(RangeIndex와 같은 규칙)."""
+    addr = ipaddress.ip_address(ip)
+    best = None
+    best_len = -1
+    for net, label in nets:
+        if net.version == addr.version and addr in net and net.prefixlen >= best_len:
+            best, best_len = label, net.prefixlen
+    return best
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="CIDR 구간 인덱스 벤치마크")
+    ap.add_argument("--ranges", type=int, default=100000)
+    ap.add_argument("--lookups", type=int, default=200000)
+    ap.add_argument("--v6-ratio", type=float, default=0.2)
+    ap.add_argument("--verify", type=int, default=200, help="선형 스캔과 대조할 조회 수(0이면 생략)")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    pairs = _random_ranges(args.ranges, rng, args.v6_ratio)
+    ips = _random_ips(args.lookups, rng, args.v6_ratio)
+    # 일부는 목록 안 주소를 골라 적중도 측정되게
+    for i in range(0, len(ips), 4):
+        net = ipaddress.ip_network(pairs[rng.randrange(len(pairs))][0])
+        ips[i] = str(net.network_address + rng.randrange(net.num_addresses))
+    addrs = [ipaddress.ip_address(ip) for ip in ips]
+
+    t0 = time.perf_counter()
+    idx = RangeIndex.from_pairs(pairs)
+    build = time.perf_counter() - t0
+    print(f"build: {args.ranges} ranges → {len(idx)} intervals in {build * 1000:.1f} ms")
+
+    t0 = time.perf_counter()
+    hits = sum(1 for a in addrs if idx.lookup(a) is not None)
+    dt = time.perf_counter() - t0
+    print(f"lookup(parsed): {len(addrs)} in {dt * 1000:.1f} ms → {len(addrs) / dt:,.0f}/s, {dt / len(addrs) * 1e6:.2f} µs/op, hits={hits}")
+
+    t0 = time.perf_counter()
+    for ip in ips:
+        idx.lookup(ip)
+    dt = time.perf_counter() - t0
+    print(f"lookup(str):    {len(ips)} in {dt * 1000:.1f} ms → {len(ips) / dt:,.0f}/s, {dt / len(ips) * 1e6:.2f} µs/op")
+
+    if args.verify:
+        nets = [(ipaddress.ip_network(c), label) for c, label in pairs]
+        sample = ips[: args.verify]
+        t0 = time.perf_counter()
+        expected = [_linear_lookup(nets, ip) for ip in sample]
+        dt = time.perf_counter() - t0
+        mismatches = sum(1 for ip, e in zip(sample, expected) if idx.lookup(ip) != e)
+        print(f"linear scan:    {len(sample)} in {dt * 1000:.1f} ms → {dt / len(sample) * 1e6:.0f} µs/op, mismatches={mismatches}")
+        if mismatches:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
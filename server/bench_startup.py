@@ -0,0 +1,92 @@
+# server/bench_startup.py
+"""
+서버 기동 시간 벤치마크: 매번 새 파이썬 프로세스에서
+  import main → 앱 기동(lifespan: DB/캐시/워커 준비) → 첫 /analyze 응답
+까지 구간별 시간(ms)을 재고 runs회의 최소/중앙값 출력. DB와 이벤트 로그는 임시 디렉터리 사용.
+
+사용 예:
+  python bench_startup.py --runs 5
+  python bench_startup.py --url http://127.0.0.1:9000/short --env PREFETCH_ENABLED=false
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+_CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    t2 = time.perf_counter()
+    r = client.post("/analyze", json={"url": sys.argv[1], "deadline_ms": 0})
+    t3 = time.perf_counter()
+    stages = main.app.state.analyzer.startup_ms
+t4 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "startup_ms": (t2 - t1) * 1000,
+    "first_analyze_ms": (t3 - t2) * 1000,
+    "shutdown_ms": (t4 - t3) * 1000,
+    "status": r.status_code,
+    "stages": stages,
+}))
+"""
+
+
+def _run_once(url: str, env: Dict[str, str]) -> Dict[str, object]:
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD, url],
+        cwd=Path(__file__).parent,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # 마지막 줄이 결과(앞 줄은 [BOOT]/[ALLOWLIST] 로그)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="서버 기동 시간 벤치마크")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--url", default="http://127.0.0.1:9/login", help="첫 /analyze 요청 URL")
+    ap.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="자식 프로세스 환경 변수(반복 가능)")
+    args = ap.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "DB_PATH": str(Path(tmp) / "bench.db"),
+            "EVENT_LOG_DIR": str(Path(tmp) / "events"),
+            "KISA_ONDEMAND": "false",
+        }
+        env.update(kv.split("=", 1) for kv in args.env)
+        for i in range(max(1, args.runs)):
+            r = _run_once(args.url, env)
+            results.append(r)
+            print(
+                f"run {i + 1}: import {r['import_ms']:.0f} ms, startup {r['startup_ms']:.0f} ms, "
+                f"first /analyze {r['first_analyze_ms']:.0f} ms (HTTP {r['status']}), "
+                f"shutdown {r['shutdown_ms']:.0f} ms, stages={r['stages']}"
+            )
+
+    print()
+    for key in ("import_ms", "startup_ms", "first_analyze_ms", "shutdown_ms"):
+        vals = [float(r[key]) for r in results]
+        print(f"{key:17s} min {min(vals):7.1f}  median {statistics.median(vals):7.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+# server/blocklist_filter.py
+from __future__ import annotations
+
+import base64
+import hashlib
+import math
+import os
+import random
+import re
+import string
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+from url_utils import normalize_url
+
+# 확장프로그램(background.js)과 같은 해시를 써야 함: FNV-1a 32bit 두 개로 double hashing
+_FNV_PRIME = 0x01000193
+_SEED1 = 0x811C9DC5
+_SEED2 = 0x050C5D1F
+
+
+# 브라우저(WHATWG URL)가 퍼센트 인코딩하는 문자(제어 문자/공백/비ASCII 외 추가분)
+_PATH_ENCODE = set('"<>`{}')
+_QUERY_ENCODE = set('"<>\'')
+_PCT_RE = re.compile(r"%[0-9a-fA-F]{2}")
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def _pct_encode(s: str, extra: set) -> str:
+    out = []
+    for ch in s:
+        if ord(ch) <= 0x20 or ord(ch) >= 0x7F or ch in extra:
+            out.append("".join(f"%{b:02X}" for b in ch.encode("utf-8")))
+        else:
+            out.append(ch)
+    return _PCT_RE.sub(lambda m: m.group(0).upper(), "".join(out))
+
+
+def domain_key(host: str) -> str:
+    """호스트/도메인 → 필터 키(IDN은 punycode, 브라우저 URL.hostname과 같은 표기)."""
+    host = (host or "").lower().rstrip(".")
+    try:
+        return host.encode("idna").decode("ascii")
+    except UnicodeError:
+        return host
+
+
+def url_key(url: str) -> str:
+    """
+    URL → 필터 키(확장프로그램 background.js filterUrlKey와 같은 규칙).
+    normalize_url 규칙에 브라우저가 a.href에 주는 표기를 더함: 호스트 punycode, 기본 포트 생략,
+    경로/쿼리의 공백·비ASCII 등은 UTF-8 퍼센트 인코딩, %xx는 대문자.
+    """
+    url = (url or "").strip()
+    if not url:
+        return ""
+    try:
+        # normalize_url은 IPv6 대괄호를 잃으므로 원문을 직접 분해(같은 규칙: scheme 기본 https, fragment 제거)
+        sp = urlsplit(url if "://" in url else "https://" + url)
+        port = sp.port
+    except ValueError:
+        return normalize_url(url)
+    host = domain_key(sp.hostname or "")
+    if ":" in host:
+        host = f"[{host}]"
+    userinfo = ""
+    if sp.username:
+        userinfo = sp.username + (f":{sp.password}" if sp.password else "") + "@"
+    if port and port != _DEFAULT_PORTS.get(sp.scheme.lower()):
+        host += f":{port}"
+    path = _pct_encode(sp.path or "/", _PATH_ENCODE)
+    query = _pct_encode(sp.query, _QUERY_ENCODE)
+    return f"{sp.scheme.lower()}://{userinfo}{host}{path}" + (f"?{query}" if query else "")
+
+
+def _fnv1a32(data: bytes, seed: int) -> int:
+    h = seed
+    for b in data:
+        h ^= b
+        h = (h * _FNV_PRIME) & 0xFFFFFFFF
+    return h
+
+
+class BloomFilter:
+    """
+    비트 배열 Bloom filter. index_i = (h1 + i*h2) mod m (h2는 홀수로 강제)
+    - 없는 항목을 있다고 할 수는 있지만(오탐, fpr), 있는 항목을 놓치지는 않음
+    """
+
+    def __init__(self, m_bits: int, k: int):
+        self.m = max(8, m_bits)
+        self.k = max(1, k)
+        self.bits = bytearray((self.m + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, n: int, fpr: float) -> "BloomFilter":
+        n = max(1, n)
+        m = math.ceil(-n * math.log(fpr) / (math.log(2) ** 2))
+        k = max(1, round(m / n * math.log(2)))
+        return cls(m, k)
+
+    def _indexes(self, item: str) -> Iterable[int]:
+        data = item.encode("utf-8")
+        h1 = _fnv1a32(data, _SEED1)
+        h2 = _fnv1a32(data, _SEED2) | 1
+        for i in range(self.k):
+            yield (h1 + i * h2) % self.m
+
+    def add(self, item: str) -> None:
+        for idx in self._indexes(item):
+            self.bits[idx >> 3] |= 1 << (idx & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[idx >> 3] & (1 << (idx & 7)) for idx in self._indexes(item))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"m": self.m, "k": self.k, "bits": base64.b64encode(bytes(self.bits)).decode("ascii")}
+
+
+def _measure_fpr(bf: BloomFilter, probes: int = 5000) -> float:
+    """집합에 없을 게 확실한 랜덤 문자열로 실제 오탐률 측정."""
+    rnd = random.Random(42)
+    alphabet = string.ascii_lowercase + string.digits
+    fp = 0
+    for _ in range(probes):
+        s = "probe-" + "".join(rnd.choice(alphabet) for _ in range(24)) + ".invalid"
+        if s in bf:
+            fp += 1
+    return round(fp / probes, 6)
+
+
+def _delta(old: bytearray, new: bytearray) -> Optional[List[List[int]]]:
+    """
+    old → new 로 바뀐 바이트만 [offset, value] 목록으로.
+    Bloom filter는 추가만 가능하므로 old에서 꺼진 비트가 있으면(삭제) 델타 불가 → None.
+    """
+    if len(old) != len(new):
+        return None
+    out: List[List[int]] = []
+    for i, (a, b) in enumerate(zip(old, new)):
+        if a != b:
+            if a & ~b:
+                return None
+            out.append([i, b])
+    return out
+
+
+class BlocklistPublisher:
+    """
+    KISA URL/도메인 집합을 버전 붙은 Bloom filter로 배포.
+    - 용량(capacity)은 여유 있게 잡고 넘칠 때만 2배로 키움 → 평소엔 m/k가 같아서 작은 델타 가능
+    - 최근 history_size개 버전의 비트 배열을 보관해 since=버전 요청에 델타 응답
+    - 버전은 필터 내용의 해시 → 재시작/워커가 달라도 같은 내용이면 같은 버전,
+      since가 이 프로세스 이력에 없으면(다른 워커가 만든 버전 등) 항상 전체 응답
+    """
+
+    def __init__(self, *, fpr: float = 0.001, history_size: int = 8, min_capacity: int = 50000):
+        self.fpr = fpr
+        self.history_size = history_size
+        self.min_capacity = min_capacity
+        self.version = ""
+        self.built_at = 0.0
+        self.filters: Dict[str, BloomFilter] = {}
+        self.capacity: Dict[str, int] = {}
+        self.stats: Dict[str, Any] = {}
+        self._history: "OrderedDict[str, Dict[str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _capacity_for(self, name: str, n: int) -> int:
+        cap = self.capacity.get(name, self.min_capacity)
+        while cap < n:
+            cap *= 2
+        self.capacity[name] = cap
+        return cap
+
+    @staticmethod
+    def _content_version(filters: Dict[str, BloomFilter]) -> str:
+        h = hashlib.sha256()
+        for name in sorted(filters):
+            bf = filters[name]
+            h.update(f"{name}:{bf.m}:{bf.k}:".encode())
+            h.update(bf.bits)
+        return h.hexdigest()[:16]
+
+    def rebuild(self, sets: Dict[str, Iterable[str]]) -> bool:
+        """새로 빌드. 내용이 바뀌었으면 버전을 올리고 True."""
+        t0 = time.perf_counter()
+        built: Dict[str, BloomFilter] = {}
+        counts: Dict[str, int] = {}
+        for name, items in sets.items():
+            items = list(items)
+            # 빈 집합은 최소 크기(확장프로그램이 수십 KB 빈 비트를 받지 않도록), 채워지면 그때 전체 1회
+            cap = self._capacity_for(name, len(items)) if items else 1
+            bf = BloomFilter.for_capacity(cap, self.fpr)
+            for it in items:
+                bf.add(it)
+            built[name] = bf
+            counts[name] = len(items)
+        build_ms = round((time.perf_counter() - t0) * 1000, 1)
+
+        with self._lock:
+            changed = any(
+                name not in self.filters or self.filters[name].bits != bf.bits for name, bf in built.items()
+            )
+            if changed:
+                self.version = self._content_version(built)
+                self.filters = built
+                self._history.pop(self.version, None)
+                self._history[self.version] = {n: bytes(bf.bits) for n, bf in built.items()}
+                while len(self._history) > self.history_size:
+                    self._history.popitem(last=False)
+            self.built_at = time.time()
+            self.stats = {
+                "version": self.version,
+                "build_ms": build_ms,
+                "items": counts,
+                "size_bytes": {n: len(bf.bits) for n, bf in self.filters.items()},
+                "k": {n: bf.k for n, bf in self.filters.items()},
+                "target_fpr": self.fpr,
+                "measured_fpr": {n: _measure_fpr(bf) for n, bf in self.filters.items()},
+            }
+        print("[BLOCKLIST]", self.stats)
+        return changed
+
+    def payload(self, since: Optional[str] = None) -> Dict[str, Any]:
+        """since 버전이 이 프로세스 이력에 있고 델타가 가능하면 델타, 아니면 전체."""
+        with self._lock:
+            out: Dict[str, Any] = {"version": self.version, "hash": "fnv1a32-double", "filters": {}}
+            base = self._history.get(since) if since is not None else None
+            for name, bf in self.filters.items():
+                d = _delta(bytearray(base[name]), bf.bits) if base and name in base else None
+                if d is not None:
+                    out["filters"][name] = {"m": bf.m, "k": bf.k, "delta": d}
+                else:
+                    out["filters"][name] = bf.to_dict()
+            out["delta_from"] = since if base and all("delta" in f for f in out["filters"].values()) else None
+            return out
+
+
+def publisher_from_env() -> BlocklistPublisher:
+    return BlocklistPublisher(
+        fpr=float(os.getenv("BLOCKLIST_FPR", "0.001")),
+        history_size=int(os.getenv("BLOCKLIST_HISTORY", "8")),
+        min_capacity=int(os.getenv("BLOCKLIST_MIN_CAPACITY", "50000")),
+    )
@@ -0,0 +1,91 @@
+# server/cache_utils.py
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """
+    스레드 안전 TTL + LRU 메모리 캐시.
+    - 항목마다 TTL 지정 가능(기본 default_ttl)
+    - maxsize 초과 시 가장 오래 안 쓴 항목부터 제거
+    """
+
+    def __init__(self, maxsize: int = 10000, default_ttl: float = 600.0):
+        self.maxsize = max(1, maxsize)
+        self.default_ttl = default_ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[V]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: V, ttl: Optional[float] = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[1] if item else None
+
+    def discard_if(self, pred: Callable[[Hashable, V], bool]) -> int:
+        """pred(key, value)가 True인 항목 모두 제거(전체 순회 → 드물게 부르는 무효화용)."""
+        with self._lock:
+            keys = [k for k, (_, v) in self._data.items() if pred(k, v)]
+            for k in keys:
+                del self._data[k]
+        return len(keys)
+
+    def expires_in(self, key: Hashable) -> Optional[float]:
+        """남은 수명(초), 없거나 만료면 None(LRU 순서/히트 집계는 건드리지 않음)."""
+        with self._lock:
+            item = self._data.get(key)
+        if item is None:
+            return None
+        left = item[0] - time.monotonic()
+        return left if left > 0 else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
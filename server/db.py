@@ -1,6 +1,6 @@
 import sqlite3
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Iterator, Optional, Tuple
 
 def connect(db_path: str) -> sqlite3.Connection:
     Path(db_path).parent.mkdir(parents=True, exist_ok=True)
@@ -23,6 +23,14 @@ def init_db(con: sqlite3.Connection) -> None:
     );
     """)
     con.execute("CREATE INDEX IF NOT EXISTS idx_phishing_domain_domain ON phishing_domain(domain);")
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS whois_cache (
+      domain TEXT PRIMARY KEY,
+      creation_date TEXT,
+      error TEXT,
+      expires_at REAL
+    );
+    """)
     con.commit()
 
 def upsert_url(con: sqlite3.Connection, url: str, date: Optional[str]) -> None:
@@ -45,3 +53,29 @@ def find_domain(con: sqlite3.Connection, domain: str) -> Optional[str]:
     cur = con.execute("SELECT first_seen_date FROM phishing_domain WHERE domain=?", (domain,))
     row = cur.fetchone()
     return row[0] if row else None
+
+def upsert_whois(
+    con: sqlite3.Connection,
+    domain: str,
+    creation_date: Optional[str],
+    error: Optional[str],
+    expires_at: float,
+) -> None:
+    con.execute(
+        "INSERT OR REPLACE INTO whois_cache(domain, creation_date, error, expires_at) VALUES (?, ?, ?, ?)",
+        (domain, creation_date, error, expires_at),
+    )
+
+def find_whois(con: sqlite3.Connection, domain: str) -> Optional[Tuple[Optional[str], Optional[str], float]]:
+    """(creation_date, error, expires_at) 또는 None."""
+    cur = con.execute("SELECT creation_date, error, expires_at FROM whois_cache WHERE domain=?", (domain,))
+    row = cur.fetchone()
+    return (row[0], row[1], row[2]) if row else None
+
+def iter_urls(con: sqlite3.Connection) -> Iterator[str]:
+    for (url,) in con.execute("SELECT url FROM phishing_url"):
+        yield url
+
+def iter_domains(con: sqlite3.Connection) -> Iterator[str]:
+    for (domain,) in con.execute("SELECT domain FROM phishing_domain"):
+        yield domain
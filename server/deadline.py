@@ -0,0 +1,51 @@
+# server/deadline.py
+from __future__ import annotations
+
+import math
+import time
+from typing import Dict, List, Optional
+
+
+class Deadline:
+    """
+    요청 1건의 전체 시간 예산(단계별로 남은 시간의 일부를 나눠 씀).
+    - total_sec가 None/0 이하면 무제한(remaining=inf)
+    - share(frac, cap): 남은 시간 × frac, cap(단계 자체 타임아웃)보다 크지 않게
+    - 못 돌리거나 잘린 단계는 skipped에 기록 → 응답의 skipped_stages
+    - lap(stage): 직전 lap 이후 걸린 시간을 단계별로 누적(stage_ms, 이벤트 로그용)
+    """
+
+    def __init__(self, total_sec: Optional[float], *, reserve_sec: float = 0.0):
+        self.total_sec = total_sec if total_sec and total_sec > 0 else None
+        # 규칙 점수 계산/직렬화 몫으로 남겨 두는 시간
+        self.reserve_sec = max(0.0, reserve_sec)
+        self.started = time.monotonic()
+        self.expires_at = self.started + self.total_sec if self.total_sec else math.inf
+        self.skipped: List[str] = []
+        self.stage_ms: Dict[str, int] = {}
+        self._lap = self.started
+
+    @property
+    def unlimited(self) -> bool:
+        return self.total_sec is None
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic() - self.reserve_sec)
+
+    def share(self, frac: float, cap: Optional[float] = None) -> float:
+        t = self.remaining() * frac if not self.unlimited else math.inf
+        if cap is not None:
+            t = min(t, cap)
+        return t
+
+    def skip(self, stage: str) -> None:
+        if stage not in self.skipped:
+            self.skipped.append(stage)
+
+    def lap(self, stage: str) -> None:
+        now = time.monotonic()
+        self.stage_ms[stage] = self.stage_ms.get(stage, 0) + int((now - self._lap) * 1000)
+        self._lap = now
+
+    def elapsed_ms(self) -> int:
+        return int((time.monotonic() - self.started) * 1000)
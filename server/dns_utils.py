@@ -0,0 +1,300 @@
+# server/dns_utils.py
+from __future__ import annotations
+
+import os
+import socket
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import metrics
+from cache_utils import TTLCache
+from ip_ranges import parse_ip, special_label
+
+try:
+    import dns.exception
+    import dns.resolver
+except ImportError:  # dnspython 없으면 OS 리졸버(getaddrinfo, TTL 모름)
+    dns = None
+
+# 리졸버: auto(dnspython 있으면 사용) | system | dnspython
+DNS_RESOLVER = os.getenv("DNS_RESOLVER", "auto").strip().lower()
+# 직접 질의할 네임서버(쉼표 구분 ip 또는 ip:port, 비우면 /etc/resolv.conf) - 로컬 스텁 리졸버 테스트용
+DNS_NAMESERVERS = [s.strip() for s in os.getenv("DNS_NAMESERVERS", "").split(",") if s.strip()]
+DNS_TIMEOUT_SEC = float(os.getenv("DNS_TIMEOUT_SEC", "2.0"))
+DNS_CACHE_MAX = int(os.getenv("DNS_CACHE_MAX", "20000"))
+DNS_DEFAULT_TTL_SEC = float(os.getenv("DNS_DEFAULT_TTL_SEC", "60"))   # TTL을 모를 때(OS 리졸버)
+DNS_MIN_TTL_SEC = float(os.getenv("DNS_MIN_TTL_SEC", "5"))
+DNS_MAX_TTL_SEC = float(os.getenv("DNS_MAX_TTL_SEC", "3600"))
+DNS_NEGATIVE_TTL_SEC = float(os.getenv("DNS_NEGATIVE_TTL_SEC", "30"))
+DNS_WORKERS = int(os.getenv("DNS_WORKERS", "8"))
+# dnspython은 hosts 파일을 안 읽으므로 직접 먼저 확인(비우면 안 봄)
+DNS_HOSTS_FILE = os.getenv("DNS_HOSTS_FILE", "/etc/hosts").strip()
+
+# 리졸버 = (host, timeout) → (주소 목록, 레코드 TTL 또는 None). 없는 이름이면 DnsLookupError
+Resolver = Callable[[str, float], Tuple[List[str], Optional[int]]]
+
+
+class DnsLookupError(Exception):
+    """NXDOMAIN / 응답 없음(확정적 실패)."""
+
+
+@dataclass(frozen=True)
+class DnsAnswer:
+    host: str
+    addresses: Tuple[str, ...]
+    ttl: Optional[int] = None       # 레코드 TTL(초, 받은 시점 값). OS 리졸버/IP 리터럴이면 None
+    error: Optional[str] = None     # nxdomain | timeout | 그 밖의 오류 문자열
+
+    @property
+    def private(self) -> bool:
+        """해석된 주소 중 하나라도 내부망/예약 대역이면 True."""
+        return any(special_label(a) is not None for a in self.addresses)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"addresses": list(self.addresses), "ttl": self.ttl, "error": self.error}
+
+
+def system_resolver(host: str, timeout: float) -> Tuple[List[str], Optional[int]]:
+    """getaddrinfo(타임아웃은 DnsCache가 future 대기로 처리, TTL은 알 수 없음)."""
+    try:
+        infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        if e.errno in (socket.EAI_NONAME, getattr(socket, "EAI_NODATA", socket.EAI_NONAME)):
+            raise DnsLookupError("nxdomain") from e
+        raise
+    addrs: List[str] = []
+    for info in infos:
+        a = info[4][0]
+        if a not in addrs:
+            addrs.append(a)
+    return addrs, None
+
+
+class HostsFile:
+    """
+    hosts 파일(/etc/hosts) 조회. 파일이 바뀌면(mtime) 다시 읽음.
+    localhost / *.localhost는 파일에 없어도 루프백(RFC 6761).
+    """
+
+    def __init__(self, path: str = DNS_HOSTS_FILE):
+        self.path = path
+        self._mtime: Optional[float] = None
+        self._names: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, List[str]]:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return {}
+        with self._lock:
+            if mtime != self._mtime:
+                names: Dict[str, List[str]] = {}
+                try:
+                    with open(self.path, encoding="utf-8", errors="replace") as f:
+                        for line in f:
+                            fields = line.split("#", 1)[0].split()
+                            if len(fields) < 2 or parse_ip(fields[0]) is None:
+                                continue
+                            for name in fields[1:]:
+                                addrs = names.setdefault(name.lower().rstrip("."), [])
+                                if fields[0] not in addrs:
+                                    addrs.append(fields[0])
+                except OSError:
+                    return {}
+                self._names, self._mtime = names, mtime
+            return self._names
+
+    def lookup(self, host: str) -> Optional[List[str]]:
+        host = host.lower().rstrip(".")
+        addrs = self._load().get(host) if self.path else None
+        if addrs:
+            return list(addrs)
+        if host == "localhost" or host.endswith(".localhost"):
+            return ["127.0.0.1", "::1"]
+        return None
+
+
+class DnspythonResolver:
+    """
+    dnspython으로 A(없으면 AAAA) 질의 → 레코드 TTL까지 얻음.
+    nameservers에 '127.0.0.1:5353' 같은 로컬 스텁 리졸버를 주면 그쪽으로만 질의.
+    hosts 파일/localhost는 질의 전에 로컬에서 해석(OS 리졸버와 같은 결과, TTL은 모름).
+    """
+
+    def __init__(self, nameservers: Optional[List[str]] = None, hosts: Optional[HostsFile] = None):
+        if dns is None:
+            raise RuntimeError("dnspython이 설치되어 있지 않습니다.")
+        self._hosts = hosts or HostsFile()
+        self._resolver = dns.resolver.Resolver(configure=not nameservers)
+        if nameservers:
+            ips = []
+            for ns in nameservers:
+                ip, _, port = ns.rpartition(":") if ns.count(":") == 1 else (ns, "", "")
+                ips.append(ip)
+                if port:
+                    self._resolver.nameserver_ports[ip] = int(port)
+            self._resolver.nameservers = ips
+
+    def __call__(self, host: str, timeout: float) -> Tuple[List[str], Optional[int]]:
+        local = self._hosts.lookup(host)
+        if local:
+            metrics.incr("dns.hosts_file")
+            return local, None
+        deadline = time.monotonic() + timeout
+        try:
+            for rdtype in ("A", "AAAA"):
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    raise TimeoutError("dns timeout")
+                ans = self._resolver.resolve(host, rdtype, lifetime=left, raise_on_no_answer=False)
+                if ans.rrset:
+                    return [r.to_text() for r in ans.rrset], int(ans.rrset.ttl)
+        except dns.resolver.NXDOMAIN as e:
+            raise DnsLookupError("nxdomain") from e
+        except dns.exception.Timeout as e:
+            raise TimeoutError("dns timeout") from e
+        raise DnsLookupError("no answer")
+
+
+def make_resolver(kind: str = DNS_RESOLVER, nameservers: Optional[List[str]] = None) -> Resolver:
+    nameservers = DNS_NAMESERVERS if nameservers is None else nameservers
+    if kind == "dnspython" or (kind == "auto" and dns is not None):
+        return DnspythonResolver(nameservers)
+    return system_resolver
+
+
+class DnsCache:
+    """
+    프로세스 내 DNS 캐시(스레드 안전).
+    - 레코드 TTL을 존중(min_ttl~max_ttl로 제한), TTL을 모르면 default_ttl, 실패는 negative_ttl
+    - 같은 호스트 동시 조회는 하나로 합침(single-flight), 조회는 전용 스레드 풀에서
+    - resolve(timeout) 대기가 끝나도 조회는 계속 → 끝나면 캐시에 들어가 다음 요청이 씀
+    - resolve_many/warm: 여러 호스트 동시 조회(프리페치 링크 워밍 등)
+    - resolver는 주입 가능(테스트용 스텁 리졸버)
+    """
+
+    def __init__(
+        self,
+        resolver: Optional[Resolver] = None,
+        *,
+        maxsize: int = DNS_CACHE_MAX,
+        default_ttl: float = DNS_DEFAULT_TTL_SEC,
+        min_ttl: float = DNS_MIN_TTL_SEC,
+        max_ttl: float = DNS_MAX_TTL_SEC,
+        negative_ttl: float = DNS_NEGATIVE_TTL_SEC,
+        timeout: float = DNS_TIMEOUT_SEC,
+        workers: int = DNS_WORKERS,
+    ):
+        self.resolver = resolver or system_resolver
+        self.default_ttl = default_ttl
+        self.min_ttl = min_ttl
+        self.max_ttl = max(min_ttl, max_ttl)
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self._cache: TTLCache[DnsAnswer] = TTLCache(maxsize=maxsize, default_ttl=default_ttl)
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="dns")
+
+    @staticmethod
+    def _key(host: str) -> str:
+        return (host or "").strip().lower().rstrip(".")
+
+    def peek(self, host: str) -> Optional[DnsAnswer]:
+        """캐시에 있을 때만(조회 안 함)."""
+        host = self._key(host)
+        ip = parse_ip(host)
+        if ip is not None:
+            return DnsAnswer(host, (str(ip),))
+        return self._cache.get(host) if host else None
+
+    def _lookup(self, host: str) -> DnsAnswer:
+        t0 = time.monotonic()
+        metrics.incr("dns.lookups")
+        try:
+            addrs, ttl = self.resolver(host, self.timeout)
+            answer = DnsAnswer(host, tuple(addrs), ttl)
+            cache_ttl = min(max(float(ttl), self.min_ttl), self.max_ttl) if ttl is not None else self.default_ttl
+        except DnsLookupError as e:
+            metrics.incr("dns.nxdomain")
+            answer = DnsAnswer(host, (), None, str(e) or "nxdomain")
+            cache_ttl = self.negative_ttl
+        except Exception as e:
+            metrics.incr("dns.errors")
+            answer = DnsAnswer(host, (), None, str(e) or type(e).__name__)
+            cache_ttl = self.negative_ttl
+        finally:
+            metrics.incr("dns.lookup_ms", int((time.monotonic() - t0) * 1000))
+        self._cache.set(host, answer, ttl=cache_ttl)
+        with self._lock:
+            self._inflight.pop(host, None)
+        return answer
+
+    def _start(self, host: str) -> Future:
+        with self._lock:
+            fut = self._inflight.get(host)
+            if fut is None:
+                fut = self._inflight[host] = self._pool.submit(self._lookup, host)
+            else:
+                metrics.incr("dns.coalesced")
+            return fut
+
+    def resolve(self, host: str, timeout: Optional[float] = None) -> DnsAnswer:
+        host = self._key(host)
+        cached = self.peek(host)
+        if cached is not None or not host:
+            return cached or DnsAnswer(host, (), None, "empty host")
+        fut = self._start(host)
+        try:
+            return fut.result(timeout=self.timeout if timeout is None else max(0.0, timeout))
+        except FutureTimeout:
+            metrics.incr("dns.timeout")
+            return DnsAnswer(host, (), None, "timeout")
+
+    def resolve_many(self, hosts: Iterable[str], timeout: Optional[float] = None) -> Dict[str, DnsAnswer]:
+        """여러 호스트를 동시에 조회(전체 timeout 공유), 못 끝낸 호스트는 error=timeout."""
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        out: Dict[str, DnsAnswer] = {}
+        pending: Dict[str, Future] = {}
+        for h in hosts:
+            h = self._key(h)
+            if not h or h in out or h in pending:
+                continue
+            cached = self.peek(h)
+            if cached is not None:
+                out[h] = cached
+            else:
+                pending[h] = self._start(h)
+        for h, fut in pending.items():
+            try:
+                out[h] = fut.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeout:
+                metrics.incr("dns.timeout")
+                out[h] = DnsAnswer(h, (), None, "timeout")
+        return out
+
+    def warm(self, hosts: Iterable[str]) -> int:
+        """기다리지 않고 캐시에 없는 호스트 조회만 시작 → 시작한 개수."""
+        n = 0
+        for h in {self._key(h) for h in hosts}:
+            if h and self.peek(h) is None:
+                self._start(h)
+                n += 1
+        return n
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            inflight = len(self._inflight)
+        return {**self._cache.stats(), "inflight": inflight, "resolver": getattr(self.resolver, "__name__", type(self.resolver).__name__)}
+
+
+# 리다이렉트 추적 커넥션과 /analyze DNS 단계가 함께 쓰는 캐시
+dns_cache = DnsCache(make_resolver())
+metrics.register_gauge("dns", dns_cache.stats)
@@ -0,0 +1,168 @@
+# server/domain_age.py
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Set, Tuple
+
+import metrics
+from cache_utils import TTLCache
+from db import connect, find_whois, init_db, upsert_whois
+from whois_utils import age_days, get_domain_creation_date
+
+
+class _RateLimiter:
+    """토큰 버킷: 초당 rate건, 순간 최대 burst건."""
+
+    def __init__(self, rate_per_sec: float, burst: int = 1):
+        self.rate = max(0.01, rate_per_sec)
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class DomainAgeCache:
+    """
+    도메인 생성일(WHOIS) 캐시.
+    - 요청 경로에서는 캐시만 조회(네트워크 호출 없음) → 없으면 큐에 넣고 이번 요청은 '미확인'
+    - 백그라운드 워커가 속도 제한을 지키며 WHOIS 조회 후 SQLite에 저장
+    - 성공은 길게(ttl_sec), 실패는 짧게(negative_ttl_sec) 캐시, 만료 직전이면 미리 갱신
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        *,
+        ttl_sec: float = 30 * 86400,
+        negative_ttl_sec: float = 6 * 3600,
+        workers: int = 2,
+        rate_per_sec: float = 2.0,
+        queue_max: int = 10000,
+    ):
+        self.ttl_sec = ttl_sec
+        self.negative_ttl_sec = negative_ttl_sec
+        self.con = connect(db_path)
+        init_db(self.con)
+        self._db_lock = threading.Lock()
+        # 자주 보는 도메인은 DB도 안 가도록 메모리 앞단 캐시
+        self._mem: TTLCache[Tuple[Optional[str], Optional[str], float]] = TTLCache(maxsize=50000, default_ttl=600)
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=queue_max)
+        self._pending: Set[str] = set()
+        self._pending_lock = threading.Lock()
+        self._limiter = _RateLimiter(rate_per_sec, burst=max(1, workers))
+        self._closed = threading.Event()
+
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"whois-{i}", daemon=True) for i in range(max(1, workers))
+        ]
+        for t in self._threads:
+            t.start()
+        metrics.register_gauge("whois.queue_depth", self._queue.qsize)
+
+    def _read(self, domain: str) -> Optional[Tuple[Optional[str], Optional[str], float]]:
+        hit = self._mem.get(domain)
+        if hit is not None:
+            return hit
+        with self._db_lock:
+            row = find_whois(self.con, domain)
+        if not row or row[2] < time.time():
+            return None
+        self._mem.set(domain, row, ttl=min(600.0, row[2] - time.time()))
+        return row
+
+    def lookup(self, domain: str) -> Tuple[Optional[int], Optional[str]]:
+        """
+        (age_days, error). 캐시에 없으면 백그라운드 조회를 예약하고 (None, "pending").
+        """
+        if not domain:
+            return None, "no_domain"
+
+        cached = self._read(domain)
+        if cached is not None:
+            metrics.incr("whois.cache.hit")
+            creation, error, expires_at = cached
+            # 만료가 가까우면(남은 시간 < TTL의 10%) 값은 그대로 쓰고 백그라운드 갱신
+            if expires_at - time.time() < (self.ttl_sec if creation else self.negative_ttl_sec) * 0.1:
+                self.enqueue(domain)
+            if creation:
+                return age_days(datetime.fromisoformat(creation)), None
+            return None, error or "no_creation_date"
+
+        metrics.incr("whois.cache.miss")
+        self.enqueue(domain)
+        return None, "pending"
+
+    def enqueue(self, domain: str) -> None:
+        if self._closed.is_set():
+            return
+        with self._pending_lock:
+            if domain in self._pending:
+                return
+            self._pending.add(domain)
+        try:
+            self._queue.put_nowait(domain)
+        except queue.Full:
+            metrics.incr("whois.queue_full")
+            with self._pending_lock:
+                self._pending.discard(domain)
+
+    def close(self, timeout: float = 2.0) -> None:
+        """대기 중인 조회는 버리고 워커 종료 후 DB 연결 닫기(진행 중인 WHOIS 결과는 저장 안 함)."""
+        self._closed.set()
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        for _ in self._threads:
+            self._queue.put(None)
+        end = time.monotonic() + timeout
+        for t in self._threads:
+            t.join(max(0.0, end - time.monotonic()))
+        with self._db_lock:
+            self.con.close()
+
+    def _worker(self) -> None:
+        while True:
+            domain = self._queue.get()
+            if domain is None:
+                return
+            try:
+                self._limiter.acquire()
+                self._refresh(domain)
+            except Exception as e:
+                print("[WHOIS WORKER ERROR]", domain, e)
+            finally:
+                with self._pending_lock:
+                    self._pending.discard(domain)
+
+    def _refresh(self, domain: str) -> None:
+        metrics.incr("whois.lookups")
+        info = get_domain_creation_date(domain)
+        creation = info.creation_date.isoformat() if info.creation_date else None
+        error = None if creation else (info.error or "no_creation_date")
+        ttl = self.ttl_sec if creation else self.negative_ttl_sec
+        if error:
+            metrics.incr("whois.errors")
+
+        with self._db_lock:
+            if self._closed.is_set():
+                return
+            upsert_whois(self.con, domain, creation, error, time.time() + ttl)
+            self.con.commit()
+        self._mem.set(domain, (creation, error, time.time() + ttl), ttl=min(600.0, ttl))
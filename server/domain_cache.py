@@ -0,0 +1,129 @@
+# server/domain_cache.py
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Iterable, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+import metrics
+from cache_utils import TTLCache
+
+
+# 목적지 URL을 파라미터로 받는 흔한 이름(같은 사이트라도 이런 URL은 항상 추적)
+_REDIRECT_PARAMS = {
+    "url", "u", "redirect", "redirect_uri", "redirect_url", "return", "returnurl", "return_to",
+    "next", "target", "dest", "destination", "continue", "goto", "link", "out", "to",
+}
+
+
+def looks_like_redirector(url: str) -> bool:
+    """쿼리에 다른 URL을 싣고 있거나 리다이렉트용 파라미터가 있으면 True."""
+    try:
+        query = urlsplit(url).query
+    except ValueError:
+        return True
+    for k, v in parse_qsl(query, keep_blank_values=True):
+        if k.lower() in _REDIRECT_PARAMS:
+            return True
+        v = v.strip().lower()
+        if v.startswith(("http://", "https://", "//")):
+            return True
+    return False
+
+
+@dataclass(frozen=True)
+class DomainFacts:
+    """호스트 단위로 안정적인 사실(경로마다 다시 구할 필요 없는 것)."""
+    domain: str         # 등록 도메인(KISA 무효화 단위)
+    kisa_domain_hit: bool
+    is_shortener: bool
+    whois_age_days: Optional[int]
+    observed: int       # 리다이렉트를 끝까지 추적해 본 URL 수
+    redirected: int     # 그중 리다이렉트가 있었던 URL 수
+
+
+class DomainReputationCache:
+    """
+    URL 캐시의 2단계: 호스트 → DomainFacts.
+    - 등록 도메인이 아니라 호스트로 묶음(*.github.io, *.blogspot.com 같은 다중 사용자 호스팅은
+      서브도메인마다 주인이 다름)
+    - 수명은 처음 기록한 때부터(같은 호스트 요청이 이어져도 연장하지 않음 → 사실은 주기적으로 다시 확인)
+    - 같은 사이트의 새 경로는 리다이렉트 추적/KISA 온디맨드 없이 저렴한 URL 특징만 계산해 채점
+    - 리다이렉트 생략은 min_observed개 이상 추적해 봤고 한 번도 리다이렉트가 없었으며
+      단축 URL 도메인이 아닐 때만(목적지가 경로마다 다른 사이트는 항상 추적)
+    - 쿼리에 목적지 URL이 실린 주소(looks_like_redirector)는 도메인이 안정적이어도 추적
+    - KISA 데이터가 바뀌면 해당 등록 도메인의 호스트(또는 전체) 무효화
+    """
+
+    def __init__(self, *, maxsize: int = 50000, ttl_sec: float = 6 * 3600, min_observed: int = 2):
+        self._cache: TTLCache[DomainFacts] = TTLCache(maxsize=maxsize, default_ttl=ttl_sec)
+        self._lock = threading.Lock()
+        self.min_observed = max(1, min_observed)
+
+    def get(self, host: str) -> Optional[DomainFacts]:
+        if not host:
+            return None
+        facts = self._cache.get(host)
+        metrics.incr("domain_rep.hit" if facts is not None else "domain_rep.miss")
+        return facts
+
+    def can_skip_redirect(self, facts: Optional[DomainFacts], url: str) -> bool:
+        return (
+            facts is not None
+            and not looks_like_redirector(url)
+            and not facts.is_shortener
+            and facts.redirected == 0
+            and facts.observed >= self.min_observed
+        )
+
+    def record(
+        self,
+        host: str,
+        *,
+        domain: str,
+        kisa_domain_hit: bool,
+        is_shortener: bool,
+        whois_age_days: Optional[int],
+        traced: bool,
+        redirected: bool,
+    ) -> None:
+        """전체 분석이 끝난 URL의 호스트 사실 반영(traced=리다이렉트를 끝까지 추적했는지)."""
+        if not host:
+            return
+        with self._lock:
+            prev = self._cache.get(host)
+            if prev is None:
+                prev = DomainFacts(domain, kisa_domain_hit, is_shortener, whois_age_days, 0, 0)
+                ttl = None
+            else:
+                # 기존 항목은 처음 만료 시각 유지
+                ttl = self._cache.expires_in(host)
+                if ttl is None:
+                    return
+            facts = replace(
+                prev,
+                kisa_domain_hit=kisa_domain_hit,
+                is_shortener=is_shortener,
+                whois_age_days=whois_age_days if whois_age_days is not None else prev.whois_age_days,
+                observed=prev.observed + (1 if traced else 0),
+                redirected=prev.redirected + (1 if traced and redirected else 0),
+            )
+            if facts != prev or ttl is None:
+                self._cache.set(host, facts, ttl=ttl)
+
+    def invalidate(self, domains: Iterable[str]) -> None:
+        """등록 도메인에 속한 호스트 항목 제거."""
+        targets = {d for d in domains if d}
+        if not targets:
+            return
+        n = self._cache.discard_if(lambda _host, facts: facts.domain in targets)
+        if n:
+            metrics.incr("domain_rep.invalidated", n)
+
+    def clear(self) -> None:
+        self._cache.clear()
+        metrics.incr("domain_rep.cleared")
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
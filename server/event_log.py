@@ -0,0 +1,167 @@
+# server/event_log.py
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Union
+
+import metrics
+
+try:
+    import orjson
+
+    def _dumps(obj: Dict[str, Any]) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+except ImportError:  # orjson 없으면 표준 json
+    def _dumps(obj: Dict[str, Any]) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+FILE_PREFIX = "events-"
+FILE_SUFFIX = ".jsonl.gz"
+
+
+class EventLog:
+    """
+    분석 이벤트 로그(append-only, gzip JSONL, 크기 기준 회전).
+    - emit()은 메모리 링 버퍼에 넣기만 함(요청 경로 지연 ~0)
+    - 백그라운드 writer가 flush_sec마다 또는 batch_max개가 모이면 한 번에 기록
+    - 버퍼가 가득 차면(디스크가 느림) 가장 오래된 이벤트부터 버리고 dropped로 집계
+    - 배치마다 gzip member를 하나씩 이어 붙임 → 프로세스가 죽어도 앞 배치는 온전히 읽힘,
+      gzip.open으로 순차 스트리밍 가능(read_events)
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        *,
+        buffer_max: int = 10000,
+        flush_sec: float = 1.0,
+        batch_max: int = 500,
+        rotate_bytes: int = 64 * 1024 * 1024,
+        keep_files: int = 50,
+    ):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.flush_sec = max(0.05, flush_sec)
+        self.batch_max = max(1, batch_max)
+        self.rotate_bytes = max(1024, rotate_bytes)
+        self.keep_files = max(1, keep_files)
+
+        self._buf: Deque[Dict[str, Any]] = deque(maxlen=max(1, buffer_max))
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._path: Optional[Path] = None
+        self._seq = 0
+
+        self._thread = threading.Thread(target=self._writer, name="event-log", daemon=True)
+        self._thread.start()
+        metrics.register_gauge("eventlog", self.stats)
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            if len(self._buf) == self._buf.maxlen:
+                metrics.incr("eventlog.dropped")
+            self._buf.append(event)
+            n = len(self._buf)
+        metrics.incr("eventlog.emitted")
+        if n >= self.batch_max:
+            self._wake.set()
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            batch = list(self._buf)
+            self._buf.clear()
+        return batch
+
+    def _writer(self) -> None:
+        while not self._stopped:
+            self._wake.wait(self.flush_sec)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        batch = self._drain()
+        if not batch:
+            return
+        t0 = time.monotonic()
+        data = b"".join(_dumps(e) + b"\n" for e in batch)
+        try:
+            path = self._current_path()
+            # 배치마다 새 gzip member("ab") → 중간에 죽어도 이미 쓴 배치는 안전
+            with gzip.open(path, "ab", compresslevel=6) as f:
+                f.write(data)
+            metrics.incr("eventlog.written", len(batch))
+        except Exception as e:
+            metrics.incr("eventlog.write_errors")
+            metrics.incr("eventlog.dropped", len(batch))
+            print("[EVENTLOG ERROR]", e)
+        metrics.incr("eventlog.flush_ms", int((time.monotonic() - t0) * 1000))
+
+    def _current_path(self) -> Path:
+        if self._path is None or not self._path.exists() or self._path.stat().st_size >= self.rotate_bytes:
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+            while True:
+                self._seq += 1
+                path = self.dir / f"{FILE_PREFIX}{stamp}-{os.getpid()}-{self._seq:04d}{FILE_SUFFIX}"
+                if not path.exists():
+                    break
+            self._path = path
+            self._prune()
+        return self._path
+
+    def _prune(self) -> None:
+        files = sorted(self.dir.glob(f"{FILE_PREFIX}*{FILE_SUFFIX}"))
+        for old in files[: max(0, len(files) - self.keep_files)]:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        self._stopped = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            depth = len(self._buf)
+        return {
+            "buffer_depth": depth,
+            "buffer_max": self._buf.maxlen,
+            "file": self._path.name if self._path else None,
+        }
+
+
+def log_files(source: Union[str, Path]) -> List[Path]:
+    p = Path(source)
+    if p.is_dir():
+        return sorted(p.glob(f"{FILE_PREFIX}*{FILE_SUFFIX}"))
+    return [p]
+
+
+def read_events(sources: Union[str, Path, Iterable[Union[str, Path]]]) -> Iterator[Dict[str, Any]]:
+    """
+    디렉터리(회전된 파일 전체, 오래된 순) 또는 파일 경로들에서 이벤트를 순차 스트리밍.
+    기록 중이던 마지막 배치가 잘려 있으면 거기서 멈춤.
+    """
+    if isinstance(sources, (str, Path)):
+        sources = [sources]
+    for src in sources:
+        for path in log_files(src):
+            opener = gzip.open if path.suffix == ".gz" else open
+            try:
+                with opener(path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        line = line.strip()
+                        if line:
+                            yield json.loads(line)
+            except (EOFError, OSError, json.JSONDecodeError) as e:
+                print("[EVENTLOG] truncated:", path.name, e)
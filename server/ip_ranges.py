@@ -0,0 +1,222 @@
+# server/ip_ranges.py
+from __future__ import annotations
+
+import ipaddress
+import socket
+from bisect import bisect_right
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+IPAddress = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+
+# IANA special-purpose 대역(공인 인터넷에서 라우팅되지 않는 주소) → 라벨
+SPECIAL_RANGES: Tuple[Tuple[str, str], ...] = (
+    ("0.0.0.0/8", "this_network"),
+    ("10.0.0.0/8", "private"),
+    ("100.64.0.0/10", "cgnat"),
+    ("127.0.0.0/8", "loopback"),
+    ("169.254.0.0/16", "link_local"),
+    ("172.16.0.0/12", "private"),
+    ("192.0.0.0/24", "reserved"),
+    ("192.0.2.0/24", "documentation"),
+    ("192.88.99.0/24", "reserved"),
+    ("192.168.0.0/16", "private"),
+    ("198.18.0.0/15", "benchmark"),
+    ("198.51.100.0/24", "documentation"),
+    ("203.0.113.0/24", "documentation"),
+    ("224.0.0.0/4", "multicast"),
+    ("240.0.0.0/4", "reserved"),
+    ("255.255.255.255/32", "broadcast"),
+    ("::/128", "unspecified"),
+    ("::1/128", "loopback"),
+    ("100::/64", "reserved"),
+    ("2001:db8::/32", "documentation"),
+    ("fc00::/7", "private"),
+    ("fe80::/10", "link_local"),
+    ("ff00::/8", "multicast"),
+)
+
+_LEGACY_V4_CHARS = set("0123456789abcdefx.")
+
+
+def parse_ip(host: str) -> Optional[IPAddress]:
+    """
+    호스트 문자열 → IP 주소(도메인이면 None).
+    - IPv6는 대괄호/zone id(%eth0) 허용, IPv4-mapped(::ffff:a.b.c.d)는 IPv4로 변환
+    - 브라우저/inet_aton이 받아 주는 옛 IPv4 표기(2130706433, 0x7f.1, 127.1)도 IP로 인식
+    """
+    h = (host or "").strip().lower().strip("[]")
+    if not h:
+        return None
+    try:
+        ip = ipaddress.ip_address(h.split("%", 1)[0])
+    except ValueError:
+        if not set(h) <= _LEGACY_V4_CHARS or h.startswith("."):
+            return None
+        try:
+            ip = ipaddress.IPv4Address(socket.inet_aton(h.rstrip(".")))
+        except (OSError, ValueError):
+            return None
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        return ip.ipv4_mapped
+    return ip
+
+
+def _parse_v4_cidr(cidr: str) -> Optional[Tuple[int, int]]:
+    """'a.b.c.d/n' 빠른 경로(ip_network보다 수 배 빠름, 대용량 목록 로드용). 형식이 다르면 None."""
+    addr, _, plen = cidr.partition("/")
+    parts = addr.split(".")
+    if len(parts) != 4:
+        return None
+    try:
+        n = 0
+        for p in parts:
+            b = int(p)
+            if not 0 <= b <= 255 or not p.isdigit():
+                return None
+            n = (n << 8) | b
+        prefix = int(plen) if plen else 32
+    except ValueError:
+        return None
+    if not 0 <= prefix <= 32:
+        return None
+    size = 1 << (32 - prefix)
+    start = n & ~(size - 1)
+    return start, start + size - 1
+
+
+class RangeIndex:
+    """
+    CIDR 대역 → 라벨 조회 인덱스(정렬된 서로소 구간 + 이진 탐색, 조회 O(log n)).
+    - add()로 모으고 build()에서 한 번에 평탄화(add 후에는 build를 다시 불러야 반영)
+    - 중첩된 대역은 더 좁은(안쪽) 대역 라벨이 이김, 같은 대역이 여러 번이면 나중에 추가한 라벨
+    - 평탄화 후 인접한 같은 라벨 구간은 합쳐서 구간 수를 줄임
+    - IPv4/IPv6는 따로 보관(정수 범위가 다름)
+    """
+
+    def __init__(self) -> None:
+        self._items: Dict[int, List[Tuple[int, int, str]]] = {4: [], 6: []}
+        self._starts: Dict[int, List[int]] = {4: [], 6: []}
+        self._ends: Dict[int, List[int]] = {4: [], 6: []}
+        self._labels: Dict[int, List[str]] = {4: [], 6: []}
+        self.ranges = 0
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Tuple[str, str]]) -> "RangeIndex":
+        idx = cls()
+        for cidr, label in pairs:
+            idx.add(cidr, label)
+        return idx.build()
+
+    def add(self, cidr: str, label: str) -> None:
+        cidr = cidr.strip()
+        span = _parse_v4_cidr(cidr)
+        if span is not None:
+            self._items[4].append((span[0], span[1], label))
+        else:
+            net = ipaddress.ip_network(cidr, strict=False)
+            start = int(net.network_address)
+            self._items[net.version].append((start, start + net.num_addresses - 1, label))
+        self.ranges += 1
+
+    def build(self) -> "RangeIndex":
+        for v in (4, 6):
+            self._flatten(v, self._items[v])
+        return self
+
+    def _flatten(self, v: int, items: List[Tuple[int, int, str]]) -> None:
+        # 시작 오름차순, 같은 시작이면 넓은 대역 먼저 → 스택 꼭대기가 항상 가장 안쪽 대역
+        # (CIDR끼리는 포함 아니면 서로소이므로 부분 겹침은 없음)
+        items.sort(key=lambda x: (x[0], -x[1]))
+        starts: List[int] = []
+        ends: List[int] = []
+        labels: List[str] = []
+
+        def emit(a: int, b: int, label: str) -> None:
+            if a > b:
+                return
+            if ends and ends[-1] + 1 == a and labels[-1] == label:
+                ends[-1] = b
+                return
+            starts.append(a)
+            ends.append(b)
+            labels.append(label)
+
+        stack: List[Tuple[int, str]] = []
+        pos = 0
+        for s, e, label in items:
+            while stack and stack[-1][0] < s:
+                end, lab = stack.pop()
+                emit(pos, end, lab)
+                pos = max(pos, end + 1)
+            if stack:
+                emit(pos, s - 1, stack[-1][1])
+            stack.append((e, label))
+            pos = s
+        while stack:
+            end, lab = stack.pop()
+            emit(pos, end, lab)
+            pos = max(pos, end + 1)
+
+        self._starts[v], self._ends[v], self._labels[v] = starts, ends, labels
+
+    def lookup(self, ip: Union[str, IPAddress, None]) -> Optional[str]:
+        if isinstance(ip, str):
+            ip = parse_ip(ip)
+        if ip is None:
+            return None
+        v = ip.version
+        n = int(ip)
+        i = bisect_right(self._starts[v], n) - 1
+        if i >= 0 and n <= self._ends[v][i]:
+            return self._labels[v][i]
+        return None
+
+    def __len__(self) -> int:
+        return len(self._starts[4]) + len(self._starts[6])
+
+    def stats(self) -> Dict[str, Any]:
+        return {"ranges": self.ranges, "intervals_v4": len(self._starts[4]), "intervals_v6": len(self._starts[6])}
+
+
+SPECIAL = RangeIndex.from_pairs(SPECIAL_RANGES)
+
+
+def special_label(host: str) -> Optional[str]:
+    """localhost/특수 목적 IP면 라벨(loopback, private, ...), 공인 IP나 도메인이면 None."""
+    h = (host or "").strip().lower().rstrip(".")
+    if h == "localhost" or h.endswith(".localhost"):
+        return "loopback"
+    return SPECIAL.lookup(h)
+
+
+def is_private_host(host: str) -> bool:
+    """내부망/예약 주소(SSRF 방지, KISA 온디맨드 생략 기준). 빈 호스트도 True."""
+    return not host or special_label(host) is not None
+
+
+def load_range_files(paths: Iterable[str]) -> RangeIndex:
+    """
+    악성 호스팅 대역 목록 파일들 → RangeIndex(라벨 = 파일 이름, 확장자 제외).
+    한 줄에 CIDR 하나, '#' 뒤는 주석. 없는 파일/잘못된 줄은 건너뜀.
+    """
+    idx = RangeIndex()
+    for path in paths:
+        p = Path(path)
+        if not p.exists():
+            print("[IP_RANGES] not found:", path)
+            continue
+        bad = 0
+        for line in p.read_text(encoding="utf-8").splitlines():
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            try:
+                idx.add(line, p.stem)
+            except ValueError:
+                bad += 1
+        if bad:
+            print("[IP_RANGES] invalid lines:", p.name, bad)
+    idx.build()
+    print("[IP_RANGES] ranges=", idx.ranges, "intervals=", len(idx))
+    return idx
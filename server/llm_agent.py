@@ -2,14 +2,31 @@
 from __future__ import annotations
 
 import os
+import hashlib
 import json
+import queue
 import re
-import requests
-from typing import Any, Dict, Optional
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+from llm_cache import LLMDecisionCache, fingerprint_key
+from ollama_client import get_client
+from score_rules import boundary_distance
 
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").rstrip("/")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
 
+# Planner 선택: fast(결정적 규칙) | llm
+LLM_PLANNER = os.getenv("LLM_PLANNER", "fast").strip().lower()
+# raw 점수가 버킷 경계에서 이 값보다 멀면 Decider 호출 생략
+LLM_GATE_MARGIN = int(os.getenv("LLM_GATE_MARGIN", "15"))
+# 배치 프롬프트의 출력 토큰 상한 = 항목 수 × 이 값
+LLM_BATCH_TOKENS_PER_ITEM = int(os.getenv("LLM_BATCH_TOKENS_PER_ITEM", "120"))
+
 SAFE_SCORE = 5
 SUSP_SCORE = 60
 DANGER_SCORE = 90
@@ -52,27 +69,131 @@ def _safe_json_loads(txt: str) -> Dict[str, Any]:
     return json.loads(obj_text)
 
 
-def _ollama_chat(messages, *, model: object = OLLAMA_MODEL) -> str:
-    base = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").rstrip("/")
-    timeout = float(os.getenv("LLM_TIMEOUT_SEC", "12"))
+class _JsonObjectWatcher:
+    """
+    스트리밍 텍스트를 이어서 스캔하며 첫 번째 '완결된' JSON 객체를 찾는다.
+    (문자열/이스케이프 안의 중괄호는 무시, 괄호 깊이가 0으로 돌아오면 json.loads로 확인)
+    """
 
+    def __init__(self):
+        self.pos = 0
+        self.start = -1
+        self.depth = 0
+        self.in_str = False
+        self.escape = False
+        self.obj: Optional[Dict[str, Any]] = None
+
+    def __call__(self, text: str) -> bool:
+        while self.pos < len(text):
+            ch = text[self.pos]
+            self.pos += 1
+            if self.in_str:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_str = False
+            elif ch == '"' and self.depth > 0:
+                self.in_str = True
+            elif ch == "{":
+                if self.depth == 0:
+                    self.start = self.pos - 1
+                self.depth += 1
+            elif ch == "}" and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 0:
+                    try:
+                        obj = json.loads(text[self.start:self.pos])
+                    except ValueError:
+                        continue
+                    if isinstance(obj, dict):
+                        self.obj = obj
+                        return True
+        return False
+
+
+def _ollama_chat(messages, *, model: object = OLLAMA_MODEL, max_tokens: Optional[int] = None) -> str:
     model_str = _model_name(model)
     if not model_str:
         raise RuntimeError("OLLAMA_MODEL is empty")
 
-    payload = {
-        "model": model_str,     # ✅ 반드시 문자열
-        "messages": messages,
-        "stream": False,
-        # ❌ "format": "json" (Ollama 0.13.3에서 400 나는 케이스가 있어 제거)
-    }
+    # 공유 클라이언트(커넥션 재사용 + 동시성 제한 + 서킷 브레이커)
+    # JSON 객체가 완성되는 즉시 스트림을 끊어 나머지 생성 비용을 아낌
+    return get_client().chat(messages, model=model_str, stop_when=_JsonObjectWatcher(), max_tokens=max_tokens)
+
 
-    r = requests.post(f"{base}/api/chat", json=payload, timeout=timeout)
-    if r.status_code != 200:
-        raise RuntimeError(f'Ollama /api/chat error {r.status_code}: {r.text}')
+def warmup(model: object = OLLAMA_MODEL) -> bool:
+    return get_client().warmup(_model_name(model))
 
-    j = r.json()
-    return j.get("message", {}).get("content", "")
+
+def plan_tools_fast(signals: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    LLM 없이 결정하는 Planner.
+    - 원본 URL이 KISA URL 목록에 있으면 어차피 DANGEROUS이므로 redirect 생략
+    - 그 외엔 항상 추적(LLM Planner의 기본값과 동일)
+    """
+    run_redirect = not bool(signals.get("kisa_url_hit_original"))
+    return {"run_redirect": run_redirect, "planner": "fast"}
+
+
+def plan_tools(signals: Dict[str, Any], *, use_llm: bool, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    설정(LLM_PLANNER=llm)일 때만 LLM Planner, 실패/미설정이면 fast Planner.
+    timeout(초)이 있으면 그 안에 못 끝낸 LLM Planner는 기다리지 않고 fast Planner로.
+    """
+    if use_llm and LLM_PLANNER == "llm":
+        metrics.incr("llm.planner.llm")
+        fut = _single_pool().submit(llm_plan_tools, signals=signals)
+        try:
+            plan = fut.result(timeout=timeout)
+        except FutureTimeout:
+            metrics.incr("llm.planner.deadline")
+            plan = None
+        if plan:
+            plan["planner"] = "llm"
+            return plan
+    metrics.incr("llm.planner.fast")
+    return plan_tools_fast(signals)
+
+
+def gate_decision(
+    signals: Dict[str, Any],
+    raw_score: int,
+    *,
+    margin: int = LLM_GATE_MARGIN,
+    thresholds: Optional[Tuple[int, int]] = None,
+) -> Tuple[bool, str]:
+    """
+    Decider를 부를지 결정(집계 없음 → replay.py 섀도 채점도 같은 규칙 사용).
+    - KISA URL 히트: 하드룰로 DANGEROUS 확정 → 생략
+    - raw 점수가 버킷 경계에서 margin 초과로 멀면 규칙 결과 확정 → 생략
+    - 그 외(경계 근처) → 호출
+    """
+    if signals.get("kisa_url_hit"):
+        return False, "kisa_url_hit"
+    if boundary_distance(raw_score, thresholds) > margin:
+        return False, "rule_confident"
+    return True, "borderline"
+
+
+def llm_gate(signals: Dict[str, Any], raw_score: int) -> Tuple[bool, str]:
+    call, reason = gate_decision(signals, raw_score)
+    metrics.incr({
+        "kisa_url_hit": "llm.gate.skipped_kisa",
+        "rule_confident": "llm.gate.skipped_confident",
+    }.get(reason, "llm.gate.called"))
+    return call, reason
+
+
+def record_llm_outcome(rule_result: Dict[str, Any], llm_out: Optional[Dict[str, Any]]) -> None:
+    """LLM이 규칙 판정을 바꿨는지 집계."""
+    if not llm_out:
+        metrics.incr("llm.failed")
+    elif llm_out.get("verdict") != rule_result.get("verdict"):
+        metrics.incr("llm.verdict_changed")
+    else:
+        metrics.incr("llm.verdict_kept")
 
 
 def llm_plan_tools(signals: Dict[str, Any], *, model: str = OLLAMA_MODEL) -> Optional[Dict[str, Any]]:
@@ -105,86 +226,362 @@ def llm_plan_tools(signals: Dict[str, Any], *, model: str = OLLAMA_MODEL) -> Opt
         return None
 
 
-def llm_decide(
-    signals: Dict[str, Any],
-    rule_result: Dict[str, Any],
-    *,
-    model: str = OLLAMA_MODEL
-) -> Optional[Dict[str, Any]]:
-    """
-    signals: 관찰값(redirect/kisa/url features 등)
-    rule_result: 규칙 기반 결과(백업)
-
-    ✅ 출력 점수는 요구사항대로 3단계 고정:
-    SAFE=5, SUSP=60, DANGER=90
-    """
-    system = """너는 피싱 URL 위험도를 최종 판정하는 Decider다.
+DECIDER_SYSTEM = """너는 피싱 URL 위험도를 최종 판정하는 Decider다.
 반드시 JSON만 출력해라:
 {"verdict":"SAFE|SUSPICIOUS|DANGEROUS","reasons":["..","..",".."]}
 
 하드룰:
 1) kisa_url_hit == true 이면 verdict는 무조건 DANGEROUS
 2) kisa_domain_hit == true 이면 verdict는 최소 SUSPICIOUS 이상
-3) 불확실하면 rule_result를 따른다
+3) 불확실하면 rule_verdict(규칙 기반 결과)를 따른다
 
 reasons는 2~3개, 짧고 근거 중심으로.
+signals에는 기본값이 아닌 항목만 들어있다(없는 플래그는 false, 없는 개수는 0, https는 true).
 """
 
-    user = {
-        "signals": signals,
-        "rule_result": rule_result,
-        "required_output_example": {"verdict": "SUSPICIOUS", "reasons": ["KISA 도메인 히트", "리다이렉트 과다"]},
+BATCH_DECIDER_SYSTEM = """너는 피싱 URL 위험도를 최종 판정하는 Decider다.
+여러 URL의 signals가 {"k0":{...},"k1":{...}} 형태로 주어진다. 키마다 하나씩 판정해라.
+반드시 JSON만 출력해라:
+{"results":[{"id":"k0","verdict":"SAFE|SUSPICIOUS|DANGEROUS","reasons":["..",".."]}]}
+
+하드룰(항목별):
+1) kisa_url_hit == true 이면 verdict는 무조건 DANGEROUS
+2) kisa_domain_hit == true 이면 verdict는 최소 SUSPICIOUS 이상
+3) 불확실하면 rule_verdict(규칙 기반 결과)를 따른다
+
+reasons는 항목마다 2~3개, 짧고 근거 중심으로.
+signals에는 기본값이 아닌 항목만 들어있다(없는 플래그는 false, 없는 개수는 0, https는 true).
+"""
+
+# user 메시지 형식이 바뀌면 올려서 캐시 무효화
+DECIDER_PROMPT_VERSION = "2"
+
+
+def _bucket(v: Optional[int], edges: Tuple[int, ...]) -> Optional[str]:
+    """수치를 구간 라벨로(예: edges=(1,3,5) → '0', '1-2', '3-4', '5+')."""
+    if v is None:
+        return None
+    lo = 0
+    for e in edges:
+        if v < e:
+            return str(lo) if e - lo == 1 else f"{lo}-{e - 1}"
+        lo = e
+    return f"{lo}+"
+
+
+def signal_profile(signals: Dict[str, Any], rule_result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    URL 문자열과 무관한 관찰 프로파일(캐시 키 + Decider 입력).
+    - 플래그는 그대로, 길이/개수는 score_rules 임계값 기준 구간화
+    - original/final URL, 도메인, 체인, 날짜는 제외
+    """
+    return {
+        "kisa_url_hit": bool(signals.get("kisa_url_hit")),
+        "kisa_domain_hit": bool(signals.get("kisa_domain_hit")),
+        "redirect_hops": _bucket(int(signals.get("redirect_hops") or 0), (1, 3, 5)),
+        "redirect_truncated": bool(signals.get("redirect_truncated")),
+        "domain_switched": bool(signals.get("domain_switched")),
+        "domain_switch_count": _bucket(int(signals.get("domain_switch_count") or 1), (2, 3)),
+        "whois_age_days": _bucket(signals.get("whois_age_days"), (30, 180)),
+        "is_ip": bool(signals.get("is_ip")),
+        "is_punycode": bool(signals.get("is_punycode")),
+        "has_userinfo": bool(signals.get("has_userinfo")),
+        "nonstandard_port": bool(signals.get("nonstandard_port")),
+        "https": bool(signals.get("https")),
+        "subdomains": _bucket(int(signals.get("subdomains") or 0), (1, 4)),
+        "url_len": _bucket(int(signals.get("url_len") or 0), (75, 140)),
+        "enc_count": _bucket(int(signals.get("enc_count") or 0), (1, 8)),
+        "query_params": _bucket(int(signals.get("query_params") or 0), (1, 10)),
+        "keyword_hit": bool(signals.get("keyword_hit")),
+        "is_shortener": bool(signals.get("is_shortener")),
+        "has_non_ascii": bool(signals.get("has_non_ascii")),
+        "rule_verdict": rule_result.get("verdict"),
+        "rule_score": rule_result.get("risk_score"),
     }
 
+
+# signal_profile의 기본값(프롬프트 압축 시 생략)
+_PROFILE_DEFAULTS: Dict[str, Any] = {
+    "kisa_url_hit": False,
+    "kisa_domain_hit": False,
+    "redirect_hops": "0",
+    "redirect_truncated": False,
+    "domain_switched": False,
+    "domain_switch_count": "0-1",
+    "whois_age_days": None,
+    "is_ip": False,
+    "is_punycode": False,
+    "has_userinfo": False,
+    "nonstandard_port": False,
+    "https": True,
+    "subdomains": "0",
+    "url_len": "0-74",
+    "enc_count": "0",
+    "query_params": "0",
+    "keyword_hit": False,
+    "is_shortener": False,
+    "has_non_ascii": False,
+}
+
+
+def compact_profile(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """기본값과 다른 신호만 남김(프롬프트 토큰 절약)."""
+    return {k: v for k, v in profile.items() if k not in _PROFILE_DEFAULTS or _PROFILE_DEFAULTS[k] != v}
+
+
+def cache_namespace(model: object = OLLAMA_MODEL) -> str:
+    """모델명 + Decider 프롬프트 해시. 둘 중 하나라도 바뀌면 캐시 무효."""
+    h = hashlib.sha256(
+        f"{_model_name(model)}\n{DECIDER_PROMPT_VERSION}\n{DECIDER_SYSTEM}\n{BATCH_DECIDER_SYSTEM}".encode("utf-8")
+    ).hexdigest()
+    return h[:16]
+
+
+def _validate_decision(obj: Dict[str, Any], signals: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """LLM 출력 검증 + 하드룰 강제. (URL과 무관하므로 캐시에 저장 가능)"""
+    verdict = str(obj.get("verdict", "")).strip().upper()
+    reasons = obj.get("reasons", [])
+
+    if verdict not in ("SAFE", "SUSPICIOUS", "DANGEROUS"):
+        return None
+    if not isinstance(reasons, list) or len(reasons) == 0:
+        return None
+
+    # 하드룰 강제
+    if signals.get("kisa_url_hit"):
+        verdict = "DANGEROUS"
+        if "KISA URL 목록 일치" not in reasons:
+            reasons.insert(0, "KISA URL 목록 일치")
+    elif signals.get("kisa_domain_hit") and verdict == "SAFE":
+        verdict = "SUSPICIOUS"
+        if "KISA 도메인 목록 일치" not in reasons:
+            reasons.insert(0, "KISA 도메인 목록 일치")
+
+    reasons = [str(r)[:120] for r in reasons if str(r).strip()][:3]
+    return {"verdict": verdict, "reasons": reasons}
+
+
+def _to_result(decision: Dict[str, Any], rule_result: Dict[str, Any]) -> Dict[str, Any]:
+    verdict = decision["verdict"]
+
+    # 점수 3단계 고정
+    if verdict == "SAFE":
+        score = SAFE_SCORE
+    elif verdict == "SUSPICIOUS":
+        score = SUSP_SCORE
+    else:
+        score = DANGER_SCORE
+
+    # reasons 정리(최소 2개 보장)
+    reasons = list(decision["reasons"])
+    if len(reasons) < 2:
+        extra = (rule_result.get("reasons") or [])
+        for r in extra:
+            r = str(r).strip()
+            if r and r not in reasons:
+                reasons.append(r[:120])
+            if len(reasons) >= 2:
+                break
+    reasons = reasons[:3]
+
+    return {"risk_score": score, "verdict": verdict, "reasons": reasons}
+
+
+def _decide_single(profile: Dict[str, Any], *, model: object) -> Optional[Dict[str, Any]]:
     messages = [
-        {"role": "system", "content": system},
-        {"role": "user", "content": json.dumps(user, ensure_ascii=False)},
+        {"role": "system", "content": DECIDER_SYSTEM},
+        {"role": "user", "content": json.dumps(compact_profile(profile), ensure_ascii=False, separators=(",", ":"))},
     ]
+    txt = _ollama_chat(messages, model=model)
+    # profile에도 kisa_url_hit/kisa_domain_hit가 그대로 있으므로 하드룰 검증 가능
+    return _validate_decision(_safe_json_loads(txt), profile)
 
-    try:
-        txt = _ollama_chat(messages, model=model)
-        obj = _safe_json_loads(txt)
 
-        verdict = str(obj.get("verdict", "")).strip().upper()
-        reasons = obj.get("reasons", [])
+def _decide_batch(profiles: List[Dict[str, Any]], *, model: object) -> List[Optional[Dict[str, Any]]]:
+    """여러 프로파일을 한 프롬프트로 판정. 항목별로 검증, 누락/불량 항목은 None(→ 규칙 결과)."""
+    keyed = {f"k{i}": compact_profile(p) for i, p in enumerate(profiles)}
+    messages = [
+        {"role": "system", "content": BATCH_DECIDER_SYSTEM},
+        {"role": "user", "content": json.dumps(keyed, ensure_ascii=False, separators=(",", ":"))},
+    ]
+    txt = _ollama_chat(messages, model=model, max_tokens=LLM_BATCH_TOKENS_PER_ITEM * len(profiles))
+    obj = _safe_json_loads(txt)
+
+    by_id: Dict[str, Dict[str, Any]] = {}
+    for item in obj.get("results") or []:
+        if isinstance(item, dict) and isinstance(item.get("id"), str):
+            by_id[item["id"]] = item
+
+    out: List[Optional[Dict[str, Any]]] = []
+    for i, p in enumerate(profiles):
+        item = by_id.get(f"k{i}")
+        out.append(_validate_decision(item, p) if item else None)
+    return out
+
+
+class _Pending:
+    __slots__ = ("key", "profile", "future")
+
+    def __init__(self, key: str, profile: Dict[str, Any]):
+        self.key = key
+        self.profile = profile
+        self.future: Future = Future()
 
-        if verdict not in ("SAFE", "SUSPICIOUS", "DANGEROUS"):
-            return None
-        if not isinstance(reasons, list) or len(reasons) == 0:
-            return None
 
-        # 하드룰 강제
-        if signals.get("kisa_url_hit"):
-            verdict = "DANGEROUS"
-            if "KISA URL 목록 일치" not in reasons:
-                reasons.insert(0, "KISA URL 목록 일치")
-        elif signals.get("kisa_domain_hit") and verdict == "SAFE":
-            verdict = "SUSPICIOUS"
-            if "KISA 도메인 목록 일치" not in reasons:
-                reasons.insert(0, "KISA 도메인 목록 일치")
-
-        # 점수 3단계 고정
-        if verdict == "SAFE":
-            score = SAFE_SCORE
-        elif verdict == "SUSPICIOUS":
-            score = SUSP_SCORE
-        else:
-            score = DANGER_SCORE
-
-        # reasons 정리(최소 2개 보장)
-        reasons = [str(r)[:120] for r in reasons if str(r).strip()][:3]
-        if len(reasons) < 2:
-            extra = (rule_result.get("reasons") or [])
-            for r in extra:
-                r = str(r).strip()
-                if r and r not in reasons:
-                    reasons.append(r[:120])
-                if len(reasons) >= 2:
+class DecisionBatcher:
+    """
+    동시에 들어온 Decider 요청을 window_ms 동안 모아 한 번의 생성으로 처리.
+    - 같은 프로파일(같은 fingerprint)은 배치 안에서 한 항목으로 합침
+    - 항목이 1개면 단일 프롬프트 경로 사용
+    - 배치는 워커 풀(모델 병렬도만큼)에서 실행
+    """
+
+    def __init__(
+        self,
+        *,
+        model: object = OLLAMA_MODEL,
+        window_ms: int = 8,
+        max_batch: int = 8,
+        workers: int = 1,
+    ):
+        self.model = model
+        self.window_sec = max(0, window_ms) / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._queue: "queue.Queue[Optional[_Pending]]" = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="llm-batch")
+        self._thread = threading.Thread(target=self._collect_loop, name="llm-batcher", daemon=True)
+        self._thread.start()
+        metrics.register_gauge("llm.batch.queue_depth", self._queue.qsize)
+
+    def submit(self, key: str, profile: Dict[str, Any]) -> Future:
+        p = _Pending(key, profile)
+        self._queue.put(p)
+        return p.future
+
+    def close(self, timeout: float = 2.0) -> None:
+        """모으던 배치까지 넘기고 수집 스레드 종료(실행 중인 배치는 끝까지, 새 배치는 안 받음)."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._pool.shutdown(wait=False)
+
+    def _collect_loop(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            closing = False
+            deadline = time.monotonic() + self.window_sec
+            while len(batch) < self.max_batch:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                try:
+                    p = self._queue.get(timeout=left)
+                except queue.Empty:
+                    break
+                if p is None:
+                    closing = True
                     break
-        reasons = reasons[:3]
+                batch.append(p)
+            self._pool.submit(self._run_batch, batch)
+            if closing:
+                return
+
+    def _run_batch(self, batch: List[_Pending]) -> None:
+        groups: Dict[str, List[_Pending]] = {}
+        for p in batch:
+            groups.setdefault(p.key, []).append(p)
+        keys = list(groups)
+        profiles = [groups[k][0].profile for k in keys]
+
+        metrics.incr("llm.batch.runs")
+        metrics.incr("llm.batch.items", len(batch))
+        metrics.incr("llm.batch.unique_items", len(keys))
+
+        try:
+            if len(profiles) == 1:
+                results = [_decide_single(profiles[0], model=self.model)]
+            else:
+                results = _decide_batch(profiles, model=self.model)
+        except Exception as e:
+            print("[LLM Batch ERROR]", e)
+            results = [None] * len(keys)
+
+        for k, decision in zip(keys, results):
+            if decision is None:
+                metrics.incr("llm.batch.item_fallback", len(groups[k]))
+            for p in groups[k]:
+                p.future.set_result(decision)
 
-        return {"risk_score": score, "verdict": verdict, "reasons": reasons}
 
+def llm_decide(
+    signals: Dict[str, Any],
+    rule_result: Dict[str, Any],
+    *,
+    model: str = OLLAMA_MODEL,
+    cache: Optional[LLMDecisionCache] = None,
+    batcher: Optional[DecisionBatcher] = None,
+    timeout: Optional[float] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    signals: 관찰값(redirect/kisa/url features 등)
+    rule_result: 규칙 기반 결과(백업)
+    cache: 같은 신호 프로파일이면 Ollama 호출 없이 재사용
+    batcher: 있으면 동시 요청과 묶어서 한 번에 생성(없으면 단건 호출)
+
+    ✅ 출력 점수는 요구사항대로 3단계 고정:
+    SAFE=5, SUSP=60, DANGER=90
+    """
+    profile = signal_profile(signals, rule_result)
+    key = fingerprint_key(cache_namespace(model), profile)
+
+    if cache is not None:
+        hit = cache.get(key)
+        if hit:
+            return _to_result(hit, rule_result)
+
+    if batcher is not None:
+        fut = batcher.submit(key, profile)
+    else:
+        fut = _single_pool().submit(_decide_single, profile, model=model)
+    if cache is not None:
+        # 마감(timeout)을 넘겨도 생성은 뒤에서 끝까지 진행 → 다음 요청은 캐시 히트
+        fut.add_done_callback(lambda f: _cache_late(cache, key, f))
+
+    try:
+        decision = fut.result(timeout=timeout)
+        if not decision:
+            return None
+        return _to_result(decision, rule_result)
+
+    except FutureTimeout:
+        metrics.incr("llm.decide.deadline")
+        print("[LLM Decider] deadline exceeded, using rules (generation continues in background)")
+        return None
     except Exception as e:
         print("[LLM Decider ERROR]", e)
         return None
+
+
+_SINGLE_POOL: Optional[ThreadPoolExecutor] = None
+_SINGLE_POOL_LOCK = threading.Lock()
+
+
+def _single_pool() -> ThreadPoolExecutor:
+    """배치 없이 단건 호출할 때도 마감을 걸 수 있도록 별도 스레드에서 실행."""
+    global _SINGLE_POOL
+    if _SINGLE_POOL is None:
+        with _SINGLE_POOL_LOCK:
+            if _SINGLE_POOL is None:
+                workers = max(1, int(os.getenv("OLLAMA_NUM_PARALLEL", "1"))) * 2
+                _SINGLE_POOL = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-single")
+    return _SINGLE_POOL
+
+
+def _cache_late(cache: LLMDecisionCache, key: str, fut: Future) -> None:
+    if fut.cancelled() or fut.exception() is not None:
+        return
+    decision = fut.result()
+    if decision:
+        cache.put(key, decision)
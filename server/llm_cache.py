@@ -0,0 +1,128 @@
+# server/llm_cache.py
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import metrics
+from db import connect
+
+
+def fingerprint_key(namespace: str, profile: Dict[str, Any]) -> str:
+    """profile(정규화된 신호)을 정렬된 JSON으로 직렬화해 해시."""
+    canon = json.dumps(profile, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(f"{namespace}|{canon}".encode("utf-8")).hexdigest()
+
+
+class LLMDecisionCache:
+    """
+    LLM Decider 결과 캐시(SQLite 영속).
+    - key: namespace(모델+프롬프트 해시) + 신호 fingerprint
+    - TTL 만료 + 최대 개수 초과 시 last_used 기준 LRU 삭제
+    - namespace가 바뀌면(모델/프롬프트 변경) 이전 항목은 전부 폐기
+    - 전용 SQLite 연결(다른 스레드의 KISA upsert 등과 커밋이 섞이지 않도록)
+    - 히트의 last_used 갱신은 메모리에 모았다가 한 번에 기록(읽을 때마다 커밋하지 않음)
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        *,
+        namespace: str,
+        ttl_sec: int = 7 * 24 * 3600,
+        max_entries: int = 50000,
+        touch_flush_sec: float = 30.0,
+        touch_flush_max: int = 256,
+    ):
+        self.con = connect(db_path)
+        self.namespace = namespace
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.touch_flush_sec = touch_flush_sec
+        self.touch_flush_max = max(1, touch_flush_max)
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._touched: Dict[str, float] = {}
+        self._last_flush = time.monotonic()
+
+        with self._lock:
+            self.con.execute("""
+            CREATE TABLE IF NOT EXISTS llm_decision_cache (
+              key TEXT PRIMARY KEY,
+              namespace TEXT NOT NULL,
+              decision TEXT NOT NULL,
+              created_at REAL NOT NULL,
+              last_used REAL NOT NULL
+            );
+            """)
+            self.con.execute(
+                "CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_decision_cache(last_used);"
+            )
+            # 모델/프롬프트가 바뀌었으면 이전 판정은 무효
+            self.con.execute("DELETE FROM llm_decision_cache WHERE namespace != ?", (namespace,))
+            self.con.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self.con.execute(
+                "SELECT decision, created_at FROM llm_decision_cache WHERE key=?", (key,)
+            ).fetchone()
+            if not row or now - row[1] > self.ttl_sec:
+                metrics.incr("llm.cache.miss")
+                return None
+            self._touched[key] = now
+            if len(self._touched) >= self.touch_flush_max or time.monotonic() - self._last_flush >= self.touch_flush_sec:
+                self._flush_touched_locked()
+                self.con.commit()
+        metrics.incr("llm.cache.hit")
+        return json.loads(row[0])
+
+    def put(self, key: str, decision: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            self.con.execute(
+                "INSERT OR REPLACE INTO llm_decision_cache(key, namespace, decision, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, self.namespace, json.dumps(decision, ensure_ascii=False), now, now),
+            )
+            self._touched.pop(key, None)
+            self._puts += 1
+            if self._puts % 100 == 0:
+                # LRU 삭제 전에 모아 둔 last_used부터 반영
+                self._flush_touched_locked()
+                self._evict_locked(now)
+            self.con.commit()
+
+    def _flush_touched_locked(self) -> None:
+        if self._touched:
+            self.con.executemany(
+                "UPDATE llm_decision_cache SET last_used=? WHERE key=?",
+                [(ts, k) for k, ts in self._touched.items()],
+            )
+            self._touched.clear()
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_touched_locked()
+            self.con.commit()
+            self.con.close()
+
+    def _evict_locked(self, now: float) -> None:
+        self.con.execute("DELETE FROM llm_decision_cache WHERE created_at < ?", (now - self.ttl_sec,))
+        self.con.execute(
+            """
+            DELETE FROM llm_decision_cache WHERE key IN (
+              SELECT key FROM llm_decision_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def size(self) -> int:
+        with self._lock:
+            return self.con.execute("SELECT COUNT(*) FROM llm_decision_cache").fetchone()[0]
@@ -1,346 +1,247 @@
 # server/main.py
+"""
+API 서버. import 시에는 라우트만 정의하고(.env 로드/DB 연결/스레드 시작 없음),
+리소스(DB, 캐시, 백그라운드 워커)는 create_app()이 만든 앱의 lifespan에서 준비/정리.
+
+  uvicorn main:app                              # 기본 앱(환경 변수 + server/.env)
+  uvicorn --factory main:create_app --workers 4 # 워커마다 앱을 새로 생성
+"""
 from __future__ import annotations
 
-import os
-from pathlib import Path
-from typing import Any, Dict
+import asyncio
+import hmac
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
 
-import requests
-from fastapi import FastAPI
+import anyio.to_thread
+from fastapi import APIRouter, FastAPI, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
-
-from db import connect, init_db, find_url, find_domain, upsert_url, upsert_domain
-from url_utils import (
-    normalize_url,
-    extract_registered_domain,
-    host_of,
-    looks_like_ip_host,
-    is_suspicious_punycode,
-    has_userinfo,
-    has_nonstandard_port,
-    is_https,
-    count_subdomains,
-    url_length,
-    percent_encoded_count,
-    count_query_params,
-    suspicious_keyword_hit,
-    is_known_shortener,
-    has_non_ascii,
-)
-from redirect_utils import trace_redirects
-from score_rules import score_url
-from llm_agent import llm_plan_tools, llm_decide
-
-# ✅ server/.env 강제 로드
-load_dotenv(dotenv_path=Path(__file__).with_name(".env"), override=True)
-
-DB_PATH = os.getenv("DB_PATH", "./kisa_phishing.db").strip()
-USE_LLM = os.getenv("USE_LLM", "false").lower() == "true"
-CORS_ALLOW_ORIGINS = os.getenv("CORS_ALLOW_ORIGINS", "*").strip()
-
-# KISA 온디맨드(필요할 때만 API 조회 후 DB 캐시)
-KISA_ONDEMAND = os.getenv("KISA_ONDEMAND", "true").lower() == "true"
-KISA_ONDEMAND_MAX_PAGES = int(os.getenv("KISA_ONDEMAND_MAX_PAGES", "3"))
-KISA_ONDEMAND_PER_PAGE = int(os.getenv("KISA_ONDEMAND_PER_PAGE", "1000"))
-KISA_ONDEMAND_TIMEOUT = float(os.getenv("KISA_ONDEMAND_TIMEOUT", "3.5"))
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 
-ODCLOUD_API = os.getenv("ODCLOUD_PHISH_API_BASE", "").strip()
-ODCLOUD_KEY = os.getenv("ODCLOUD_SERVICE_KEY", "").strip()
+from admission import Overloaded
+from deadline import Deadline
+from profiler import ProfileSession, ProfilerBusy, profile_current_thread
+from settings import Settings
+import metrics
 
-print("[BOOT] USE_LLM=", USE_LLM, "KISA_ONDEMAND=", KISA_ONDEMAND)
+try:
+    # orjson이 있으면 응답 직렬화를 orjson으로(표준 json 대비 수 배 빠름)
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:
+    FastJSONResponse = JSONResponse
 
-con = connect(DB_PATH)
-init_db(con)
+router = APIRouter()
 
-app = FastAPI(title="Phish Hover Agent API (LLM-based, no WHOIS)")
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[CORS_ALLOW_ORIGINS] if CORS_ALLOW_ORIGINS != "*" else ["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-
-def _is_local_or_private_host(url: str) -> bool:
-    h = (host_of(url) or "").lower()
-    if not h:
-        return True
-    if h in ("localhost",):
-        return True
-    if h.startswith("127.") or h.startswith("10.") or h.startswith("192.168."):
-        return True
-    if h.startswith("172."):
-        # 172.16.0.0 ~ 172.31.255.255
-        try:
-            second = int(h.split(".")[1])
-            if 16 <= second <= 31:
-                return True
-        except Exception:
-            pass
-    return False
-
-
-def _fetch_odcloud_page(page: int, per_page: int) -> Dict[str, Any]:
-    if not ODCLOUD_API or not ODCLOUD_KEY:
-        raise RuntimeError("ODCLOUD_PHISH_API_BASE / ODCLOUD_SERVICE_KEY 설정이 필요합니다(.env).")
-
-    params = {
-        "page": page,
-        "perPage": per_page,
-        "returnType": "JSON",
-        "serviceKey": ODCLOUD_KEY,
-    }
-    r = requests.get(
-        ODCLOUD_API,
-        params=params,
-        timeout=KISA_ONDEMAND_TIMEOUT,
-        headers={"User-Agent": "phish-hover-agent/1.0"},
-    )
-    r.raise_for_status()
-    return r.json()
+# /analyze 외 sync 라우트(prefetch, metrics, admin 등) 몫으로 남겨 둘 스레드 수(AnyIO 기본값)
+_SYNC_ROUTE_THREADS = 40
 
 
-def kisa_lazy_cache(final_url: str, final_domain: str) -> Dict[str, Any]:
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
     """
-    DB 미스일 때만:
-    - OpenAPI 최근 N페이지를 스캔
-    - 페이지 내 데이터는 DB에 upsert(캐시)
-    - target URL/도메인 매칭되면 조기 종료
+    앱 생성. settings를 안 주면(기본 앱/--factory) 환경 변수 + server/.env에서 읽고,
+    기동 시 .env를 os.environ에도 반영 → 무거운 모듈(requests, dnspython, LLM 클라이언트 등)은
+    lifespan에서 처음 import하므로 모듈 수준 설정에도 적용됨.
+    settings를 직접 준 앱은 os.environ을 건드리지 않음(한 프로세스의 다른 앱 설정을 바꾸지 않도록).
     """
-    out = {"ran": False, "matched": False, "pages_scanned": 0, "error": None}
-
-    if not KISA_ONDEMAND:
-        return out
-    if _is_local_or_private_host(final_url):
-        return out
-    if not ODCLOUD_API or not ODCLOUD_KEY:
-        out["error"] = "odcloud_not_configured"
-        return out
-
-    target_url = normalize_url(final_url)
-    target_domain = final_domain or extract_registered_domain(target_url)
-
-    try:
-        out["ran"] = True
-
-        for page in range(1, KISA_ONDEMAND_MAX_PAGES + 1):
-            out["pages_scanned"] = page
-            j = _fetch_odcloud_page(page, KISA_ONDEMAND_PER_PAGE)
-            rows = j.get("data", []) or []
-            if not rows:
-                break
-
-            page_matched = False
-
-            for row in rows:
-                # KISA OpenAPI는 한글 필드명 사용: "홈페이지주소", "날짜"
-                raw_url = (row.get("홈페이지주소") or row.get("URL") or row.get("url") or "").strip()
-                date = (row.get("날짜") or row.get("DATE") or row.get("date") or None)
+    apply_env = settings is None
+    cfg = settings or Settings.from_env()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+        t0 = time.monotonic()
+        if apply_env:
+            cfg.apply_env_file()
+        # /analyze 캐시 미스는 ANALYZE_MAX_INFLIGHT까지 동시에 스레드를 씀
+        # → AnyIO 기본 스레드 한도(40)를 그만큼 늘림(기본 몫은 다른 sync 라우트용으로 남김)
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        limiter.total_tokens = max(limiter.total_tokens, cfg.analyze_max_inflight + _SYNC_ROUTE_THREADS)
+        # 준비 단계는 블로킹 I/O(SQLite, 파일) → 이벤트 루프 밖에서
+        analyzer = await asyncio.to_thread(_start_analyzer, cfg)
+        app.state.settings = cfg
+        app.state.analyzer = analyzer
+        app.state.profile_session = ProfileSession()
+        print(
+            "[BOOT] USE_LLM=", cfg.use_llm,
+            "KISA_ONDEMAND=", cfg.kisa_ondemand,
+            "startup_ms=", int((time.monotonic() - t0) * 1000),
+            analyzer.startup_ms,
+        )
+        try:
+            yield
+        finally:
+            analyzer.close()
+
+    app = FastAPI(
+        title="Phish Hover Agent API (LLM-based, cached WHOIS)",
+        default_response_class=FastJSONResponse,
+        lifespan=lifespan,
+    )
+    origins = cfg.cors_allow_origins
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=[origins] if origins != "*" else ["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.include_router(router)
+    return app
 
-                if not raw_url:
-                    continue
 
-                nurl = normalize_url(raw_url)
-                dom = extract_registered_domain(nurl)
+def _start_analyzer(cfg: Settings):
+    t0 = time.monotonic()
+    from analyzer import Analyzer
 
-                # 캐시 적재
-                upsert_url(con, nurl, date)
-                if dom:
-                    upsert_domain(con, dom, date)
+    analyzer = Analyzer(cfg)
+    analyzer.startup_ms["imports"] = int((time.monotonic() - t0) * 1000)
+    analyzer.start()
+    return analyzer
 
-                # 매칭 확인
-                if nurl == target_url:
-                    page_matched = True
-                if target_domain and dom and dom == target_domain:
-                    page_matched = True
 
-            con.commit()
+@router.get("/")
+def root():
+    return {"ok": True, "hint": "Use POST /analyze or GET /docs"}
 
-            if page_matched:
-                out["matched"] = True
-                break
 
-            if len(rows) < KISA_ONDEMAND_PER_PAGE:
-                break
+@router.get("/blocklist/filter")
+def blocklist_filter(request: Request, since: Optional[str] = None):
+    """
+    KISA URL/도메인 Bloom filter(확장프로그램 로컬 사전검사용).
+    since=이전 버전이면 바뀐 바이트만(delta), 아니면 전체 비트(base64).
+    """
+    return request.app.state.analyzer.blocklist.payload(since)
+
+
+@router.get("/metrics")
+def get_metrics():
+    return metrics.snapshot()
+
+
+# compact 응답 필드(호버 툴팁/팝업이 쓰는 것만)
+COMPACT_FIELDS = (
+    "input_url",
+    "final_url",
+    "risk_score",
+    "verdict",
+    "reasons",
+    "redirect_hops",
+    "source",
+    "cache_ttl_sec",
+    "cached",
+    "partial",
+    "skipped_stages",
+)
 
-    except Exception as e:
-        out["error"] = str(e)
 
+def _compact(result: Dict[str, Any]) -> Dict[str, Any]:
+    out = {k: result[k] for k in COMPACT_FIELDS if k in result}
+    out.setdefault("input_url", result.get("original_url"))
     return out
 
 
-@app.get("/")
-def root():
-    return {"ok": True, "hint": "Use POST /analyze or GET /docs"}
+def _is_admin(request: Request) -> bool:
+    admin_token = request.app.state.settings.admin_token
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(admin_token) and hmac.compare_digest(token.encode(), admin_token.encode())
 
 
-@app.post("/analyze")
-def analyze(payload: dict):
+@router.post("/admin/profile")
+def admin_profile(
+    request: Request,
+    seconds: float = 10.0,
+    max_requests: int = Query(0, alias="requests"),
+    interval_ms: float = 5.0,
+    format: str = "folded",
+):
+    """
+    실행 중인 노드 전체를 샘플링 프로파일링(X-Admin-Token 필요).
+    seconds가 지나거나 /analyze가 requests건 끝나면 종료(먼저 오는 쪽).
+    format=folded(기본): flamegraph.pl / speedscope 입력용 collapsed stack 텍스트, json: 요약 + 텍스트
+    """
+    if not _is_admin(request):
+        return FastJSONResponse({"error": "forbidden"}, status_code=403)
+    try:
+        sampler = request.app.state.profile_session.run(
+            seconds=min(max(0.1, seconds), request.app.state.settings.profile_max_sec),
+            requests=max_requests,
+            interval_sec=max(1.0, interval_ms) / 1000.0,
+        )
+    except ProfilerBusy:
+        return FastJSONResponse({"error": "profiler_busy"}, status_code=409)
+    if format == "json":
+        return {**sampler.summary(), "folded": sampler.folded()}
+    return PlainTextResponse(sampler.folded(), headers={"X-Profile-Samples": str(sampler.samples)})
+
+
+@router.post("/analyze")
+async def analyze(payload: dict, request: Request):
+    """
+    기본은 compact 응답(고정 스키마, 툴팁용).
+    payload에 "verbose": true 를 주면 관측값/리다이렉트 체인/규칙 debug까지 전부 반환.
+    payload의 deadline_ms(없으면 ANALYZE_DEADLINE_MS) 안에 못 끝낸 단계는 건너뛰고
+    skipped_stages에 기록, 규칙 판정은 항상 제시간에 반환.
+    X-Profile: 1 + X-Admin-Token 이면 이 요청만 프로파일링해 응답 "profile"에 collapsed stack 첨부.
+    캐시 히트는 이벤트 루프에서 바로 응답, 미스는 전역 한도(ANALYZE_MAX_INFLIGHT)에 먼저 입장한 뒤
+    워커 스레드로 넘김 → 한도를 넘으면 스레드 대기열에 쌓지 않고 즉시 503.
+    """
     url = (payload.get("url") or "").strip()
     if not url:
         return {"risk_score": 5, "verdict": "SAFE", "reasons": ["url 없음", "추가 근거 부족"], "source": "rules"}
 
-    original = normalize_url(url)
-    original_domain = extract_registered_domain(original)
-
-    # 1) 원본 기준: KISA 빠른 체크(DB)
-    kisa0_url_date = find_url(con, original)
-    kisa0_domain_date = find_domain(con, original_domain) if original_domain else None
-
-    quick_signals = {
-        "original_url": original,
-        "domain": original_domain,
-        "kisa_url_hit_original": kisa0_url_date is not None,
-        "kisa_domain_hit_original": kisa0_domain_date is not None,
-        "is_ip": looks_like_ip_host(original),
-        "is_punycode": is_suspicious_punycode(original),
-        "has_userinfo": has_userinfo(original),
-        "is_https": is_https(original),
-    }
-
-    # 2) LLM Planner(redirect 실행 여부) - ✅ 인자 순서 실수 방지(키워드/단일 인자)
-    plan = {"run_redirect": True}
-    if USE_LLM:
-        plan = llm_plan_tools(signals=quick_signals) or plan
-
-    # 3) Redirect 추적
-    rr = trace_redirects(original, max_hops=10, timeout=6.0) if plan.get("run_redirect", True) else None
-    final_url = normalize_url(rr.final_url) if rr else original
-    used_redirect = (rr.hops > 0) if rr else False
-    redirect_hops = rr.hops if rr else 0
-    redirect_chain = rr.chain if rr else [original]
-
-    # 4) final 기준: KISA 재검사(DB)
-    final_domain = extract_registered_domain(final_url)
-
-    kisa_url_date = find_url(con, final_url)
-    kisa_domain_date = find_domain(con, final_domain) if final_domain else None
-    kisa_url_hit = kisa_url_date is not None
-    kisa_domain_hit = kisa_domain_date is not None
-
-    # 4-1) 미스면 온디맨드 API 스캔 + 캐시 후 재검사
-    kisa_lazy = {"ran": False, "matched": False, "pages_scanned": 0, "error": None}
-    if (not kisa_url_hit) and (not kisa_domain_hit):
-        kisa_lazy = kisa_lazy_cache(final_url, final_domain)
-        kisa_url_date = find_url(con, final_url)
-        kisa_domain_date = find_domain(con, final_domain) if final_domain else None
-        kisa_url_hit = kisa_url_date is not None
-        kisa_domain_hit = kisa_domain_date is not None
-
-    # 5) WHOIS는 완전 제거(항상 None)
-    whois_days = None
-    whois_err = "disabled"
-
-    # 6) URL 특징 신호(최종 URL 기준)
-    ip_host = looks_like_ip_host(final_url)
-    puny = is_suspicious_punycode(final_url)
-    userinfo = has_userinfo(final_url)
-    nonstd_port = has_nonstandard_port(final_url)
-    https = is_https(final_url)
-    subdomains = count_subdomains(final_url)
-    ulen = url_length(final_url)
-    enc = percent_encoded_count(final_url)
-    qn = count_query_params(final_url)
-    kw = suspicious_keyword_hit(final_url)
-    shortener = is_known_shortener(final_url)
-    non_ascii = has_non_ascii(final_url)
-
-    # 7) 리다이렉트 체인 도메인 변경 여부
-    rd_set = set()
-    for u in redirect_chain[:30]:
-        rd = extract_registered_domain(normalize_url(u))
-        if rd:
-            rd_set.add(rd)
-        else:
-            h = host_of(u)
-            if h:
-                rd_set.add(h)
-
-    domain_switch_count = len(rd_set) if rd_set else 1
-    domain_switched = False
-    if used_redirect:
-        if original_domain and final_domain and original_domain != final_domain:
-            domain_switched = True
-        elif domain_switch_count >= 2:
-            domain_switched = True
-
-    # 8) 규칙 기반 점수(항상 baseline + fallback)
-    ruled = score_url(
-        kisa_url_hit=kisa_url_hit,
-        kisa_domain_hit=(kisa_domain_hit and not kisa_url_hit),
-
-        redirect_hops=redirect_hops,
-        used_redirect=used_redirect,
-        domain_switched=domain_switched,
-        domain_switch_count=domain_switch_count,
-
-        is_ip=ip_host,
-        is_punycode=puny,
-        has_userinfo=userinfo,
-        nonstandard_port=nonstd_port,
-        https=https,
-        subdomains=subdomains,
-        is_shortener=shortener,
-
-        url_len=ulen,
-        enc_count=enc,
-        query_params=qn,
-        keyword_hit=kw,
-        has_non_ascii=non_ascii,
-
-        whois_age_days=whois_days,
-        whois_error=whois_err,
+    cfg: Settings = request.app.state.settings
+    analyzer = request.app.state.analyzer
+    try:
+        deadline_ms = float(payload.get("deadline_ms", cfg.analyze_deadline_ms))
+    except (TypeError, ValueError):
+        deadline_ms = cfg.analyze_deadline_ms
+    deadline = Deadline(deadline_ms / 1000.0, reserve_sec=cfg.deadline_reserve_ms / 1000.0)
+    profile = request.headers.get("X-Profile", "").lower() in ("1", "true") and _is_admin(request)
+
+    def run():
+        if profile:
+            with profile_current_thread() as sampler:
+                return analyzer.analyze_foreground(url, deadline), sampler
+        return analyzer.analyze_foreground(url, deadline), None
+
+    sampler = None
+    try:
+        result = None if profile else analyzer.cached_result(url)
+        if result is None:
+            with analyzer.admitted():
+                result, sampler = await run_in_threadpool(run)
+    except Overloaded as e:
+        return FastJSONResponse(
+            {"error": "overloaded", "retry_after_sec": e.retry_after_sec},
+            status_code=503,
+            headers={"Retry-After": str(e.retry_after_sec)},
+        )
+    finally:
+        request.app.state.profile_session.note_request()
+
+    verbose = bool(payload.get("verbose", cfg.analyze_verbose_default))
+    metrics.incr("analyze.response.verbose" if verbose else "analyze.response.compact")
+    body = result if verbose else _compact(result)
+    if sampler is not None:
+        body = {**body, "profile": {**sampler.summary(), "folded": sampler.folded()}}
+    # Response 객체를 직접 돌려주면 FastAPI의 jsonable_encoder 단계를 건너뜀
+    return FastJSONResponse(
+        body,
+        headers={"Cache-Control": f"private, max-age={result['cache_ttl_sec']}"},
     )
 
-    observations = {
-        "original_url": original,
-        "final_url": final_url,
-        "redirect_hops": redirect_hops,
-        "redirect_chain": redirect_chain,
-        "domain": final_domain,
-        "domain_switched": domain_switched,
-        "domain_switch_count": domain_switch_count,
-
-        "kisa_url_hit": kisa_url_hit,
-        "kisa_url_date": kisa_url_date,
-        "kisa_domain_hit": kisa_domain_hit,
-        "kisa_domain_date": kisa_domain_date,
-        "kisa_lazy": kisa_lazy,
-
-        "whois_age_days": None,
-
-        "is_ip": ip_host,
-        "is_punycode": puny,
-        "has_userinfo": userinfo,
-        "nonstandard_port": nonstd_port,
-        "https": https,
-        "subdomains": subdomains,
-        "url_len": ulen,
-        "enc_count": enc,
-        "query_params": qn,
-        "keyword_hit": kw,
-        "is_shortener": shortener,
-        "has_non_ascii": non_ascii,
-
-        "planner": plan,
-    }
-
-    rule_result = {"risk_score": ruled.score, "verdict": ruled.verdict, "reasons": ruled.reasons}
-
-    # 9) LLM Decider - ✅ 인자 순서 실수 방지
-    llm_out = llm_decide(signals=observations, rule_result=rule_result) if USE_LLM else None
-    final = llm_out if llm_out else rule_result
-    source = "llm" if llm_out else "rules"
-
-    return {
-        **observations,
-        "risk_score": final["risk_score"],
-        "verdict": final["verdict"],
-        "reasons": final["reasons"],
-        "source": source,
-        "debug": ruled.debug,
-        "whois_error": whois_err,
-    }
+
+@router.post("/prefetch")
+def prefetch(payload: dict, request: Request):
+    """
+    확장프로그램이 보낸 화면 내 링크를 저우선순위로 미리 분석(결과 캐시 워밍).
+    payload: {"client_id": "...", "links": [{"url": "...", "near": true}, ...]}
+    """
+    client_id = str(payload.get("client_id") or (request.client.host if request.client else "anon"))
+    return request.app.state.analyzer.prefetch(client_id, payload)
+
+
+# uvicorn main:app 호환(생성만 하고 리소스는 기동 시 lifespan에서)
+app = create_app()
@@ -0,0 +1,50 @@
+# server/metrics.py
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Dict
+
+# 프로세스 내 단순 카운터/게이지 (GET /metrics 로 노출)
+_LOCK = threading.Lock()
+_COUNTERS: Dict[str, int] = {}
+_GAUGES: Dict[str, Callable[[], Any]] = {}
+
+
+def incr(name: str, n: int = 1) -> None:
+    with _LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + n
+
+
+def get(name: str) -> int:
+    with _LOCK:
+        return _COUNTERS.get(name, 0)
+
+
+def register_gauge(name: str, fn: Callable[[], Any]) -> None:
+    """현재값을 조회 시점에 계산하는 게이지(큐 깊이, 브레이커 상태 등)."""
+    with _LOCK:
+        _GAUGES[name] = fn
+
+
+def ratio(num: str, den: str) -> float:
+    d = get(den)
+    return round(get(num) / d, 4) if d else 0.0
+
+
+def snapshot() -> Dict[str, Any]:
+    with _LOCK:
+        counters = dict(_COUNTERS)
+        gauges = dict(_GAUGES)
+
+    out: Dict[str, Any] = {"counters": dict(sorted(counters.items())), "gauges": {}}
+    for name, fn in sorted(gauges.items()):
+        try:
+            out["gauges"][name] = fn()
+        except Exception as e:
+            out["gauges"][name] = f"error: {e}"
+    return out
+
+
+def reset() -> None:
+    with _LOCK:
+        _COUNTERS.clear()
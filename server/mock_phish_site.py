@@ -1,5 +1,7 @@
+import time
+
 from fastapi import FastAPI, Response
-from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse, StreamingResponse
 
 app = FastAPI(title="Mock Phish-like Site (Safe)")
 
@@ -48,6 +50,13 @@ def home():
     <a href="http://127.0.0.1:9000/path/very/long/url/with/many/segments/to/confuse/users/about/the/actual/destination/login">
       긴 경로 URL
     </a><br><br>
+
+    <h3>10) 3xx 없이 본문으로 이동 (REDIRECT_INSPECT_BODY=true에서 탐지)</h3>
+    <a href="http://127.0.0.1:9000/meta-refresh">meta refresh → /login</a><br>
+    <a href="http://127.0.0.1:9000/js-redirect">location.href → /r2 → /login</a><br>
+    <a href="http://127.0.0.1:9000/short-meta">/short(302) → /meta-refresh → /login</a><br>
+    <a href="http://127.0.0.1:9000/big-page">큰 본문 끝에 meta refresh(읽기 한도 밖이라 탐지 안 됨)</a><br>
+    <a href="http://127.0.0.1:9000/slow-body">본문을 천천히 흘림(읽기 마감 시간 테스트)</a><br><br>
     """
     return html
 
@@ -71,6 +80,44 @@ def chain(n: int):
         return RedirectResponse(url="/login", status_code=302)
     return RedirectResponse(url=f"/chain/{n-1}", status_code=302)
 
+@app.get("/meta-refresh", response_class=HTMLResponse)
+def meta_refresh():
+    return """
+    <!doctype html><html><head><meta charset="utf-8">
+    <meta http-equiv="refresh" content="0; url=/login">
+    </head><body>잠시 후 이동합니다…</body></html>
+    """
+
+@app.get("/js-redirect", response_class=HTMLResponse)
+def js_redirect():
+    return """
+    <!doctype html><html><head><meta charset="utf-8"></head>
+    <body><script>window.location.href = "/r2";</script></body></html>
+    """
+
+@app.get("/short-meta")
+def short_meta():
+    return RedirectResponse(url="/meta-refresh", status_code=302)
+
+@app.get("/big-page", response_class=HTMLResponse)
+def big_page(kb: int = 2048):
+    # 리다이렉트 태그가 본문 맨 끝 → 읽기 바이트 한도 안에서는 찾을 수 없어야 정상
+    kb = max(1, min(20480, kb))
+    filler = "<p>" + ("lorem ipsum " * 80) + "</p>\n"
+    body = filler * (kb * 1024 // len(filler) + 1)
+    return "<!doctype html><html><body>" + body + '<meta http-equiv="refresh" content="0;url=/login"></body></html>'
+
+@app.get("/slow-body")
+def slow_body(seconds: int = 10):
+    # 본문을 1초에 한 조각씩 → 읽기 마감 시간(REDIRECT_BODY_READ_SEC) 이후엔 읽지 않아야 정상
+    def gen():
+        yield "<!doctype html><html><body>"
+        for _ in range(max(1, min(60, seconds))):
+            time.sleep(1)
+            yield "<p>loading…</p>"
+        yield '<script>location.replace("/login")</script></body></html>'
+    return StreamingResponse(gen(), media_type="text/html")
+
 @app.get("/login", response_class=HTMLResponse)
 def login():
     # 절대 실제 계정정보 수집/전송하지 않는 “모양만” 페이지
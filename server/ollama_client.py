@@ -0,0 +1,269 @@
+# server/ollama_client.py
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+
+class OllamaUnavailable(RuntimeError):
+    """브레이커 open 또는 동시 생성 슬롯 대기 초과 → 즉시 규칙 결과로 폴백."""
+
+
+class CircuitBreaker:
+    """
+    closed   : 정상 호출
+    open     : 연속 실패가 threshold 이상 → reset_after_sec 동안 호출 차단
+    half_open: 차단 시간이 지나면 1건만 시험 호출, 성공 시 closed / 실패 시 다시 open
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_after_sec: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_after_sec = reset_after_sec
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_inflight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_after_sec:
+                return "half_open"
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == "closed":
+                return True
+            if self._state == "open":
+                if time.monotonic() - self._opened_at < self.reset_after_sec:
+                    return False
+                self._state = "half_open"
+            # half_open: 시험 호출은 한 번에 하나만
+            if self._probe_inflight:
+                return False
+            self._probe_inflight = True
+            return True
+
+    def release_probe(self) -> None:
+        with self._lock:
+            self._probe_inflight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._probe_inflight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_inflight = False
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                if self._state != "open":
+                    metrics.incr("ollama.breaker.opened")
+                self._state = "open"
+                self._opened_at = time.monotonic()
+
+
+class OllamaClient:
+    """
+    공유 Ollama 클라이언트.
+    - requests.Session + 커넥션 풀(keep-alive) 재사용
+    - BoundedSemaphore로 동시 생성 수를 모델 병렬도(OLLAMA_NUM_PARALLEL)에 맞춤
+    - keep_alive로 모델을 메모리에 상주, 기동 시 warmup
+    - 스트리밍 + num_predict 상한, 필요한 JSON이 완성되면 조기 종료
+    - 연속 오류/타임아웃이면 브레이커 open
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        timeout: float = 12.0,
+        max_parallel: int = 1,
+        queue_timeout: float = 2.0,
+        keep_alive: str = "30m",
+        max_tokens: int = 160,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_parallel = max(1, max_parallel)
+        self.queue_timeout = queue_timeout
+        self.keep_alive = keep_alive
+        self.max_tokens = max(1, max_tokens)
+        self.breaker = breaker or CircuitBreaker()
+
+        self._slots = threading.BoundedSemaphore(self.max_parallel)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._inflight = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_parallel + 1)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _acquire(self) -> None:
+        if not self.breaker.allow():
+            metrics.incr("ollama.rejected_breaker_open")
+            raise OllamaUnavailable("ollama circuit breaker is open")
+
+        with self._lock:
+            self._waiting += 1
+        try:
+            ok = self._slots.acquire(timeout=self.queue_timeout)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        if not ok:
+            metrics.incr("ollama.rejected_queue_timeout")
+            # 슬롯 대기 실패는 서버 장애가 아니라 포화 → 실패로 세지 않고 시험 호출 권한만 반납
+            self.breaker.release_probe()
+            raise OllamaUnavailable("ollama generation slots are busy")
+        with self._lock:
+            self._inflight += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._inflight -= 1
+        self._slots.release()
+
+    def chat(
+        self,
+        messages: List[Dict[str, Any]],
+        *,
+        model: str,
+        stop_when: Optional[Callable[[str], bool]] = None,
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        """
+        스트리밍으로 받으며 누적 텍스트를 stop_when에 넘김.
+        stop_when이 True를 돌려주면 즉시 응답을 닫음(Ollama가 생성을 중단) → 남은 토큰 비용 절약.
+        """
+        payload = {
+            "model": model,
+            "messages": messages,
+            "stream": True,
+            "keep_alive": self.keep_alive,
+            "options": {"num_predict": max_tokens or self.max_tokens},
+            # ❌ "format": "json" (Ollama 0.13.3에서 400 나는 케이스가 있어 제거)
+        }
+
+        t0 = time.monotonic()
+        parts: List[str] = []
+        tokens_in: Optional[int] = None
+        tokens_out = 0
+        early_stop = False
+
+        self._acquire()
+        try:
+            with self.session.post(
+                f"{self.base_url}/api/chat", json=payload, timeout=self.timeout, stream=True
+            ) as r:
+                if r.status_code != 200:
+                    raise RuntimeError(f"Ollama /api/chat error {r.status_code}: {r.text}")
+                for line in r.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise RuntimeError(f"Ollama stream error: {chunk['error']}")
+                    piece = (chunk.get("message") or {}).get("content", "")
+                    if piece:
+                        parts.append(piece)
+                        tokens_out += 1
+                    if chunk.get("done"):
+                        tokens_in = chunk.get("prompt_eval_count")
+                        tokens_out = chunk.get("eval_count", tokens_out)
+                        break
+                    if piece and stop_when is not None and stop_when("".join(parts)):
+                        early_stop = True
+                        break
+            content = "".join(parts)
+        except Exception:
+            metrics.incr("ollama.errors")
+            self.breaker.record_failure()
+            raise
+        finally:
+            self._release()
+
+        self.breaker.record_success()
+        metrics.incr("ollama.calls")
+        metrics.incr("ollama.tokens_out", tokens_out)
+        if tokens_in is not None:
+            metrics.incr("ollama.tokens_in", tokens_in)
+        if early_stop:
+            metrics.incr("ollama.early_stop")
+
+        # 조기 종료 시 prompt_eval_count를 못 받으므로 문자 수 기반 추정(~)
+        if tokens_in is None:
+            approx = sum(len(str(m.get("content", ""))) for m in messages) // 3
+            tin = f"~{approx}"
+        else:
+            tin = str(tokens_in)
+        print(
+            f"[LLM] model={model} tokens_in={tin} tokens_out={tokens_out} "
+            f"ms={int((time.monotonic() - t0) * 1000)} early_stop={early_stop}"
+        )
+        return content
+
+    def warmup(self, model: str) -> bool:
+        """프롬프트 없는 generate 호출 → 모델 로드 + keep_alive 동안 상주."""
+        try:
+            r = self.session.post(
+                f"{self.base_url}/api/generate",
+                json={"model": model, "keep_alive": self.keep_alive},
+                timeout=max(self.timeout, 60.0),
+            )
+            ok = r.status_code == 200
+        except Exception as e:
+            print("[LLM WARMUP ERROR]", e)
+            ok = False
+        print("[LLM WARMUP]", model, "ok=", ok)
+        return ok
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "queue_depth": self._waiting,
+                "inflight": self._inflight,
+                "max_parallel": self.max_parallel,
+                "breaker": self.breaker.state,
+            }
+
+
+_CLIENT: Optional[OllamaClient] = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client() -> OllamaClient:
+    """환경변수는 최초 1회만 읽어 공유 클라이언트 생성."""
+    global _CLIENT
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                _CLIENT = OllamaClient(
+                    os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
+                    timeout=float(os.getenv("LLM_TIMEOUT_SEC", "12")),
+                    max_parallel=int(os.getenv("OLLAMA_NUM_PARALLEL", "1")),
+                    queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT_SEC", "2")),
+                    keep_alive=os.getenv("OLLAMA_KEEP_ALIVE", "30m"),
+                    max_tokens=int(os.getenv("LLM_MAX_TOKENS", "160")),
+                    breaker=CircuitBreaker(
+                        failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "3")),
+                        reset_after_sec=float(os.getenv("LLM_BREAKER_RESET_SEC", "30")),
+                    ),
+                )
+                metrics.register_gauge("ollama.client", _CLIENT.stats)
+    return _CLIENT
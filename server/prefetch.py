@@ -0,0 +1,183 @@
+# server/prefetch.py
+from __future__ import annotations
+
+import heapq
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import metrics
+from cache_utils import TTLCache
+from url_utils import extract_registered_domain, normalize_url
+
+# 우선순위 단계(작을수록 먼저)
+PRIORITY_NEAR = 0      # 커서 근처 링크
+PRIORITY_VISIBLE = 1   # 화면에 보이는 링크
+
+
+class PrefetchScheduler:
+    """
+    화면에 보이는 링크를 미리 분석해 결과 캐시를 데워 두는 저우선순위 큐.
+    - (단계, 클라이언트 내 순번, 도착 순서) 힙 → 같은 단계에서는 클라이언트끼리 라운드로빈
+    - 클라이언트당 대기 개수 상한(client_quota): 링크 5,000개짜리 페이지가 큐를 독점하지 못함
+    - 같은 등록 도메인은 per_domain개까지만 대기, 최근 처리한 URL은 다시 넣지 않음
+    - 호버 요청(foreground)이 처리 중이면 워커는 새 작업을 시작하지 않고 양보
+    """
+
+    def __init__(
+        self,
+        run_fn: Callable[[str], Any],
+        *,
+        workers: int = 1,
+        client_quota: int = 50,
+        per_domain: int = 2,
+        recent_ttl_sec: float = 600.0,
+        queue_max: int = 5000,
+    ):
+        self.run_fn = run_fn
+        self.client_quota = max(1, client_quota)
+        self.per_domain = max(1, per_domain)
+        self.queue_max = max(1, queue_max)
+
+        self._cv = threading.Condition()
+        self._heap: List[Tuple[int, int, int, str, str, str]] = []
+        self._seq = 0
+        self._client_queued: Dict[str, int] = {}
+        self._client_rounds: Dict[str, int] = {}
+        self._domain_queued: Dict[str, int] = {}
+        self._queued_urls: set = set()
+        self._recent: TTLCache[bool] = TTLCache(maxsize=50000, default_ttl=recent_ttl_sec)
+        self._foreground = 0
+        self._closed = False
+
+        for i in range(max(1, workers)):
+            threading.Thread(target=self._worker, name=f"prefetch-{i}", daemon=True).start()
+
+    # ----------------------------
+    # 호버(전경) 요청 표시
+    # ----------------------------
+    @contextmanager
+    def foreground(self) -> Iterator[None]:
+        with self._cv:
+            self._foreground += 1
+        try:
+            yield
+        finally:
+            with self._cv:
+                self._foreground -= 1
+                if self._foreground == 0:
+                    self._cv.notify_all()
+
+    # ----------------------------
+    # 적재
+    # ----------------------------
+    def submit(self, client_id: str, links: Iterable[Tuple[str, bool]]) -> Dict[str, int]:
+        """links: (url, near_cursor). 반환: 적재/중복/쿼터 초과 개수."""
+        out = {"queued": 0, "duplicate": 0, "over_quota": 0}
+        with self._cv:
+            # 클라이언트가 새 링크 묶음을 보내면 순번을 처음부터(이전 페이지 잔여분보다 앞서도록)
+            self._client_rounds[client_id] = 0
+            for raw, near in links:
+                url = normalize_url(raw)
+                if not url.startswith(("http://", "https://")):
+                    continue
+                domain = extract_registered_domain(url) or url
+                if url in self._queued_urls or self._recent.get(url) is not None:
+                    out["duplicate"] += 1
+                    continue
+                if self._domain_queued.get(domain, 0) >= self.per_domain:
+                    out["duplicate"] += 1
+                    continue
+                if self._client_queued.get(client_id, 0) >= self.client_quota or len(self._heap) >= self.queue_max:
+                    out["over_quota"] += 1
+                    continue
+
+                rnd = self._client_rounds[client_id]
+                self._client_rounds[client_id] = rnd + 1
+                self._seq += 1
+                prio = PRIORITY_NEAR if near else PRIORITY_VISIBLE
+                heapq.heappush(self._heap, (prio, rnd, self._seq, client_id, url, domain))
+                self._queued_urls.add(url)
+                self._client_queued[client_id] = self._client_queued.get(client_id, 0) + 1
+                self._domain_queued[domain] = self._domain_queued.get(domain, 0) + 1
+                out["queued"] += 1
+            if out["queued"]:
+                self._cv.notify_all()
+
+        metrics.incr("prefetch.queued", out["queued"])
+        metrics.incr("prefetch.duplicate", out["duplicate"])
+        metrics.incr("prefetch.over_quota", out["over_quota"])
+        return out
+
+    # ----------------------------
+    # 워커
+    # ----------------------------
+    def _take(self) -> Optional[Tuple[str, str]]:
+        with self._cv:
+            while True:
+                if self._closed:
+                    return None
+                if self._heap and self._foreground == 0:
+                    break
+                if self._heap and self._foreground:
+                    metrics.incr("prefetch.yielded")
+                self._cv.wait(timeout=1.0)
+            _, _, _, client_id, url, domain = heapq.heappop(self._heap)
+            self._queued_urls.discard(url)
+            self._dec(self._client_queued, client_id)
+            self._dec(self._domain_queued, domain)
+            if client_id not in self._client_queued:
+                self._client_rounds.pop(client_id, None)
+            self._recent.set(url, True)
+            return client_id, url
+
+    @staticmethod
+    def _dec(counts: Dict[str, int], key: str) -> None:
+        n = counts.get(key, 0) - 1
+        if n > 0:
+            counts[key] = n
+        else:
+            counts.pop(key, None)
+
+    def _worker(self) -> None:
+        while True:
+            job = self._take()
+            if job is None:
+                return
+            _, url = job
+            try:
+                self.run_fn(url)
+                metrics.incr("prefetch.done")
+            except Exception as e:
+                metrics.incr("prefetch.errors")
+                print("[PREFETCH ERROR]", url, e)
+
+    def close(self) -> None:
+        """대기 중인 링크는 버리고 워커 종료(처리 중인 분석은 끝까지)."""
+        with self._cv:
+            self._closed = True
+            self._heap.clear()
+            self._cv.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cv:
+            return {
+                "queue_depth": len(self._heap),
+                "clients": len(self._client_queued),
+                "foreground_inflight": self._foreground,
+            }
+
+
+def parse_links(payload: Dict[str, Any], max_links: int) -> List[Tuple[str, bool]]:
+    """{"links": [{"url", "near"}, ...]} 또는 {"urls": [...]} → [(url, near)]"""
+    out: List[Tuple[str, bool]] = []
+    for item in payload.get("links") or []:
+        if isinstance(item, dict) and item.get("url"):
+            out.append((str(item["url"]).strip(), bool(item.get("near"))))
+    for u in payload.get("urls") or []:
+        if isinstance(u, str) and u.strip():
+            out.append((u.strip(), False))
+    # 커서 근처를 먼저 보고 상한 적용
+    out.sort(key=lambda x: not x[1])
+    return out[:max(0, max_links)]
+
@@ -0,0 +1,137 @@
+# server/profiler.py
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Set
+
+import metrics
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__") or os.path.basename(code.co_filename)
+    return f"{module}:{code.co_name}"
+
+
+def _fold(frame) -> str:
+    """leaf 프레임 → 'root;...;leaf' (flamegraph.pl / speedscope collapsed 형식)."""
+    parts = []
+    while frame is not None:
+        parts.append(_frame_label(frame))
+        frame = frame.f_back
+    parts.reverse()
+    return ";".join(parts)
+
+
+class Sampler:
+    """
+    sys._current_frames() 기반 저오버헤드 샘플링 프로파일러.
+    - interval_sec마다 대상 스레드(thread_ids, 없으면 자기 자신 제외 전체)의 스택을 접어서 집계
+    - 계측 코드 삽입 없음 → 켜 둔 동안에도 요청 경로 비용은 GIL 경합 정도
+    """
+
+    def __init__(self, interval_sec: float = 0.005, thread_ids: Optional[Set[int]] = None):
+        self.interval_sec = max(0.001, interval_sec)
+        self.thread_ids = thread_ids
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started = 0.0
+        self.elapsed = 0.0
+
+    def start(self) -> "Sampler":
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "Sampler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.monotonic() - self.started
+        return self
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        while not self._stop.wait(self.interval_sec):
+            frames = sys._current_frames()
+            for tid, frame in frames.items():
+                if tid == me or (self.thread_ids is not None and tid not in self.thread_ids):
+                    continue
+                if tid not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                thread = (names.get(tid) or str(tid)).replace(";", "_").replace(" ", "_")
+                self.stacks[f"{thread};{_fold(frame)}"] += 1
+            self.samples += 1
+            del frames
+
+    def folded(self) -> str:
+        """한 줄에 '스택 횟수' → flamegraph.pl / speedscope / inferno 에 바로 입력 가능."""
+        return "\n".join(f"{stack} {n}" for stack, n in self.stacks.most_common()) + "\n"
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "stacks": len(self.stacks),
+            "elapsed_sec": round(self.elapsed, 3),
+            "interval_ms": round(self.interval_sec * 1000, 2),
+        }
+
+
+class ProfilerBusy(RuntimeError):
+    """전역 프로파일링 세션은 한 번에 하나만."""
+
+
+class ProfileSession:
+    """
+    관리자용 전역 세션: seconds가 지나거나 /analyze 요청이 requests건 끝나면 종료.
+    요청 완료는 note_request()로 통지.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._active: Optional[Sampler] = None
+        self._remaining_requests = 0
+        self._done = threading.Event()
+
+    def run(self, *, seconds: float, requests: int = 0, interval_sec: float = 0.005) -> Sampler:
+        with self._lock:
+            if self._active is not None:
+                raise ProfilerBusy("profiling session already running")
+            self._done.clear()
+            self._remaining_requests = max(0, requests)
+            self._active = Sampler(interval_sec).start()
+        metrics.incr("profiler.sessions")
+        try:
+            self._done.wait(timeout=max(0.1, seconds))
+        finally:
+            with self._lock:
+                sampler, self._active = self._active, None
+        return sampler.stop()
+
+    def note_request(self) -> None:
+        with self._lock:
+            if self._active is None or self._remaining_requests <= 0:
+                return
+            self._remaining_requests -= 1
+            if self._remaining_requests == 0:
+                self._done.set()
+
+
+@contextmanager
+def profile_current_thread(interval_sec: float = 0.001) -> Iterator[Sampler]:
+    """요청 1건 프로파일링(X-Profile 헤더): 현재 스레드만 샘플링."""
+    sampler = Sampler(interval_sec, thread_ids={threading.get_ident()}).start()
+    metrics.incr("profiler.requests")
+    try:
+        yield sampler
+    finally:
+        sampler.stop()
@@ -1,9 +1,272 @@
+import asyncio
+import codecs
+import os
+import re
+import socket
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import List, Optional
+from email.utils import parsedate_to_datetime
+from http.cookiejar import DefaultCookiePolicy
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ReadTimeoutError
+
+import metrics
+from cache_utils import TTLCache
+from dns_utils import dns_cache
+from ip_ranges import is_private_host
+
+# 커넥션 풀(호스트별)
+REDIRECT_POOL_HOSTS = int(os.getenv("REDIRECT_POOL_HOSTS", "256"))          # 풀을 유지할 호스트 수
+REDIRECT_POOL_PER_HOST = int(os.getenv("REDIRECT_POOL_PER_HOST", "32"))     # 호스트당 최대 동시 연결
+# 연결 주소를 공유 DNS 캐시(dns_utils)에서 꺼내 씀(SSRF 검사한 주소로 그대로 연결)
+REDIRECT_DNS_CACHE = os.getenv("REDIRECT_DNS_CACHE", "true").lower() == "true"
+# 본문 검사(meta refresh / JS 리다이렉트)
+REDIRECT_INSPECT_BODY = os.getenv("REDIRECT_INSPECT_BODY", "false").lower() == "true"
+REDIRECT_BODY_MAX_BYTES = int(os.getenv("REDIRECT_BODY_MAX_BYTES", "65536"))
+REDIRECT_BODY_READ_SEC = float(os.getenv("REDIRECT_BODY_READ_SEC", "1.0"))
+# SSRF 방지: 내부망/예약 주소(로 해석되는 이름 포함)로는 요청하지 않고 거기서 중단
+REDIRECT_BLOCK_PRIVATE = os.getenv("REDIRECT_BLOCK_PRIVATE", "true").lower() == "true"
+# 위 차단의 예외(로컬 데모 사이트 등): host 또는 host:port, 쉼표 구분
+REDIRECT_PRIVATE_ALLOW = frozenset(
+    h.strip().lower()
+    for h in os.getenv("REDIRECT_PRIVATE_ALLOW", "127.0.0.1:9000,localhost:9000").split(",")
+    if h.strip()
+)
+# async/배치 추적용 스레드 수
+REDIRECT_TRACE_WORKERS = int(os.getenv("REDIRECT_TRACE_WORKERS", "32"))
+
+# 홉 캐시(source URL -> 다음 URL/상태코드). 캐시 헤더가 없으면 301/308만 캐시
+REDIRECT_CACHE_MAX = int(os.getenv("REDIRECT_CACHE_MAX", "50000"))
+REDIRECT_CACHE_PERMANENT_TTL_SEC = float(os.getenv("REDIRECT_CACHE_PERMANENT_TTL_SEC", "86400"))  # 301/308
+REDIRECT_CACHE_MAX_TTL_SEC = float(os.getenv("REDIRECT_CACHE_MAX_TTL_SEC", str(7 * 86400)))
+
+_REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+_PERMANENT_STATUSES = (301, 308)
+_HEAD_UNSUPPORTED = (405, 501)
+_MAX_AGE_RE = re.compile(r"(?:s-maxage|max-age)\s*=\s*(\d+)", re.IGNORECASE)
+REDIRECT_HEAD_CACHE_TTL_SEC = float(os.getenv("REDIRECT_HEAD_CACHE_TTL_SEC", str(6 * 3600)))
+REDIRECT_HEAD_FAIL_LIMIT = int(os.getenv("REDIRECT_HEAD_FAIL_LIMIT", "3"))   # HEAD 예외가 연속 이만큼이면 GET 전용
+_META_TAG_RE = re.compile(r"<meta\b[^>]{0,1024}>", re.IGNORECASE)
+_META_REFRESH_RE = re.compile(r"http-equiv\s*=\s*[\"']?\s*refresh", re.IGNORECASE)
+_META_CONTENT_URL_RE = re.compile(r"content\s*=\s*[\"']?\s*[\d.]*\s*[;,]\s*url\s*=\s*[\"']?([^\"'>\s]+)", re.IGNORECASE)
+_JS_REDIRECT_RE = re.compile(
+    r"(?:window\.|document\.|top\.|self\.)?location(?:\.href)?\s*=\s*[\"']([^\"']{1,2048})[\"']"
+    r"|location\.(?:replace|assign)\(\s*[\"']([^\"']{1,2048})[\"']",
+    re.IGNORECASE,
+)
+# 청크 경계에 걸친 태그/구문을 놓치지 않도록 이전 청크 끝부분을 겹쳐서 스캔
+_SCAN_OVERLAP = 2048
+# 본문 한 번 읽기 크기(작게 → 읽기 사이 마감 확인이 촘촘)
+_BODY_READ_CHUNK = 4096
+# 홉별 적중률은 앞쪽 몇 홉만 따로 집계
+_HOP_STATS_MAX = 6
+
+
+@dataclass
+class Hop:
+    status: int
+    next_url: Optional[str]     # None이면 체인의 마지막(리다이렉트 아님)
+    kind: str = "http"          # http(3xx) | meta(meta refresh) | js(location 대입)
+    body_checked: bool = False  # 최종 응답 본문까지 검사했는지(본문 검사 모드에서 재사용 가능 여부)
+
+
+_HOP_CACHE: TTLCache[Hop] = TTLCache(maxsize=REDIRECT_CACHE_MAX, default_ttl=REDIRECT_CACHE_PERMANENT_TTL_SEC)
+# 호스트별 HEAD 지원 여부(True: HEAD 사용, False: 바로 GET)
+_HEAD_SUPPORT: TTLCache[bool] = TTLCache(maxsize=20000, default_ttl=REDIRECT_HEAD_CACHE_TTL_SEC)
+# 호스트별 연속 HEAD 실패(예외) 횟수(HEAD 성공 시 초기화)
+_HEAD_FAILURES: TTLCache[int] = TTLCache(maxsize=20000, default_ttl=REDIRECT_HEAD_CACHE_TTL_SEC)
+class PrivateAddressBlocked(OSError):
+    """연결 직전 검사에서 내부망/예약 주소로 해석됨(SSRF 방지)."""
+
+
+def _resolve_cached(host: str, port: int) -> str:
+    """
+    호스트 → 연결할 주소(공유 DNS 캐시). 이름으로 되돌려 OS가 다시 해석하게 두지 않음
+    (/etc/hosts, search 도메인으로 검사와 다른 주소에 연결될 수 있으므로).
+    - 주소가 없으면 gaierror
+    - REDIRECT_BLOCK_PRIVATE면 연결할 주소를 여기서 다시 검사(검사 ~ 연결 사이 캐시 만료로
+      다른 주소가 들어오는 DNS rebinding 방지)
+    """
+    answer = dns_cache.resolve(host)
+    if not answer.addresses:
+        raise socket.gaierror(socket.EAI_NONAME, f"{host}: {answer.error or 'no address'}")
+    netloc = f"[{host}]:{port}" if ":" in host else f"{host}:{port}"
+    if REDIRECT_BLOCK_PRIVATE and answer.private and not _private_allowed(f"//{netloc}"):
+        metrics.incr("redirect.private_blocked_connect")
+        raise PrivateAddressBlocked(f"{host} resolves to private address {answer.addresses[0]}")
+    return answer.addresses[0]
+
+
+class _CachedDNSMixin:
+    """
+    urllib3는 _dns_host로 소켓을 연결하고 host로 SNI/인증서 검증/Host 헤더를 만든다.
+    _dns_host만 캐시된 주소로 바꾸고 host는 원래 이름을 유지.
+    """
+
+    @property
+    def host(self) -> str:
+        return self._dns_name.rstrip(".")
+
+    @host.setter
+    def host(self, value: str) -> None:
+        self._dns_name = value
+
+    @property
+    def _dns_host(self) -> str:
+        return _resolve_cached(self._dns_name.rstrip("."), self.port)
+
+    @_dns_host.setter
+    def _dns_host(self, value: str) -> None:
+        self._dns_name = value
+
+
+class _CachedDNSHTTPConnection(_CachedDNSMixin, HTTPConnection):
+    pass
+
+
+class _CachedDNSHTTPSConnection(_CachedDNSMixin, HTTPSConnection):
+    pass
+
+
+class _CachedDNSHTTPPool(HTTPConnectionPool):
+    ConnectionCls = _CachedDNSHTTPConnection
+
+
+class _CachedDNSHTTPSPool(HTTPSConnectionPool):
+    ConnectionCls = _CachedDNSHTTPSConnection
+
+
+class _HostSlot:
+    __slots__ = ("sem", "in_use", "refs")
+
+    def __init__(self, size: int):
+        self.sem = threading.BoundedSemaphore(size)
+        self.in_use = 0
+        self.refs = 0   # 자리를 잡았거나 기다리는 요청 수(0인 슬롯만 정리 대상)
 
 
-_SESSION = requests.Session()
+class RedirectClient:
+    """
+    리다이렉트 추적 전용 HTTP 클라이언트(스레드 안전).
+    - 호스트별 풀 크기(pool_maxsize)만큼만 동시 요청 → 연결은 항상 풀에서 재사용
+      (stream=True 응답은 close() 때까지 연결을 쥐고 있으므로 자리도 그때 반납)
+    - 호스트별 자리 정보는 pool_hosts개까지만 유지(오래 안 쓴 빈 자리부터 정리)
+    - 공유 상태 변경 없음: max_redirects 대신 호출마다 max_hops, 쿠키 저장 안 함
+    - 풀 대기 시간/사용률 집계
+    - dns_cache=True(또는 REDIRECT_BLOCK_PRIVATE)면 호스트 주소를 공유 DNS 캐시(레코드 TTL 존중)에서
+      꺼내 연결하고, 연결 직전에 내부 주소인지 다시 검사
+    """
+
+    def __init__(self, *, pool_hosts: int, pool_per_host: int, dns_cache: bool = False):
+        self.pool_hosts = max(1, pool_hosts)
+        self.pool_per_host = max(1, pool_per_host)
+        self.session = requests.Session()
+        # 스레드 간에 쿠키가 섞이지 않도록 쿠키는 아예 저장하지 않음
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(pool_connections=self.pool_hosts, pool_maxsize=self.pool_per_host, max_retries=0)
+        # 내부 주소 차단이 켜져 있으면 검사한 주소로만 연결해야 하므로 항상 공유 DNS 캐시 경유
+        if dns_cache or REDIRECT_BLOCK_PRIVATE:
+            adapter.poolmanager.pool_classes_by_scheme = {"http": _CachedDNSHTTPPool, "https": _CachedDNSHTTPSPool}
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._slots: "OrderedDict[str, _HostSlot]" = OrderedDict()
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _slot(self, host: str) -> _HostSlot:
+        with self._lock:
+            slot = self._slots.get(host)
+            if slot is None:
+                slot = self._slots[host] = _HostSlot(self.pool_per_host)
+                if len(self._slots) > self.pool_hosts:
+                    # 쓰는 중인 자리를 지우면 같은 호스트에 새 자리가 생겨 한도를 넘으므로 빈 자리만
+                    for h in [h for h, s in self._slots.items() if s.refs == 0 and s is not slot]:
+                        del self._slots[h]
+                        if len(self._slots) <= self.pool_hosts:
+                            break
+            else:
+                self._slots.move_to_end(host)
+            slot.refs += 1
+            return slot
+
+    def _release(self, slot: _HostSlot) -> None:
+        with self._lock:
+            slot.in_use -= 1
+            slot.refs -= 1
+        slot.sem.release()
+
+    def request(self, method: str, url: str, *, wait_timeout: float, **kwargs: Any) -> requests.Response:
+        slot = self._slot((urlsplit(url).hostname or "").lower())
+
+        t0 = time.monotonic()
+        if not slot.sem.acquire(timeout=wait_timeout):
+            with self._lock:
+                slot.refs -= 1
+            metrics.incr("redirect.pool.wait_timeout")
+            raise requests.exceptions.ConnectTimeout(f"connection pool wait timeout for {url}")
+        waited = time.monotonic() - t0
+        with self._lock:
+            slot.in_use += 1
+            self._waits += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        try:
+            r = self.session.request(method, url, **kwargs)
+        except BaseException:
+            self._release(slot)
+            raise
+        if not kwargs.get("stream"):
+            self._release(slot)
+            return r
+
+        # 본문을 다 읽거나 close()할 때까지 연결이 풀 밖에 있음 → 자리도 close()에서 반납(한 번만)
+        close = r.close
+        released = threading.Lock()
+
+        def close_and_release() -> None:
+            try:
+                close()
+            finally:
+                if released.acquire(blocking=False):
+                    self._release(slot)
+
+        r.close = close_and_release
+        return r
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            busy = [s.in_use for s in self._slots.values() if s.in_use]
+            return {
+                "hosts": len(self._slots),
+                "hosts_busy": len(busy),
+                "in_use": sum(busy),
+                "max_host_utilization": round(max(busy) / self.pool_per_host, 4) if busy else 0.0,
+                "wait_ms_avg": round(self._wait_total / self._waits * 1000, 3) if self._waits else 0.0,
+                "wait_ms_max": round(self._wait_max * 1000, 3),
+            }
+
+
+_CLIENT = RedirectClient(
+    pool_hosts=REDIRECT_POOL_HOSTS,
+    pool_per_host=REDIRECT_POOL_PER_HOST,
+    dns_cache=REDIRECT_DNS_CACHE,
+)
+metrics.register_gauge("redirect.pool", _CLIENT.stats)
+_TRACE_POOL = ThreadPoolExecutor(max_workers=REDIRECT_TRACE_WORKERS, thread_name_prefix="redirect")
+
 
 @dataclass
 class RedirectResult:
@@ -11,50 +274,453 @@ class RedirectResult:
     chain: List[str]
     hops: int
     error: Optional[str] = None
+    cache_hits: int = 0
+    truncated: bool = False     # 시간 예산 초과로 체인 일부만 확인
+    client_redirects: int = 0   # 본문(meta refresh/JS)으로 이동한 홉 수
+    blocked: Optional[str] = None   # 내부망으로 향해 따라가지 않은 다음 URL(SSRF 방지)
 
-def trace_redirects(url: str, max_hops: int = 10, timeout: float = 6.0) -> RedirectResult:
-    chain: List[str] = []
-    try:
-        # Redirect tracing doesn't need the response body.
-        # Use stream=True to avoid downloading large HTML.
-        headers = {"User-Agent": "phish-hover-agent/1.0"}
-        # Separate connect/read timeouts to fail fast.
-        req_timeout = (min(3.0, float(timeout)), float(timeout))
 
-        # Enforce redirect cap via Session.max_redirects.
-        _SESSION.max_redirects = max(1, int(max_hops))
+def _cache_ttl(r: requests.Response) -> float:
+    """
+    캐시 헤더를 존중한 홉 TTL(초). 0이면 캐시하지 않음.
+    - 4xx/5xx(429 포함) → 0(일시적 오류가 체인의 끝으로 굳지 않도록)
+    - no-store/no-cache/private → 0
+    - s-maxage/max-age → 그 값(상한 REDIRECT_CACHE_MAX_TTL_SEC)
+    - Expires → 남은 시간
+    - 헤더 없음 → 301/308만 길게, 나머지(302/303/307, 최종 응답)는 캐시 안 함
+    """
+    if r.status_code >= 400:
+        return 0.0
+    cc = (r.headers.get("Cache-Control") or "").lower()
+    if "no-store" in cc or "no-cache" in cc or "private" in cc:
+        return 0.0
+
+    m = _MAX_AGE_RE.search(cc)
+    if m:
+        return min(float(m.group(1)), REDIRECT_CACHE_MAX_TTL_SEC)
+
+    expires = r.headers.get("Expires")
+    if expires:
+        try:
+            left = parsedate_to_datetime(expires).timestamp() - time.time()
+            return max(0.0, min(left, REDIRECT_CACHE_MAX_TTL_SEC))
+        except Exception:
+            return 0.0
+
+    if r.status_code in _PERMANENT_STATUSES:
+        return REDIRECT_CACHE_PERMANENT_TTL_SEC
+    return 0.0
+
 
-        # Prefer HEAD first (often faster), fall back to GET.
+class _BudgetExceeded(Exception):
+    pass
+
+
+def _req_timeout(deadline: float):
+    """남은 예산으로 (connect, read) 타임아웃 계산. 예산이 없으면 중단."""
+    left = deadline - time.monotonic()
+    if left <= 0.05:
+        raise _BudgetExceeded()
+    # Separate connect/read timeouts to fail fast.
+    return (min(3.0, left), left)
+
+
+def _fetch_hop(url: str, deadline: float, headers: Dict[str, str]) -> requests.Response:
+    """
+    HEAD가 보통 더 빠르므로 먼저 시도하고, 실패(예외/405/501)하면 GET.
+    호스트별로 HEAD 가능 여부를 기억해 GET만 되는 호스트는 바로 GET(왕복 1회 절약).
+    - 405/501이면 바로 GET 전용으로 기록
+    - 예외(타임아웃 등)는 일시적일 수 있어 REDIRECT_HEAD_FAIL_LIMIT번 연속일 때만 GET 전용으로
+    """
+    host = (urlsplit(url).hostname or "").lower()
+    kw = dict(allow_redirects=False, headers=headers, stream=True)
+
+    head_ok = _HEAD_SUPPORT.get(host)
+    unsupported = False
+    if head_ok is False:
+        metrics.incr("redirect.head.fallback_avoided")
+    else:
         try:
-            r = _SESSION.head(
-                url,
-                allow_redirects=True,
-                timeout=req_timeout,
-                headers=headers,
-                stream=True,
-            )
+            t = _req_timeout(deadline)
+            r = _CLIENT.request("HEAD", url, wait_timeout=t[0], timeout=t, **kw)
+            if r.status_code not in _HEAD_UNSUPPORTED:
+                if head_ok is None:
+                    _HEAD_SUPPORT.set(host, True)
+                _HEAD_FAILURES.pop(host)
+                return r
+            r.close()
+            unsupported = True
+        except _BudgetExceeded:
+            raise
         except Exception:
-            r = _SESSION.get(
-                url,
-                allow_redirects=True,
-                timeout=req_timeout,
-                headers=headers,
-                stream=True,
-            )
+            pass
+        metrics.incr("redirect.head.fallback")
 
+    t = _req_timeout(deadline)
+    r = _CLIENT.request("GET", url, wait_timeout=t[0], timeout=t, **kw)
+    # GET은 되는데 HEAD가 안 됐던 경우만 기록(호스트 자체가 죽은 경우와 구분)
+    if unsupported:
+        _HEAD_SUPPORT.set(host, False)
+    elif head_ok is not False:
+        failures = (_HEAD_FAILURES.get(host) or 0) + 1
+        if failures >= REDIRECT_HEAD_FAIL_LIMIT:
+            _HEAD_SUPPORT.set(host, False)
+            _HEAD_FAILURES.pop(host)
+        else:
+            _HEAD_FAILURES.set(host, failures)
+    return r
+
+
+def _find_client_redirect(text: str) -> Optional[Tuple[str, str]]:
+    """HTML 조각에서 meta refresh / JS location 이동 대상 찾기 → (kind, target)."""
+    for tag in _META_TAG_RE.finditer(text):
+        t = tag.group(0)
+        if _META_REFRESH_RE.search(t):
+            m = _META_CONTENT_URL_RE.search(t)
+            if m:
+                return "meta", m.group(1)
+    m = _JS_REDIRECT_RE.search(text)
+    if m:
+        return "js", m.group(1) or m.group(2)
+    return None
+
+
+def _set_read_timeout(r: requests.Response, sec: float) -> None:
+    """스트리밍 중인 응답 소켓의 읽기 타임아웃 변경(다음 recv부터 적용)."""
+    conn = getattr(r.raw, "connection", None) or getattr(r.raw, "_connection", None)
+    sock = getattr(conn, "sock", None)
+    if sock is not None:
+        sock.settimeout(max(0.01, sec))
+
+
+def _scan_body(r: requests.Response, body_deadline: float) -> Tuple[Optional[Tuple[str, str]], bool]:
+    """
+    본문을 최대 REDIRECT_BODY_MAX_BYTES까지, body_deadline까지만 스트리밍하며 점진 스캔
+    → (찾은 이동 대상, 끝까지 봤는지). 시간 제한으로 끊긴 "못 찾음"은 False(검사 완료로 캐시하지 않도록).
+    - 한 번에 소켓 recv 한 번(read1, 최대 _BODY_READ_CHUNK)만 읽고, 읽기 전마다 소켓 타임아웃을
+      마감까지 남은 시간으로 설정 → 1바이트씩 흘려보내는 서버도 마감에 끊김
+    - 청크 경계에 걸린 멀티바이트 문자는 점진 디코더가 이어 붙임
+    - 메모리는 (청크 + 겹침 버퍼)로 고정
+    """
+    try:
+        decoder = codecs.getincrementaldecoder(r.encoding or "utf-8")(errors="ignore")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    read1 = getattr(r.raw, "read1", None)   # urllib3 2.3 미만은 read(amt)(소량이라 거의 같음)
+    read = 0
+    tail = ""
+    while read < REDIRECT_BODY_MAX_BYTES:
+        left = body_deadline - time.monotonic()
+        if left <= 0:
+            metrics.incr("redirect.body.time_limit")
+            return None, False
+        _set_read_timeout(r, left)
+        amt = min(_BODY_READ_CHUNK, REDIRECT_BODY_MAX_BYTES - read)
+        try:
+            chunk = read1(amt, decode_content=True) if read1 else r.raw.read(amt, decode_content=True)
+        except (socket.timeout, ReadTimeoutError):
+            metrics.incr("redirect.body.time_limit")
+            return None, False
+        if not chunk:
+            return None, True
+        read += len(chunk)
+        window = tail + decoder.decode(chunk)
+        found = _find_client_redirect(window)
+        if found:
+            return found, True
+        tail = window[-_SCAN_OVERLAP:]
+    # 읽기 상한까지 봤으면 다시 봐도 같음 → 검사 완료
+    metrics.incr("redirect.body.byte_limit")
+    return None, True
+
+
+def _is_html(r: requests.Response) -> bool:
+    ctype = (r.headers.get("Content-Type") or "").lower()
+    # HEAD 응답에 Content-Type이 없는 서버도 있으니 비어 있으면 일단 검사
+    return not ctype or "html" in ctype
+
+
+def _inspect_body(url: str, r: requests.Response, deadline: float, headers: Dict[str, str]) -> Optional[Hop]:
+    """
+    최종(200) HTML 응답 본문에서 클라이언트 측 리다이렉트를 찾으면 추가 홉으로.
+    시간이 모자라 끝까지 못 봤으면 body_checked=False 최종 홉(캐시돼도 본문 검사 모드에선 다시 검사).
+    """
+    if r.status_code != 200 or not _is_html(r):
+        return None
+
+    body_deadline = min(deadline, time.monotonic() + REDIRECT_BODY_READ_SEC)
+    if r.request is not None and r.request.method == "HEAD":
+        # HEAD는 본문이 없으니 GET으로 다시 받되, 읽기 타임아웃도 본문 마감에 맞춤
+        r.close()
+        left = body_deadline - time.monotonic()
+        if left <= 0.05:
+            return Hop(status=200, next_url=None, body_checked=False)
+        r = _CLIENT.request(
+            "GET", url, wait_timeout=min(3.0, left), timeout=(min(3.0, left), left),
+            allow_redirects=False, headers=headers, stream=True,
+        )
+        if r.status_code != 200 or not _is_html(r):
+            r.close()
+            return None
+
+    try:
+        metrics.incr("redirect.body.inspected")
+        found, complete = _scan_body(r, body_deadline)
+    except Exception:
+        found, complete = None, False
+    finally:
+        r.close()
+
+    if not found:
+        return None if complete else Hop(status=200, next_url=None, body_checked=False)
+    kind, target = found
+    target = target.strip()
+    nxt = urljoin(url, target)
+    if urlsplit(nxt).scheme not in ("http", "https"):
+        return None
+    metrics.incr(f"redirect.body.{kind}")
+    return Hop(status=200, next_url=nxt, kind=kind, body_checked=True)
+
+
+def _resolve_hop(url: str, deadline: float, headers: Dict[str, str], inspect_body: bool) -> Hop:
+    r = _fetch_hop(url, deadline, headers)
+    try:
+        ttl = _cache_ttl(r)
+        location = r.headers.get("Location")
+        if r.status_code in _REDIRECT_STATUSES and location:
+            hop = Hop(status=r.status_code, next_url=urljoin(url, location))
+        else:
+            hop = None
+            if inspect_body:
+                hop = _inspect_body(url, r, deadline, headers)
+            if hop is None:
+                hop = Hop(status=r.status_code, next_url=None, body_checked=inspect_body)
+        _HOP_CACHE.set(url, hop, ttl=ttl)
+        return hop
+    finally:
         # Close immediately to avoid reading body.
         try:
             r.close()
         except Exception:
             pass
 
-        history = getattr(r, "history", []) or []
-        chain = [url] + [h.url for h in history if getattr(h, "url", None)]
-        final_url = r.url or url
-        if not chain or chain[-1] != final_url:
-            chain.append(final_url)
 
-        hops = len(history)
-        return RedirectResult(final_url=final_url, chain=chain, hops=hops)
+def _record_hop(index: int, hit: bool) -> None:
+    kind = "hit" if hit else "miss"
+    metrics.incr(f"redirect.hop_cache.{kind}")
+    if index < _HOP_STATS_MAX:
+        metrics.incr(f"redirect.hop_cache.hop{index}.{kind}")
+
+
+def hop_cache_stats() -> Dict[str, object]:
+    per_hop = {}
+    for i in range(_HOP_STATS_MAX):
+        h = metrics.get(f"redirect.hop_cache.hop{i}.hit")
+        m = metrics.get(f"redirect.hop_cache.hop{i}.miss")
+        if h + m:
+            per_hop[f"hop{i}"] = round(h / (h + m), 4)
+    return {**_HOP_CACHE.stats(), "hit_ratio_by_hop": per_hop}
+
+
+metrics.register_gauge("redirect.hop_cache", hop_cache_stats)
+metrics.register_gauge("redirect.head_support", lambda: _HEAD_SUPPORT.stats())
+
+
+def _host(url: str) -> str:
+    try:
+        return (urlsplit(url).hostname or "").lower()
+    except ValueError:
+        return ""
+
+
+def _private_allowed(url: str) -> bool:
+    """REDIRECT_PRIVATE_ALLOW에 있는 host(:port)면 내부 주소여도 요청 허용."""
+    try:
+        sp = urlsplit(url)
+        host = (sp.hostname or "").lower()
+        port = sp.port or (443 if sp.scheme == "https" else 80)
+    except ValueError:
+        return False
+    return bool(host) and (host in REDIRECT_PRIVATE_ALLOW or f"{host}:{port}" in REDIRECT_PRIVATE_ALLOW)
+
+
+def _dns_check(url: str, deadline: float) -> Optional[str]:
+    """요청 전 DNS 검사: 막아야 하면 사유(private | unresolved), 통과면 None."""
+    left = deadline - time.monotonic()
+    if left <= 0.05:
+        raise _BudgetExceeded()
+    answer = dns_cache.resolve(_host(url), timeout=left)
+    if not answer.addresses:
+        if answer.error == "timeout":
+            raise _BudgetExceeded()
+        # 빈 응답/오류를 "내부 아님"으로 보고 진행하면 OS 리졸버가 다른 답을 낼 수 있음
+        return "unresolved"
+    return "private" if answer.private else None
+
+
+def _blocked_at_connect(e: BaseException) -> bool:
+    """requests/urllib3 예외 사슬 안에 연결 직전 차단(PrivateAddressBlocked)이 있는지."""
+    seen = set()
+    cur: Optional[BaseException] = e
+    while cur is not None and id(cur) not in seen:
+        if isinstance(cur, PrivateAddressBlocked):
+            return True
+        seen.add(id(cur))
+        nxt = getattr(cur, "reason", None) or cur.__cause__ or cur.__context__
+        if nxt is None and cur.args and isinstance(cur.args[0], BaseException):
+            nxt = cur.args[0]
+        cur = nxt if isinstance(nxt, BaseException) else None
+    return False
+
+
+class _TraceState:
+    """추적 진행 상황. 시간 초과 시 여기까지의 부분 체인을 돌려주기 위해 공유."""
+
+    def __init__(self, url: str):
+        self.chain: List[str] = [url]
+        self.cache_hits = 0
+        self.client_redirects = 0
+        self.blocked: Optional[str] = None
+
+    def result(self, *, error: Optional[str] = None, truncated: bool = False) -> RedirectResult:
+        chain = list(self.chain)
+        return RedirectResult(
+            final_url=chain[-1],
+            chain=chain,
+            hops=len(chain) - 1,
+            error=error,
+            cache_hits=self.cache_hits,
+            truncated=truncated,
+            client_redirects=self.client_redirects,
+            blocked=self.blocked,
+        )
+
+
+def _trace(url: str, max_hops: int, deadline: float, state: _TraceState, inspect_body: bool) -> RedirectResult:
+    # Redirect tracing doesn't need the response body (본문 검사 모드 제외).
+    headers = {"User-Agent": "phish-hover-agent/1.0"}
+    max_hops = max(1, int(max_hops))
+    # 시작 URL도 검사(예외는 REDIRECT_PRIVATE_ALLOW에 등록한 데모 호스트만)
+    guard = REDIRECT_BLOCK_PRIVATE
+
+    try:
+        while True:
+            cur = state.chain[-1]
+            hops = len(state.chain) - 1
+            hop = _HOP_CACHE.get(cur)
+            # 본문을 안 본 최종 응답 캐시는 본문 검사 모드에선 쓸 수 없음
+            if hop is not None and inspect_body and hop.next_url is None and not hop.body_checked:
+                hop = None
+            _record_hop(hops, hop is not None)
+            if hop is not None:
+                state.cache_hits += 1
+            else:
+                verdict = _dns_check(cur, deadline) if guard and not _private_allowed(cur) else None
+                if verdict == "unresolved":
+                    # 검사할 주소가 없으면 요청하지 않고 여기서 끝(체인은 이 URL까지)
+                    metrics.incr("redirect.dns_unresolved")
+                    return state.result(error="dns resolution failed")
+                if verdict == "private":
+                    # 내부 주소(또는 내부 주소로 해석되는 이름) → 요청 자체를 보내지 않음
+                    metrics.incr("redirect.private_blocked")
+                    state.blocked = cur
+                    if len(state.chain) > 1:
+                        state.chain.pop()
+                    return state.result(error="redirect to private address blocked")
+                hop = _resolve_hop(cur, deadline, headers, inspect_body)
+
+            if hop.next_url is None:
+                # 본문을 끝까지 못 봤으면 잠정 결과(truncated)
+                return state.result(truncated=inspect_body and not hop.body_checked)
+            if hops >= max_hops:
+                return state.result(error=f"Exceeded {max_hops} redirects.")
+            if hop.next_url in state.chain:
+                return state.result(error="redirect loop")
+            if guard and not _private_allowed(hop.next_url) and is_private_host(_host(hop.next_url)):
+                metrics.incr("redirect.private_blocked")
+                state.blocked = hop.next_url
+                return state.result(error="redirect to private address blocked")
+
+            state.chain.append(hop.next_url)
+            if hop.kind != "http":
+                state.client_redirects += 1
+    except _BudgetExceeded:
+        metrics.incr("redirect.truncated")
+        return state.result(error="deadline exceeded", truncated=True)
     except Exception as e:
-        return RedirectResult(final_url=url, chain=[url], hops=0, error=str(e))
+        if _blocked_at_connect(e):
+            # 검사 후 연결 직전에 내부 주소로 바뀜(DNS rebinding) → 위 검사와 같은 모양으로
+            metrics.incr("redirect.private_blocked")
+            state.blocked = state.chain[-1]
+            if len(state.chain) > 1:
+                state.chain.pop()
+            return state.result(error="redirect to private address blocked")
+        # 예산을 다 써서 난 타임아웃이면 truncated, 아니면 일반 오류
+        # (어느 쪽이든 실패한 홉 직전까지의 체인은 그대로 돌려줌)
+        if time.monotonic() >= deadline - 0.05:
+            metrics.incr("redirect.truncated")
+            return state.result(error="deadline exceeded", truncated=True)
+        return state.result(error=str(e))
+
+
+def trace_redirects(
+    url: str,
+    max_hops: int = 10,
+    timeout: float = 6.0,
+    inspect_body: bool = REDIRECT_INSPECT_BODY,
+) -> RedirectResult:
+    """
+    리다이렉트를 한 홉씩 직접 따라감(allow_redirects=False).
+    각 홉의 Location 매핑은 캐시에 저장 → 같은 단축 URL이나
+    앞부분이 겹치는 체인은 캐시된 홉만큼 네트워크 요청 없이 해결.
+
+    timeout은 체인 전체(모든 홉 + HEAD→GET 재시도)의 시간 예산.
+    예산을 넘기면 그때까지의 체인을 truncated=True로 돌려줌.
+
+    inspect_body=True면 최종 HTML 본문 앞부분(최대 REDIRECT_BODY_MAX_BYTES,
+    REDIRECT_BODY_READ_SEC 이내)에서 meta refresh / JS 리다이렉트도 따라감.
+    """
+    return _trace(url, max_hops, time.monotonic() + float(timeout), _TraceState(url), inspect_body)
+
+
+async def trace_redirects_async(
+    url: str,
+    max_hops: int = 10,
+    timeout: float = 6.0,
+    inspect_body: bool = REDIRECT_INSPECT_BODY,
+) -> RedirectResult:
+    """
+    trace_redirects의 async 버전. 블로킹 요청은 전용 스레드 풀에서 돌리고,
+    wall-clock 예산(timeout)이 지나면 진행 중인 홉을 기다리지 않고 부분 체인을 반환.
+    """
+    state = _TraceState(url)
+    loop = asyncio.get_running_loop()
+    fut = loop.run_in_executor(
+        _TRACE_POOL, _trace, url, max_hops, time.monotonic() + float(timeout), state, inspect_body
+    )
+    try:
+        return await asyncio.wait_for(asyncio.shield(fut), timeout=float(timeout))
+    except asyncio.TimeoutError:
+        metrics.incr("redirect.truncated")
+        return state.result(error="deadline exceeded", truncated=True)
+
+
+async def trace_many_async(
+    urls: List[str],
+    max_hops: int = 10,
+    timeout: float = 6.0,
+    concurrency: int = 16,
+) -> List[RedirectResult]:
+    """여러 URL을 동시에 추적(배치/프리페치용). URL마다 독립적인 예산."""
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(u: str) -> RedirectResult:
+        async with sem:
+            return await trace_redirects_async(u, max_hops=max_hops, timeout=timeout)
+
+    return list(await asyncio.gather(*(one(u) for u in urls)))
+
+
+def trace_many(urls: List[str], max_hops: int = 10, timeout: float = 6.0, concurrency: int = 16) -> List[RedirectResult]:
+    """동기 코드(스레드)에서 쓰는 trace_many_async 래퍼."""
+    return asyncio.run(trace_many_async(urls, max_hops=max_hops, timeout=timeout, concurrency=concurrency))
@@ -0,0 +1,249 @@
+# server/replay.py
+"""
+이벤트 로그(event_log.py) 오프라인 재생 / 섀도 채점.
+
+기록된 score_url 입력(rule_inputs)을 후보 설정으로 다시 채점 → 네트워크 단계(리다이렉트, KISA, WHOIS, LLM) 없음.
+현재 판정 대비 혼동 행렬과 처리량을 출력.
+
+사용 예:
+  python replay.py events/ --susp-min 30 --danger-min 75 --weight no_https=15
+  python replay.py events/ --config candidate.json --baseline final --workers 8 --json out.json
+
+candidate.json:
+  {"thresholds": {"suspicious": 30, "dangerous": 75},
+   "weights": {"no_https": 15, "keyword_hit": 20},
+   "llm_gate_margin": 10}
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from collections import Counter
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from event_log import log_files
+from llm_agent import LLM_GATE_MARGIN, gate_decision
+from score_rules import DANGER_MIN_RAW, SUSP_MIN_RAW, score_url
+
+try:
+    from orjson import loads as _loads
+except ImportError:
+    _loads = json.loads
+
+VERDICTS = ("SAFE", "SUSPICIOUS", "DANGEROUS")
+
+# 워커 프로세스 전역(initializer에서 설정)
+_CFG: Dict[str, Any] = {}
+
+
+def _init_worker(cfg: Dict[str, Any]) -> None:
+    global _CFG
+    _CFG = cfg
+
+
+def _score_chunk(lines: List[str]) -> Dict[str, Any]:
+    """워커: JSON 파싱 + 후보 설정으로 재채점 → 집계만 반환(프로세스 간 전송량 최소화)."""
+    thresholds = _CFG["thresholds"]
+    weights = _CFG["weights"] or None
+    margin = _CFG["llm_gate_margin"]
+    baseline = _CFG["baseline"]
+    origins = _CFG["origins"]
+    max_samples = _CFG["samples"]
+
+    matrix: Counter = Counter()
+    skipped = 0
+    gate_calls = 0
+    samples: List[Dict[str, Any]] = []
+
+    for line in lines:
+        try:
+            ev = _loads(line)
+        except ValueError:
+            skipped += 1
+            continue
+        inputs = ev.get("rule_inputs")
+        if not inputs or (origins and ev.get("origin") not in origins):
+            skipped += 1
+            continue
+
+        try:
+            r = score_url(**inputs, weights=weights, thresholds=thresholds)
+        except TypeError:
+            # 다른 버전 score_url로 기록된 입력(키가 없거나 모르는 키) → 이 레코드만 건너뜀
+            skipped += 1
+            continue
+        before = ev.get("rule_verdict") if baseline == "rules" else ev.get("verdict")
+        matrix[(before, r.verdict)] += 1
+
+        # 후보 경계/마진이면 LLM Decider로 보냈을지(실서비스 llm_gate와 같은 규칙)
+        if gate_decision(inputs, r.debug["raw"], margin=margin, thresholds=thresholds)[0]:
+            gate_calls += 1
+
+        if before != r.verdict and len(samples) < max_samples:
+            samples.append({
+                "input_url": ev.get("input_url"),
+                "before": before,
+                "after": r.verdict,
+                "raw": r.debug["raw"],
+            })
+
+    return {"matrix": matrix, "skipped": skipped, "gate_calls": gate_calls, "samples": samples}
+
+
+def _iter_chunks(sources: List[str], chunk_size: int) -> Iterator[List[str]]:
+    """JSON 파싱 없이 줄 단위로만 잘라 워커에 넘김(gzip 해제만 메인 프로세스)."""
+    chunk: List[str] = []
+    for src in sources:
+        for path in log_files(src):
+            opener = gzip.open if path.suffix == ".gz" else open
+            try:
+                with opener(path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            chunk.append(line)
+                            if len(chunk) >= chunk_size:
+                                yield chunk
+                                chunk = []
+            except (EOFError, OSError) as e:
+                print(f"[REPLAY] truncated: {path.name} ({e})", file=sys.stderr)
+    if chunk:
+        yield chunk
+
+
+def replay(
+    sources: List[str],
+    *,
+    thresholds: Tuple[int, int] = (SUSP_MIN_RAW, DANGER_MIN_RAW),
+    weights: Optional[Dict[str, int]] = None,
+    llm_gate_margin: int = LLM_GATE_MARGIN,
+    baseline: str = "rules",
+    origins: Optional[List[str]] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = 5000,
+    samples: int = 10,
+) -> Dict[str, Any]:
+    cfg = {
+        "thresholds": thresholds,
+        "weights": weights or {},
+        "llm_gate_margin": llm_gate_margin,
+        "baseline": baseline,
+        "origins": set(origins or []),
+        "samples": samples,
+    }
+    matrix: Counter = Counter()
+    skipped = 0
+    gate_calls = 0
+    changed_samples: List[Dict[str, Any]] = []
+
+    t0 = time.monotonic()
+    with Pool(processes=workers or os.cpu_count(), initializer=_init_worker, initargs=(cfg,)) as pool:
+        for part in pool.imap_unordered(_score_chunk, _iter_chunks(sources, chunk_size)):
+            matrix.update(part["matrix"])
+            skipped += part["skipped"]
+            gate_calls += part["gate_calls"]
+            if len(changed_samples) < samples:
+                changed_samples.extend(part["samples"][: samples - len(changed_samples)])
+    elapsed = time.monotonic() - t0
+
+    total = sum(matrix.values())
+    changed = sum(n for (b, a), n in matrix.items() if b != a)
+    return {
+        "config": {**cfg, "origins": sorted(cfg["origins"])},
+        "records": total,
+        "skipped": skipped,
+        "changed": changed,
+        "changed_ratio": round(changed / total, 6) if total else 0.0,
+        "llm_gate_calls": gate_calls,
+        "matrix": {f"{b}->{a}": n for (b, a), n in sorted(matrix.items(), key=lambda x: str(x[0]))},
+        "elapsed_sec": round(elapsed, 3),
+        "records_per_sec": int(total / elapsed) if elapsed > 0 else 0,
+        "samples": changed_samples,
+    }
+
+
+def format_report(rep: Dict[str, Any], baseline: str) -> str:
+    cells: Dict[Tuple[str, str], int] = {}
+    for key, n in rep["matrix"].items():
+        b, a = key.split("->", 1)
+        cells[(b, a)] = n
+    rows = [v for v in VERDICTS] + sorted({b for b, _ in cells} - set(VERDICTS), key=str)
+
+    w = 12
+    out = [f"baseline={baseline} (행) → candidate (열)"]
+    out.append("".ljust(w) + "".join(v.rjust(w) for v in VERDICTS))
+    for b in rows:
+        out.append(str(b).ljust(w) + "".join(str(cells.get((b, a), 0)).rjust(w) for a in VERDICTS))
+    out.append("")
+    out.append(
+        f"records={rep['records']} changed={rep['changed']} ({rep['changed_ratio'] * 100:.2f}%) "
+        f"skipped={rep['skipped']} llm_gate_calls={rep['llm_gate_calls']}"
+    )
+    out.append(f"elapsed={rep['elapsed_sec']}s throughput={rep['records_per_sec']} records/s")
+    for s in rep["samples"]:
+        out.append(f"  {s['before']} → {s['after']} raw={s['raw']} {s['input_url']}")
+    return "\n".join(out)
+
+
+def _parse_weight(s: str) -> Tuple[str, int]:
+    name, _, pts = s.partition("=")
+    if not name or not pts:
+        raise argparse.ArgumentTypeError(f"--weight는 name=points 형식: {s}")
+    return name.strip(), int(pts)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="이벤트 로그를 후보 규칙 설정으로 재채점(섀도 채점)")
+    ap.add_argument("sources", nargs="+", help="이벤트 로그 디렉터리 또는 .jsonl(.gz) 파일")
+    ap.add_argument("--config", help="후보 설정 JSON(thresholds/weights/llm_gate_margin)")
+    ap.add_argument("--susp-min", type=int, help=f"SUSPICIOUS raw 하한(현재 {SUSP_MIN_RAW})")
+    ap.add_argument("--danger-min", type=int, help=f"DANGEROUS raw 하한(현재 {DANGER_MIN_RAW})")
+    ap.add_argument("--weight", type=_parse_weight, action="append", default=[], help="신호 점수 덮어쓰기 name=points")
+    ap.add_argument("--llm-gate-margin", type=int, help="LLM 게이트 마진 후보값")
+    ap.add_argument("--baseline", choices=("rules", "final"), default="rules",
+                    help="비교 기준: rules=기록된 규칙 판정, final=LLM 포함 최종 판정")
+    ap.add_argument("--origin", action="append", default=[], help="hover/prefetch/background 중 포함할 것(기본 전체)")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--chunk-size", type=int, default=5000)
+    ap.add_argument("--samples", type=int, default=10, help="판정이 바뀐 예시 출력 개수")
+    ap.add_argument("--json", dest="json_out", help="결과를 JSON 파일로도 저장")
+    args = ap.parse_args(argv)
+
+    cfg: Dict[str, Any] = {}
+    if args.config:
+        cfg = json.loads(Path(args.config).read_text(encoding="utf-8"))
+    th = cfg.get("thresholds") or {}
+    thresholds = (
+        args.susp_min if args.susp_min is not None else int(th.get("suspicious", SUSP_MIN_RAW)),
+        args.danger_min if args.danger_min is not None else int(th.get("dangerous", DANGER_MIN_RAW)),
+    )
+    weights = {k: int(v) for k, v in (cfg.get("weights") or {}).items()}
+    weights.update(dict(args.weight))
+    margin = args.llm_gate_margin if args.llm_gate_margin is not None else int(
+        cfg.get("llm_gate_margin", LLM_GATE_MARGIN)
+    )
+
+    rep = replay(
+        args.sources,
+        thresholds=thresholds,
+        weights=weights,
+        llm_gate_margin=margin,
+        baseline=args.baseline,
+        origins=args.origin,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        samples=args.samples,
+    )
+    print(format_report(rep, args.baseline))
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(rep, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 
 @dataclass
@@ -20,20 +20,33 @@ class ScoreResult:
     debug: Dict[str, Any]
 
 
-def bucketize(raw: int, kisa_hit: bool) -> int:
+# raw 점수 → 버킷 경계
+SUSP_MIN_RAW = 35
+DANGER_MIN_RAW = 80
+
+
+def bucketize(raw: int, kisa_hit: bool, thresholds: Optional[Tuple[int, int]] = None) -> int:
     """
     최종 점수는 요구대로 3단계 고정:
     SAFE=5, SUSP=60, DANGER=90
+    thresholds: (SUSP 하한, DANGER 하한) 후보값(replay용), 없으면 모듈 기본값
     """
+    susp_min, danger_min = thresholds or (SUSP_MIN_RAW, DANGER_MIN_RAW)
     if kisa_hit:
         return 90
-    if raw >= 80:
+    if raw >= danger_min:
         return 90
-    if raw >= 35:
+    if raw >= susp_min:
         return 60
     return 5
 
 
+def boundary_distance(raw: int, thresholds: Optional[Tuple[int, int]] = None) -> int:
+    """raw 점수가 가장 가까운 버킷 경계에서 얼마나 떨어져 있는지(작을수록 애매)."""
+    susp_min, danger_min = thresholds or (SUSP_MIN_RAW, DANGER_MIN_RAW)
+    return min(abs(raw - susp_min), abs(raw - danger_min))
+
+
 def verdict_from_bucket(score: int) -> str:
     if score >= 90:
         return "DANGEROUS"
@@ -53,6 +66,7 @@ def score_url(
     used_redirect: bool,
     domain_switched: bool,          # 리다이렉트로 등록도메인이 바뀌었는지
     domain_switch_count: int,       # 고유 registered domain 개수(>=2면 변경)
+    redirect_truncated: bool = False,   # 시간 예산 안에 체인 끝까지 못 감
 
     # 도메인/호스트
     is_ip: bool,
@@ -62,6 +76,9 @@ def score_url(
     https: bool,
     subdomains: int,
     is_shortener: bool,
+    abusive_ip_range: bool = False,     # 악성 호스팅 IP 대역 목록에 포함(IP 호스트 또는 해석된 주소)
+    resolves_private: bool = False,     # 공인 도메인 이름이 내부망/예약 주소로 해석됨
+    dns_short_ttl: bool = False,        # DNS 레코드 TTL이 매우 짧음(fast-flux)
 
     # URL 문자열 패턴
     url_len: int,
@@ -73,6 +90,10 @@ def score_url(
     # WHOIS(선택)
     whois_age_days: Optional[int],
     whois_error: Optional[str],
+
+    # 후보 설정(replay/섀도 채점용): 신호 이름 → 점수, (SUSP 하한, DANGER 하한)
+    weights: Optional[Dict[str, int]] = None,
+    thresholds: Optional[Tuple[int, int]] = None,
 ) -> ScoreResult:
     signals: List[Signal] = []
 
@@ -96,6 +117,9 @@ def score_url(
         elif redirect_hops >= 1:
             signals.append(Signal("redirect_some", 12, f"리다이렉트가 {redirect_hops}회 발생"))
 
+    if redirect_truncated:
+        signals.append(Signal("redirect_truncated", 10, "리다이렉트 추적이 제한 시간 내 끝나지 않음(체인 일부만 확인)"))
+
     # ---- 3) 리다이렉트 중 도메인 변경 ----
     if domain_switched and domain_switch_count >= 2:
         # 도메인이 바뀌면 “은닉/우회” 시나리오에서 자주 보임
@@ -105,6 +129,12 @@ def score_url(
     # ---- 4) 호스트/전송 보안 ----
     if is_ip:
         signals.append(Signal("ip_host", 45, "도메인 대신 IP로 직접 접속 형태"))
+    if abusive_ip_range:
+        signals.append(Signal("abusive_ip_range", 30, "악성 호스팅으로 알려진 IP 대역"))
+    if resolves_private:
+        signals.append(Signal("resolves_private", 35, "도메인이 내부망/예약 IP 주소로 해석됨"))
+    if dns_short_ttl:
+        signals.append(Signal("dns_short_ttl", 10, "DNS TTL이 매우 짧음(fast-flux 가능)"))
     if has_userinfo:
         signals.append(Signal("userinfo", 25, "URL에 userinfo(@) 포함(주소 혼동 유발 가능)"))
     if nonstandard_port:
@@ -137,11 +167,16 @@ def score_url(
         elif whois_age_days < 180:
             signals.append(Signal("young_domain", 15, f"도메인이 비교적 최근 생성됨({whois_age_days}일)"))
 
+    if weights:
+        for s in signals:
+            if s.name in weights:
+                s.points = int(weights[s.name])
+
     # ---- raw 점수 계산 ----
     # KISA는 버킷으로 바로 DANGER(90)로 보내기 때문에 raw에선 제외해도 됨
     raw = sum(s.points for s in signals if s.points < 90)
 
-    score = bucketize(raw, kisa_hit)
+    score = bucketize(raw, kisa_hit, thresholds)
     verdict = verdict_from_bucket(score)
 
     # reasons는 상위 2~3개
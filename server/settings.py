@@ -0,0 +1,241 @@
+# server/settings.py
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Union
+
+from dotenv import dotenv_values, load_dotenv
+
+DEFAULT_ENV_FILE = Path(__file__).with_name(".env")
+
+
+class _Env:
+    """os.environ 위에 .env 값을 덮어쓴 읽기 전용 뷰(os.environ 자체는 건드리지 않음)."""
+
+    def __init__(self, values: Mapping[str, str]):
+        self._v = values
+
+    def text(self, key: str, default: str = "") -> str:
+        return (self._v.get(key) or default).strip()
+
+    def flag(self, key: str, default: bool) -> bool:
+        return self.text(key, "true" if default else "false").lower() == "true"
+
+    def integer(self, key: str, default: int) -> int:
+        return int(self.text(key, str(default)))
+
+    def number(self, key: str, default: float) -> float:
+        return float(self.text(key, str(default)))
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    서버(main.create_app) 설정. 앱마다 따로 가질 수 있음(테스트/벤치마크는 replace()로 일부만 바꿔 사용).
+    리졸버/리다이렉트 풀/LLM 클라이언트처럼 모듈 단위 설정은 각 모듈이 환경 변수에서 직접 읽음.
+    """
+
+    # .env 경로(None이면 환경 변수만). 앱 기동 시 os.environ에도 반영해 각 모듈 설정에 적용
+    env_file: Optional[str] = None
+
+    db_path: str = "./kisa_phishing.db"
+    use_llm: bool = False
+    cors_allow_origins: str = "*"
+
+    # KISA 온디맨드(필요할 때만 API 조회 후 DB 캐시)
+    kisa_ondemand: bool = True
+    kisa_ondemand_max_pages: int = 3
+    kisa_ondemand_per_page: int = 1000
+    kisa_ondemand_timeout: float = 3.5
+    odcloud_api: str = ""
+    odcloud_key: str = ""
+
+    # 리다이렉트 추적: redirect_timeout_sec는 체인 전체의 시간 예산
+    redirect_timeout_sec: float = 6.0
+    redirect_max_hops: int = 10
+
+    # 고평판 도메인 allowlist(빠른 경로)
+    allowlist_path: str = str(Path(__file__).with_name("allowlist.txt"))
+
+    # WHOIS 도메인 나이(캐시 + 백그라운드 조회). WHOIS_API_URL이 없으면 비활성
+    whois_enabled: bool = False
+    whois_cache_ttl_sec: float = 30 * 86400
+    whois_negative_ttl_sec: float = 6 * 3600
+    whois_workers: int = 2
+    whois_rate_per_sec: float = 2
+
+    # 확장프로그램 배포용 KISA Bloom filter 재빌드 주기(초)
+    blocklist_rebuild_sec: float = 600
+
+    # 분석 결과 캐시(정규화 URL 기준, 수명은 판정별)
+    analyze_cache_max: int = 20000
+    # /analyze 응답 형태: 기본은 툴팁용 compact
+    analyze_verbose_default: bool = False
+
+    # 요청 전체 시간 예산(ms). 요청 payload의 deadline_ms가 우선, 0이면 무제한
+    analyze_deadline_ms: float = 1500
+    deadline_share_redirect: float = 0.5
+    deadline_share_kisa: float = 0.5     # LLM은 남은 시간 전부
+    deadline_share_dns: float = 0.3
+    deadline_share_planner: float = 0.2  # LLM Planner(LLM_PLANNER=llm)
+    deadline_min_stage_ms: float = 50
+    deadline_reserve_ms: float = 20
+    # 건너뛴 단계가 있으면 예산 없이 뒤에서 끝까지 분석해 결과 캐시를 갱신
+    analyze_background_workers: int = 2
+    analyze_background_queue: int = 64   # 대기 한도(넘으면 버림)
+
+    # 입장 제어: 비싼 단계별 동시 실행/대기 한도
+    admit_wait_ms: float = 200
+    admit_redirect_concurrency: int = 64
+    admit_redirect_queue: int = 128
+    admit_kisa_concurrency: int = 2
+    admit_kisa_queue: int = 4
+    admit_llm_concurrency: int = 16
+    admit_llm_queue: int = 32
+    # 캐시 미스 분석의 전역 동시 한도. 넘으면 503 + Retry-After
+    analyze_max_inflight: int = 256
+    analyze_retry_after_sec: int = 2
+
+    # 도메인 평판 캐시
+    domain_rep_enabled: bool = True
+    domain_rep_ttl_sec: float = 6 * 3600
+    domain_rep_max: int = 50000
+    domain_rep_min_observed: int = 2
+
+    # 분석 이벤트 로그(gzip JSONL, 크기 회전)
+    event_log_enabled: bool = True
+    event_log_dir: str = str(Path(__file__).with_name("events"))
+    event_log_buffer: int = 10000
+    event_log_flush_sec: float = 1.0
+    event_log_batch: int = 500
+    event_log_rotate_mb: float = 64
+    event_log_keep_files: int = 50
+
+    # DNS 단계(리졸버/캐시 설정은 dns_utils)
+    dns_stage_enabled: bool = True
+    dns_short_ttl_sec: int = 60
+
+    # 악성 호스팅 IP 대역 목록 파일들
+    ip_abuse_range_files: List[str] = field(default_factory=list)
+
+    # 관리자 엔드포인트(/admin/*) 토큰. 비어 있으면 관리자 기능 비활성
+    admin_token: str = ""
+    profile_max_sec: float = 60
+
+    # 판정별 캐시 수명(초) / 잠정 결과 수명
+    cache_ttl_by_verdict: Dict[str, int] = field(
+        default_factory=lambda: {"SAFE": 3600, "SUSPICIOUS": 600, "DANGEROUS": 86400}
+    )
+    cache_ttl_provisional_sec: int = 60
+
+    # 화면에 보이는 링크 프리페치
+    prefetch_enabled: bool = True
+    prefetch_workers: int = 1
+    prefetch_client_quota: int = 50
+    prefetch_per_domain: int = 2
+    prefetch_max_links: int = 200
+
+    # LLM 판정 캐시 / 마이크로 배치 / 워밍업
+    llm_cache: bool = True
+    llm_cache_ttl_sec: int = 7 * 24 * 3600
+    llm_cache_max_entries: int = 50000
+    llm_batch_window_ms: int = 8     # 0이면 배치 비활성
+    llm_batch_max: int = 8
+    llm_decide_timeout: float = 12 + 2 + 1.0
+    llm_warmup: bool = True
+    ollama_num_parallel: int = 1
+
+    @classmethod
+    def from_env(cls, env_file: Optional[Union[str, Path]] = DEFAULT_ENV_FILE) -> "Settings":
+        """환경 변수(+ .env, .env가 우선)에서 읽기. 읽기만 하고 os.environ은 바꾸지 않음."""
+        values: Dict[str, str] = dict(os.environ)
+        if env_file and Path(env_file).exists():
+            values.update({k: v for k, v in dotenv_values(env_file).items() if v is not None})
+        e = _Env(values)
+        d = cls()
+        return cls(
+            env_file=str(env_file) if env_file else None,
+            db_path=e.text("DB_PATH", d.db_path),
+            use_llm=e.flag("USE_LLM", d.use_llm),
+            cors_allow_origins=e.text("CORS_ALLOW_ORIGINS", d.cors_allow_origins),
+            kisa_ondemand=e.flag("KISA_ONDEMAND", d.kisa_ondemand),
+            kisa_ondemand_max_pages=e.integer("KISA_ONDEMAND_MAX_PAGES", d.kisa_ondemand_max_pages),
+            kisa_ondemand_per_page=e.integer("KISA_ONDEMAND_PER_PAGE", d.kisa_ondemand_per_page),
+            kisa_ondemand_timeout=e.number("KISA_ONDEMAND_TIMEOUT", d.kisa_ondemand_timeout),
+            odcloud_api=e.text("ODCLOUD_PHISH_API_BASE"),
+            odcloud_key=e.text("ODCLOUD_SERVICE_KEY"),
+            redirect_timeout_sec=e.number("REDIRECT_TIMEOUT_SEC", d.redirect_timeout_sec),
+            redirect_max_hops=e.integer("REDIRECT_MAX_HOPS", d.redirect_max_hops),
+            allowlist_path=e.text("ALLOWLIST_PATH") or d.allowlist_path,
+            whois_enabled=bool(e.text("WHOIS_API_URL")),
+            whois_cache_ttl_sec=e.number("WHOIS_CACHE_TTL_SEC", d.whois_cache_ttl_sec),
+            whois_negative_ttl_sec=e.number("WHOIS_NEGATIVE_TTL_SEC", d.whois_negative_ttl_sec),
+            whois_workers=e.integer("WHOIS_WORKERS", d.whois_workers),
+            whois_rate_per_sec=e.number("WHOIS_RATE_PER_SEC", d.whois_rate_per_sec),
+            blocklist_rebuild_sec=e.number("BLOCKLIST_REBUILD_SEC", d.blocklist_rebuild_sec),
+            analyze_cache_max=e.integer("ANALYZE_CACHE_MAX", d.analyze_cache_max),
+            analyze_verbose_default=e.flag("ANALYZE_VERBOSE_DEFAULT", d.analyze_verbose_default),
+            analyze_deadline_ms=e.number("ANALYZE_DEADLINE_MS", d.analyze_deadline_ms),
+            deadline_share_redirect=e.number("DEADLINE_SHARE_REDIRECT", d.deadline_share_redirect),
+            deadline_share_kisa=e.number("DEADLINE_SHARE_KISA", d.deadline_share_kisa),
+            deadline_share_dns=e.number("DEADLINE_SHARE_DNS", d.deadline_share_dns),
+            deadline_share_planner=e.number("DEADLINE_SHARE_PLANNER", d.deadline_share_planner),
+            deadline_min_stage_ms=e.number("DEADLINE_MIN_STAGE_MS", d.deadline_min_stage_ms),
+            deadline_reserve_ms=e.number("DEADLINE_RESERVE_MS", d.deadline_reserve_ms),
+            analyze_background_workers=e.integer("ANALYZE_BACKGROUND_WORKERS", d.analyze_background_workers),
+            analyze_background_queue=e.integer("ANALYZE_BACKGROUND_QUEUE", d.analyze_background_queue),
+            admit_wait_ms=e.number("ADMIT_WAIT_MS", d.admit_wait_ms),
+            admit_redirect_concurrency=e.integer("ADMIT_REDIRECT_CONCURRENCY", d.admit_redirect_concurrency),
+            admit_redirect_queue=e.integer("ADMIT_REDIRECT_QUEUE", d.admit_redirect_queue),
+            admit_kisa_concurrency=e.integer("ADMIT_KISA_CONCURRENCY", d.admit_kisa_concurrency),
+            admit_kisa_queue=e.integer("ADMIT_KISA_QUEUE", d.admit_kisa_queue),
+            admit_llm_concurrency=e.integer("ADMIT_LLM_CONCURRENCY", d.admit_llm_concurrency),
+            admit_llm_queue=e.integer("ADMIT_LLM_QUEUE", d.admit_llm_queue),
+            analyze_max_inflight=e.integer("ANALYZE_MAX_INFLIGHT", d.analyze_max_inflight),
+            analyze_retry_after_sec=e.integer("ANALYZE_RETRY_AFTER_SEC", d.analyze_retry_after_sec),
+            domain_rep_enabled=e.flag("DOMAIN_REP_ENABLED", d.domain_rep_enabled),
+            domain_rep_ttl_sec=e.number("DOMAIN_REP_TTL_SEC", d.domain_rep_ttl_sec),
+            domain_rep_max=e.integer("DOMAIN_REP_MAX", d.domain_rep_max),
+            domain_rep_min_observed=e.integer("DOMAIN_REP_MIN_OBSERVED", d.domain_rep_min_observed),
+            event_log_enabled=e.flag("EVENT_LOG_ENABLED", d.event_log_enabled),
+            event_log_dir=e.text("EVENT_LOG_DIR") or d.event_log_dir,
+            event_log_buffer=e.integer("EVENT_LOG_BUFFER", d.event_log_buffer),
+            event_log_flush_sec=e.number("EVENT_LOG_FLUSH_SEC", d.event_log_flush_sec),
+            event_log_batch=e.integer("EVENT_LOG_BATCH", d.event_log_batch),
+            event_log_rotate_mb=e.number("EVENT_LOG_ROTATE_MB", d.event_log_rotate_mb),
+            event_log_keep_files=e.integer("EVENT_LOG_KEEP_FILES", d.event_log_keep_files),
+            dns_stage_enabled=e.flag("DNS_STAGE_ENABLED", d.dns_stage_enabled),
+            dns_short_ttl_sec=e.integer("DNS_SHORT_TTL_SEC", d.dns_short_ttl_sec),
+            ip_abuse_range_files=[p.strip() for p in e.text("IP_ABUSE_RANGE_FILES").split(",") if p.strip()],
+            admin_token=e.text("ADMIN_TOKEN"),
+            profile_max_sec=e.number("PROFILE_MAX_SEC", d.profile_max_sec),
+            cache_ttl_by_verdict={
+                "SAFE": e.integer("CACHE_TTL_SAFE_SEC", 3600),
+                "SUSPICIOUS": e.integer("CACHE_TTL_SUSPICIOUS_SEC", 600),
+                "DANGEROUS": e.integer("CACHE_TTL_DANGEROUS_SEC", 86400),
+            },
+            cache_ttl_provisional_sec=e.integer("CACHE_TTL_PROVISIONAL_SEC", d.cache_ttl_provisional_sec),
+            prefetch_enabled=e.flag("PREFETCH_ENABLED", d.prefetch_enabled),
+            prefetch_workers=e.integer("PREFETCH_WORKERS", d.prefetch_workers),
+            prefetch_client_quota=e.integer("PREFETCH_CLIENT_QUOTA", d.prefetch_client_quota),
+            prefetch_per_domain=e.integer("PREFETCH_PER_DOMAIN", d.prefetch_per_domain),
+            prefetch_max_links=e.integer("PREFETCH_MAX_LINKS", d.prefetch_max_links),
+            llm_cache=e.flag("LLM_CACHE", d.llm_cache),
+            llm_cache_ttl_sec=e.integer("LLM_CACHE_TTL_SEC", d.llm_cache_ttl_sec),
+            llm_cache_max_entries=e.integer("LLM_CACHE_MAX_ENTRIES", d.llm_cache_max_entries),
+            llm_batch_window_ms=e.integer("LLM_BATCH_WINDOW_MS", d.llm_batch_window_ms),
+            llm_batch_max=e.integer("LLM_BATCH_MAX", d.llm_batch_max),
+            llm_decide_timeout=e.number("LLM_TIMEOUT_SEC", 12) + e.number("LLM_QUEUE_TIMEOUT_SEC", 2) + 1.0,
+            llm_warmup=e.flag("LLM_WARMUP", d.llm_warmup),
+            ollama_num_parallel=e.integer("OLLAMA_NUM_PARALLEL", d.ollama_num_parallel),
+        )
+
+    def apply_env_file(self) -> None:
+        """
+        .env를 os.environ에 반영(기존 값 덮어씀). 모듈 수준에서 환경 변수를 읽는
+        redirect_utils / dns_utils / llm_agent 등은 이 뒤에 import해야 .env 값이 적용됨.
+        """
+        if self.env_file and Path(self.env_file).exists():
+            load_dotenv(dotenv_path=self.env_file, override=True)
@@ -6,6 +6,8 @@ from urllib.parse import urlsplit, urlunsplit, unquote
 
 from urllib.parse import urlsplit
 
+from ip_ranges import parse_ip
+
 def extract_domain(url: str) -> str:
     """정규화된 URL에서 hostname(소문자)만 뽑는다."""
     try:
@@ -32,7 +34,6 @@ SHORTENER_DOMAINS = {
     "bit.ly", "t.co", "tinyurl.com", "goo.gl", "is.gd", "cutt.ly", "rb.gy"
 }
 
-_IPV4_RE = re.compile(r"^\d{1,3}(\.\d{1,3}){3}$")
 _PERCENT_ENC_RE = re.compile(r"%[0-9A-Fa-f]{2}")
 
 
@@ -99,7 +100,7 @@ def extract_registered_domain(url: str) -> str:
         return ""
 
     # IP면 도메인 없음 처리
-    if _IPV4_RE.match(host) or ":" in host:
+    if parse_ip(host) is not None:
         return ""
 
     parts = host.split(".")
@@ -118,21 +119,8 @@ def extract_registered_domain(url: str) -> str:
 
 
 def looks_like_ip_host(url: str) -> bool:
-    host = host_of(url)
-    if not host:
-        return False
-    # IPv4
-    if _IPV4_RE.match(host):
-        # 0~255 범위 간단 검증
-        try:
-            nums = [int(x) for x in host.split(".")]
-            return all(0 <= n <= 255 for n in nums)
-        except Exception:
-            return False
-    # IPv6 (대충 ':' 포함 여부)
-    if ":" in host:
-        return True
-    return False
+    # IPv4/IPv6 + 브라우저가 IP로 해석하는 옛 표기(2130706433, 0x7f.1 등)
+    return parse_ip(host_of(url)) is not None
 
 
 def is_suspicious_punycode(url: str) -> bool: